@@ -9,7 +9,14 @@ from .endpoints import (
     pdf_sign,
     pdf_compress,
     pdf_convert,
-    pdf_utils
+    pdf_ocr,
+    pdf_text,
+    pdf_search,
+    pdf_watermark,
+    pdf_utils,
+    results,
+    jobs,
+    uploads
 )
 
 api_router = APIRouter()
@@ -23,4 +30,11 @@ api_router.include_router(pdf_reorder.router, tags=["PDF"])
 api_router.include_router(pdf_sign.router, tags=["PDF"])
 api_router.include_router(pdf_compress.router, tags=["PDF"])
 api_router.include_router(pdf_convert.router, tags=["PDF"])
-api_router.include_router(pdf_utils.router, tags=["PDF"]) 
\ No newline at end of file
+api_router.include_router(pdf_ocr.router, tags=["PDF"])
+api_router.include_router(pdf_text.router, tags=["PDF"])
+api_router.include_router(pdf_search.router, tags=["PDF"])
+api_router.include_router(pdf_watermark.router, tags=["PDF"])
+api_router.include_router(pdf_utils.router, tags=["PDF"])
+api_router.include_router(results.router, tags=["PDF"])
+api_router.include_router(jobs.router, tags=["PDF"])
+api_router.include_router(uploads.router, tags=["PDF"]) 
\ No newline at end of file
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from ....core.config import settings
+from ....core.temp_manager import create_operation_dir, temp_manager
+from ....core.document_store import document_store
+from ....core.job_queue import job_queue, new_job, valid_job_id, FINISHED_STATUSES, RUNNING
+from ....core.security import save_upload_file, is_valid_file_extension
+from ....services.jobs import JOB_OPERATIONS
+from ....services.ocr_utils import get_progress
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """État d'un travail tel qu'exposé au client"""
+    view = {
+        "job_id": job["id"],
+        "operation": job["operation"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "files": [item["filename"] for item in job["inputs"]],
+        "params": job["params"],
+        "result": job["result"],
+        "error": job["error"],
+        "status_url": f"{settings.API_V1_STR}/jobs/{job['id']}",
+    }
+    if job["operation"] == "ocr" and job["status"] == RUNNING:
+        view["progress"] = get_progress(job["id"])
+    return view
+
+
+def _get_job(job_id: str) -> Dict[str, Any]:
+    if not valid_job_id(job_id):
+        raise HTTPException(status_code=400, detail="Identifiant de travail invalide")
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Travail introuvable ou expiré")
+    return job
+
+
+@router.post("/jobs/{operation}", status_code=202, summary="Soumettre un traitement asynchrone")
+async def submit_job(
+    operation: str,
+    files: List[UploadFile] = File([]),
+    documents: str = Form("[]"),
+    params: str = Form("{}")
+):
+    """
+    Met en file une opération lourde, exécutée par un worker (serveur API ou
+    worker dédié, éventuellement sur un autre nœud), et renvoie immédiatement
+    l'identifiant du travail.
+
+    - **operation**: compress, images-to-pdf, ocr, merge ou split
+    - **files**: Fichiers sources, dans l'ordre de l'opération
+    - **documents**: Fichiers déjà déposés (/documents, /uploads), placés avant
+      les fichiers envoyés : [{"document_id": "...", "filename": "scan.pdf"}, ...]
+    - **params**: Paramètres de l'opération en JSON (ex: {"quality": "low"} ;
+      output_filename pour toutes les opérations)
+
+    Suivre l'avancement via GET /jobs/{job_id} ; une fois le travail terminé,
+    le résultat se télécharge à l'URL indiquée dans `result.url`.
+    """
+    spec = JOB_OPERATIONS.get(operation)
+    if spec is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Opération inconnue. Valeurs acceptées: {', '.join(JOB_OPERATIONS)}"
+        )
+
+    try:
+        raw_params = json.loads(params)
+        if not isinstance(raw_params, dict):
+            raise ValueError("un objet JSON est attendu")
+        validated = spec.validate_params(raw_params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Paramètres invalides: {str(e)}")
+
+    try:
+        stored = json.loads(documents)
+        if not isinstance(stored, list) or not all(isinstance(item, dict) for item in stored):
+            raise ValueError("une liste d'objets JSON est attendue")
+        stored = [
+            {"document_id": str(item["document_id"]), "filename": os.path.basename(str(item["filename"]))}
+            for item in stored
+        ]
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Documents invalides: {str(e)}")
+
+    count = len(stored) + len(files)
+    if count < spec.min_files or (spec.max_files is not None and count > spec.max_files):
+        expected = f"{spec.min_files}" if spec.min_files == spec.max_files else f"au moins {spec.min_files}"
+        raise HTTPException(status_code=400, detail=f"Nombre de fichiers invalide ({expected} attendu)")
+
+    allowed = settings.ALLOWED_EXTENSIONS[spec.file_type]
+    for filename in [item["filename"] for item in stored] + [file.filename for file in files]:
+        if not is_valid_file_extension(filename, allowed):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Format non pris en charge pour {operation}: {filename}"
+            )
+
+    for item in stored:
+        try:
+            found = await run_in_threadpool(document_store.path, item["document_id"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if found is None:
+            raise HTTPException(status_code=404, detail=f"Document introuvable ou expiré: {item['filename']}")
+
+    # Créer un identifiant unique pour cette opération
+    operation_id = str(uuid.uuid4())
+    temp_dir = create_operation_dir(operation_id)
+
+    try:
+        # Les sources sont rangées dans le stockage partagé, lisible par tous les workers
+        inputs = list(stored)
+        for file in files:
+            file_path = save_upload_file(file, temp_dir, "upload")
+            document_id = await run_in_threadpool(document_store.put, str(file_path))
+            inputs.append({"document_id": document_id, "filename": os.path.basename(file.filename)})
+
+        job = new_job(operation, inputs, validated)
+        await run_in_threadpool(job_queue.enqueue, job)
+
+    except Exception as e:
+        logger.error(f"Erreur lors de la mise en file du travail: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        temp_manager.remove(temp_dir)
+
+    view = _job_view(job)
+    return JSONResponse(status_code=202, content=view, headers={"Location": view["status_url"]})
+
+
+@router.get("/jobs/{job_id}", summary="État d'un traitement asynchrone")
+async def get_job(job_id: str):
+    """
+    Renvoie l'état d'un travail : queued, running, done, failed ou cancelled.
+    Pour un travail terminé, `result` contient l'identifiant et l'URL du
+    résultat (GET /results/{result_id}) ; pour un échec, `error` en donne la cause.
+    """
+    return _job_view(await run_in_threadpool(_get_job, job_id))
+
+
+@router.delete("/jobs/{job_id}", summary="Annuler un traitement asynchrone")
+async def cancel_job(job_id: str):
+    """
+    Annule un travail encore en file. Un travail déjà pris par un worker
+    ou terminé ne peut plus être annulé (409).
+    """
+    job = await run_in_threadpool(_get_job, job_id)
+    if not await run_in_threadpool(job_queue.cancel, job_id):
+        state = "terminé" if job["status"] in FINISHED_STATUSES else "en cours"
+        raise HTTPException(status_code=409, detail=f"Le travail est déjà {state}")
+    return {"success": True, "job_id": job_id}
@@ -1,13 +1,19 @@
 import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
 import tempfile
 import uuid
 
 from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.results import result_response
+from ....core.coalescing import result_coalescer
+from ....core.document_store import file_sha256
+from ....core.supervisor import OperationAborted, supervise
 from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
 from ....services.pdf_utils import compress_pdf
+from ....services.render_utils import render_backend
 
 router = APIRouter()
 
@@ -43,8 +49,7 @@ async def compress_pdf_file(
     operation_id = str(uuid.uuid4())
     
     # Préparer les chemins des fichiers
-    temp_dir = os.path.join(settings.TEMP_DIR, operation_id)
-    os.makedirs(temp_dir, exist_ok=True)
+    temp_dir = create_operation_dir(operation_id)
     
     try:
         # Sauvegarder le fichier PDF
@@ -57,28 +62,41 @@ async def compress_pdf_file(
         elif not output_filename.lower().endswith(".pdf"):
             output_filename += ".pdf"
             
-        output_path = os.path.join(temp_dir, output_filename)
-        
-        # Compresser le PDF
-        compress_pdf(str(pdf_path), output_path, quality)
+        # Les requêtes identiques (même contenu, même qualité) partagent un seul calcul
+        digest = await run_in_threadpool(file_sha256, str(pdf_path))
+        key = result_coalescer.make_key("compress", [digest], {"quality": quality})
+        # Le calcul travaille sur sa propre copie du fichier (il peut survivre à
+        # cette requête) ; moteur de rendu déterminé ici : le processus supervisé
+        # ne le mesure pas à nouveau
+        result, source = await result_coalescer.run(
+            key,
+            lambda output_path, sources: supervise(compress_pdf, sources[0], output_path, quality, render_backend()),
+            inputs=[str(pdf_path)],
+        )
         
         # Supprimer le fichier intermédiaire en arrière-plan
         if settings.SECURE_MODE:
             background_tasks.add_task(secure_delete_file, str(pdf_path))
         
-        # Supprimer le fichier de sortie après envoi
-        background_tasks.add_task(secure_delete_file, output_path)
-        
-        return FileResponse(
-            path=output_path,
-            filename=output_filename,
-            media_type="application/pdf",
-            background=background_tasks
-        )
+        # Chaque requête conserve son propre résultat (lien vers le fichier partagé) ;
+        # le résultat partagé reste dans le cache jusqu'à son expiration
+        try:
+            return result_response(
+                result.path,
+                output_filename,
+                media_type="application/pdf",
+                headers={"X-Result-Source": source},
+                background=background_tasks,
+                copy=True
+            )
+        finally:
+            await result_coalescer.release(result)
         
     except Exception as e:
         # Nettoyer en cas d'erreur
         if 'pdf_path' in locals():
             secure_delete_file(str(pdf_path))
+        if isinstance(e, OperationAborted):
+            raise
         
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -1,16 +1,21 @@
 import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, status
-from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
 import tempfile
 import uuid
 import logging
 import shutil
-import subprocess
 from pathlib import Path
 
 from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.results import result_response
+from ....core.coalescing import result_coalescer
+from ....core.document_store import file_sha256
+from ....core.supervisor import OperationAborted, run_command, run_supervised, supervise
 from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
+from ....core.tracing import span
 from ....services.pdf_utils import images_to_pdf
 
 router = APIRouter()
@@ -63,18 +68,24 @@ CONVERTIBLE_EXTENSIONS = {
 async def convert_images_to_pdf(
     background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
-    output_filename: str = Form(None)
+    output_filename: str = Form(None),
+    target_dpi: Optional[int] = Form(None)
 ):
     """
     Convertit une ou plusieurs images en un fichier PDF.
+    Toutes les pages des TIFF/GIF multipages sont converties.
     
     - **files**: Liste des fichiers image à convertir
     - **output_filename**: Nom du fichier PDF de sortie (optionnel)
+    - **target_dpi**: Résolution maximale, les images plus fines sont sous-échantillonnées (optionnel)
     """
     
     if not files:
         raise HTTPException(status_code=400, detail="Aucune image fournie")
     
+    if target_dpi is not None and not 10 <= target_dpi <= 2400:
+        raise HTTPException(status_code=400, detail="La résolution cible doit être comprise entre 10 et 2400 DPI")
+    
     # Vérifier que tous les fichiers sont des images supportées
     for file in files:
         if not is_valid_file_extension(file.filename, settings.ALLOWED_EXTENSIONS["image"]):
@@ -88,8 +99,7 @@ async def convert_images_to_pdf(
     operation_id = str(uuid.uuid4())
     
     # Préparer les chemins des fichiers
-    temp_dir = os.path.join(settings.TEMP_DIR, operation_id)
-    os.makedirs(temp_dir, exist_ok=True)
+    temp_dir = create_operation_dir(operation_id)
     
     image_paths = []
     try:
@@ -110,20 +120,18 @@ async def convert_images_to_pdf(
             
         output_path = os.path.join(temp_dir, output_filename)
         
-        # Convertir les images en PDF
-        images_to_pdf(image_paths, output_path)
+        # Convertir les images en PDF (processus supervisé : une image piégée ne
+        # peut ni bloquer la boucle d'événements ni épuiser la mémoire du serveur)
+        await run_supervised(images_to_pdf, image_paths, output_path, target_dpi=target_dpi)
         
         # Supprimer les fichiers intermédiaires en arrière-plan
         if settings.SECURE_MODE:
             for path in image_paths:
                 background_tasks.add_task(secure_delete_file, path)
         
-        # Supprimer le fichier de sortie après envoi
-        background_tasks.add_task(secure_delete_file, output_path)
-        
-        return FileResponse(
-            path=output_path,
-            filename=output_filename,
+        return result_response(
+            output_path,
+            output_filename,
             media_type="application/pdf",
             background=background_tasks
         )
@@ -132,6 +140,8 @@ async def convert_images_to_pdf(
         # Nettoyer en cas d'erreur
         for path in image_paths:
             secure_delete_file(path)
+        if isinstance(e, OperationAborted):
+            raise
         
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -170,11 +180,9 @@ async def convert_to_pdf(
     operation_id = str(uuid.uuid4())
     
     # Préparer les chemins des fichiers
-    temp_dir = os.path.join(settings.TEMP_DIR, operation_id)
-    os.makedirs(temp_dir, exist_ok=True)
+    temp_dir = create_operation_dir(operation_id)
     
     file_paths = []
-    output_paths = []
     
     try:
         # Vérifier la disponibilité de LibreOffice
@@ -197,21 +205,89 @@ async def convert_to_pdf(
         if not output_filename.lower().endswith(".pdf"):
             output_filename += ".pdf"
         
-        # Chemin final du PDF
-        final_output_path = os.path.join(temp_dir, output_filename)
-        
-        # Si nous avons plusieurs fichiers, nous devons convertir chacun individuellement
-        # puis fusionner les résultats
-        if len(files) > 1:
-            for i, file_path in enumerate(file_paths):
-                extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+        def convert(final_output_path: str, sources: List[str]) -> None:
+            """
+            Convertit les fichiers reçus (sources : leurs copies propres au
+            calcul, chacune dans son dossier) dans final_output_path
+            """
+            converted_paths = []
+            # Si nous avons plusieurs fichiers, nous devons convertir chacun individuellement
+            # puis fusionner les résultats
+            if len(files) > 1:
+                for i, file_path in enumerate(sources):
+                    extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+                
+                    # Nom du fichier de sortie temporaire
+                    temp_output = os.path.join(os.path.dirname(file_path), f"temp_output_{i}.pdf")
                 
-                # Nom du fichier de sortie temporaire
-                temp_output = os.path.join(temp_dir, f"temp_output_{i}.pdf")
+                    if extension in ["jpg", "jpeg", "png", "gif", "tif", "tiff", "bmp"]:
+                        # Pour les images, utiliser notre fonction existante (processus supervisé)
+                        supervise(images_to_pdf, [file_path], temp_output)
+                    elif has_libreoffice and extension in ["doc", "docx", "xls", "xlsx", "ppt", "pptx", "odt", "ods", "odp", "rtf", "txt"]:
+                        # Pour les documents bureautiques, utiliser LibreOffice
+                        try:
+                            libreoffice_cmd = shutil.which("libreoffice") or shutil.which("soffice")
+                            cmd = [
+                                libreoffice_cmd,
+                                "--headless",
+                                "--convert-to", "pdf",
+                                "--outdir", os.path.dirname(file_path),
+                                file_path
+                            ]
+                            with span("libreoffice", file=os.path.basename(file_path)):
+                                result = run_command(cmd)
+                        
+                            if result.returncode != 0:
+                                logger.error(f"LibreOffice conversion failed: {result.stderr}")
+                                raise HTTPException(
+                                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                    detail=f"Erreur lors de la conversion: {result.stderr}"
+                                )
+                        
+                            # LibreOffice crée le PDF avec le même nom mais extension .pdf
+                            converted_file = Path(file_path).with_suffix('.pdf')
+                        
+                            # Renommer en temp_output_{i}.pdf pour uniformiser
+                            if os.path.exists(converted_file):
+                                shutil.move(str(converted_file), temp_output)
+                        except (HTTPException, OperationAborted):
+                            raise
+                        except Exception as e:
+                            logger.error(f"LibreOffice conversion error: {str(e)}")
+                            raise HTTPException(
+                                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                detail=f"Erreur lors de la conversion: {str(e)}"
+                            )
+                    else:
+                        # Pour les autres formats, nous devrons implémenter des convertisseurs spécifiques
+                        # ou renvoyer une erreur
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Le format '{extension}' n'est pas pris en charge pour la conversion"
+                        )
                 
+                    # Ajouter à la liste des fichiers PDF à fusionner
+                    if os.path.exists(temp_output):
+                        converted_paths.append(temp_output)
+            
+                # Si nous avons des PDFs à fusionner, on les combine
+                from ....services.pdf_utils import merge_pdfs
+            
+                if len(converted_paths) > 0:
+                    supervise(merge_pdfs, converted_paths, final_output_path)
+                else:
+                    raise HTTPException(
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        detail="Aucun fichier n'a pu être converti"
+                    )
+            else:
+                # Un seul fichier à convertir
+                file_path = sources[0]
+                extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+            
                 if extension in ["jpg", "jpeg", "png", "gif", "tif", "tiff", "bmp"]:
-                    # Pour les images, utiliser notre fonction existante
-                    images_to_pdf([file_path], temp_output)
+                    # Pour les images, utiliser notre fonction existante (processus supervisé)
+                    supervise(images_to_pdf, [file_path], final_output_path)
                 elif has_libreoffice and extension in ["doc", "docx", "xls", "xlsx", "ppt", "pptx", "odt", "ods", "odp", "rtf", "txt"]:
                     # Pour les documents bureautiques, utiliser LibreOffice
                     try:
@@ -220,24 +296,27 @@ async def convert_to_pdf(
                             libreoffice_cmd,
                             "--headless",
                             "--convert-to", "pdf",
-                            "--outdir", temp_dir,
+                            "--outdir", os.path.dirname(file_path),
                             file_path
                         ]
-                        result = subprocess.run(cmd, capture_output=True, text=True)
-                        
+                        with span("libreoffice", file=os.path.basename(file_path)):
+                            result = run_command(cmd)
+                    
                         if result.returncode != 0:
                             logger.error(f"LibreOffice conversion failed: {result.stderr}")
                             raise HTTPException(
                                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                                 detail=f"Erreur lors de la conversion: {result.stderr}"
                             )
-                        
+                    
                         # LibreOffice crée le PDF avec le même nom mais extension .pdf
                         converted_file = Path(file_path).with_suffix('.pdf')
-                        
-                        # Renommer en temp_output_{i}.pdf pour uniformiser
+                    
+                        # Renommer avec le nom de sortie souhaité
                         if os.path.exists(converted_file):
-                            shutil.move(str(converted_file), temp_output)
+                            shutil.move(str(converted_file), final_output_path)
+                    except (HTTPException, OperationAborted):
+                        raise
                     except Exception as e:
                         logger.error(f"LibreOffice conversion error: {str(e)}")
                         raise HTTPException(
@@ -251,101 +330,55 @@ async def convert_to_pdf(
                         status_code=status.HTTP_400_BAD_REQUEST,
                         detail=f"Le format '{extension}' n'est pas pris en charge pour la conversion"
                     )
-                
-                # Ajouter à la liste des fichiers PDF à fusionner
-                if os.path.exists(temp_output):
-                    output_paths.append(temp_output)
-            
-            # Si nous avons des PDFs à fusionner, on les combine
-            from ....services.pdf_utils import merge_pdfs
-            
-            if len(output_paths) > 0:
-                merge_pdfs(output_paths, final_output_path)
-            else:
+        
+            # Vérifier que le fichier final existe
+            if not os.path.exists(final_output_path):
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Aucun fichier n'a pu être converti"
-                )
-        else:
-            # Un seul fichier à convertir
-            file_path = file_paths[0]
-            extension = os.path.splitext(file_path)[1].lower().lstrip('.')
-            
-            if extension in ["jpg", "jpeg", "png", "gif", "tif", "tiff", "bmp"]:
-                # Pour les images, utiliser notre fonction existante
-                images_to_pdf([file_path], final_output_path)
-            elif has_libreoffice and extension in ["doc", "docx", "xls", "xlsx", "ppt", "pptx", "odt", "ods", "odp", "rtf", "txt"]:
-                # Pour les documents bureautiques, utiliser LibreOffice
-                try:
-                    libreoffice_cmd = shutil.which("libreoffice") or shutil.which("soffice")
-                    cmd = [
-                        libreoffice_cmd,
-                        "--headless",
-                        "--convert-to", "pdf",
-                        "--outdir", temp_dir,
-                        file_path
-                    ]
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    
-                    if result.returncode != 0:
-                        logger.error(f"LibreOffice conversion failed: {result.stderr}")
-                        raise HTTPException(
-                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                            detail=f"Erreur lors de la conversion: {result.stderr}"
-                        )
-                    
-                    # LibreOffice crée le PDF avec le même nom mais extension .pdf
-                    converted_file = Path(file_path).with_suffix('.pdf')
-                    
-                    # Renommer avec le nom de sortie souhaité
-                    if os.path.exists(converted_file):
-                        shutil.move(str(converted_file), final_output_path)
-                except Exception as e:
-                    logger.error(f"LibreOffice conversion error: {str(e)}")
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"Erreur lors de la conversion: {str(e)}"
-                    )
-            else:
-                # Pour les autres formats, nous devrons implémenter des convertisseurs spécifiques
-                # ou renvoyer une erreur
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Le format '{extension}' n'est pas pris en charge pour la conversion"
+                    detail="La conversion a échoué, le fichier final n'a pas été créé"
                 )
         
-        # Vérifier que le fichier final existe
-        if not os.path.exists(final_output_path):
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="La conversion a échoué, le fichier final n'a pas été créé"
-            )
+        # Les requêtes identiques (mêmes fichiers, dans le même ordre) partagent une seule conversion
+        key = result_coalescer.make_key(
+            "convert-to-pdf",
+            [await run_in_threadpool(file_sha256, path) for path in file_paths],
+            {"extensions": [os.path.splitext(path)[1].lower() for path in file_paths]},
+        )
+        # La conversion travaille sur ses propres copies des fichiers : elle peut
+        # survivre à cette requête si d'autres clients l'attendent
+        result, source = await result_coalescer.run(key, convert, inputs=file_paths)
         
         # Nettoyer les fichiers temporaires
-        for path in file_paths + output_paths:
+        for path in file_paths:
             background_tasks.add_task(secure_delete_file, path)
         
-        # Supprimer le fichier final après envoi
-        background_tasks.add_task(secure_delete_file, final_output_path)
-        
         # Retourner le PDF résultant
-        return FileResponse(
-            path=final_output_path,
-            filename=output_filename,
-            media_type="application/pdf",
-            background=background_tasks
-        )
+        # Chaque requête conserve son propre résultat (lien vers le fichier partagé) ;
+        # le résultat partagé reste dans le cache jusqu'à son expiration
+        try:
+            return result_response(
+                result.path,
+                output_filename,
+                media_type="application/pdf",
+                headers={"X-Result-Source": source},
+                background=background_tasks,
+                copy=True
+            )
+        finally:
+            await result_coalescer.release(result)
         
     except Exception as e:
         logger.error(f"Erreur lors de la conversion: {str(e)}")
         
         # Nettoyer en cas d'erreur
-        for path in file_paths + output_paths:
+        for path in file_paths:
             try:
                 if os.path.exists(path):
                     secure_delete_file(path)
             except:
                 pass
+        if isinstance(e, OperationAborted):
+            raise
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
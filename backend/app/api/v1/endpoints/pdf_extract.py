@@ -1,14 +1,17 @@
 import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, status
-from fastapi.responses import FileResponse
-from PyPDF2 import PdfReader, PdfWriter
 import uuid
 import tempfile
 import logging
 from typing import List, Optional
 
 from ....core.config import settings
-from ....core.security import is_valid_file_extension, secure_delete_file
+from ....core.temp_manager import create_operation_dir
+from ....core.results import result_response
+from ....core.supervisor import OperationAborted, run_supervised
+from ....core.security import is_valid_file_extension, save_upload_file, secure_delete_file
+from ....services.pdf_utils import count_pages, extract_pages
+from ....services.page_selection import select_pages
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -24,7 +27,9 @@ async def extract_pages_from_pdf(
     Extrait des pages spécifiques d'un PDF dans un nouveau fichier.
     
     - **file**: Fichier PDF à traiter
-    - **pages**: Format: "1,3-5,7" (page 1, pages 3 à 5, page 7)
+    - **pages**: Format: "1,3-5,7" (page 1, pages 3 à 5, page 7) ; sont aussi acceptés
+      "10-" (jusqu'à la fin), "-1" (dernière page), "odd"/"even", un pas ("1-100:2")
+      et des exclusions ("1-20,!5")
     - **output_filename**: Nom personnalisé pour le fichier résultant (optionnel)
     
     Retourne un fichier PDF contenant uniquement les pages sélectionnées.
@@ -37,126 +42,57 @@ async def extract_pages_from_pdf(
         )
     
     # Créer un dossier temporaire
-    temp_dir = tempfile.mkdtemp(dir=settings.TEMP_DIR)
+    temp_dir = create_operation_dir()
     
     try:
-        # Sauvegarder le fichier uploadé
-        file_path = os.path.join(temp_dir, f"upload_{uuid.uuid4()}.pdf")
-        file_content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        # Sauvegarder le fichier uploadé (copie par blocs)
+        file_path = str(save_upload_file(file, temp_dir, "upload"))
         
-        # Remettre le curseur au début pour réutilisation éventuelle
-        file.file.seek(0)
+        # Le nombre de pages est lu dans l'arbre des pages, sans charger les pages
+        total_pages = count_pages(file_path)
         
-        # Ouvrir le PDF source
-        with open(file_path, 'rb') as f:
-            reader = PdfReader(f)
-            total_pages = len(reader.pages)
-            
-            # Analyser les pages à extraire
-            page_indices = parse_page_ranges(pages, total_pages)
-            
-            if not page_indices:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Aucune page valide spécifiée"
-                )
-            
-            # Créer un nouveau PDF
-            writer = PdfWriter()
-            
-            # Ajouter les pages spécifiées
-            for page_idx in page_indices:
-                try:
-                    writer.add_page(reader.pages[page_idx])
-                except IndexError:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Page {page_idx + 1} introuvable. Le PDF a {total_pages} pages."
-                    )
-            
-            # Définir le nom du fichier de sortie
-            if output_filename:
-                if not output_filename.lower().endswith('.pdf'):
-                    output_filename += '.pdf'
-            else:
-                output_filename = f"extracted_{uuid.uuid4()}.pdf"
-            
-            output_path = os.path.join(temp_dir, output_filename)
-            
-            # Sauvegarder le nouveau PDF
-            with open(output_path, "wb") as output_file:
-                writer.write(output_file)
-            
-            # Planifier la suppression des fichiers temporaires
-            background_tasks.add_task(secure_delete_file, file_path)
-            background_tasks.add_task(secure_delete_file, output_path)
-            
-            # Retourner le fichier
-            return FileResponse(
-                path=output_path,
-                filename=output_filename,
-                media_type="application/pdf",
-                background=background_tasks
+        # Analyser les pages à extraire
+        try:
+            page_indices = select_pages(pages, total_pages)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        if not page_indices:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Aucune page valide spécifiée"
             )
+        
+        # Définir le nom du fichier de sortie
+        if output_filename:
+            if not output_filename.lower().endswith('.pdf'):
+                output_filename += '.pdf'
+        else:
+            output_filename = f"extracted_{uuid.uuid4()}.pdf"
+        
+        output_path = os.path.join(temp_dir, output_filename)
+        
+        # Seules les pages sélectionnées (et leurs ressources) sont lues et copiées
+        # (la sélection est transmise telle quelle, pas la liste de ses pages)
+        await run_supervised(extract_pages, file_path, output_path, pages)
+        
+        # Planifier la suppression des fichiers temporaires
+        background_tasks.add_task(secure_delete_file, file_path)
+        
+        # Retourner le fichier
+        return result_response(
+            output_path,
+            output_filename,
+            media_type="application/pdf",
+            background=background_tasks
+        )
     
+    except (HTTPException, OperationAborted):
+        raise
+        
     except Exception as e:
         logger.error(f"Erreur lors de l'extraction des pages: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur lors de l'extraction des pages: {str(e)}"
         )
-
-def parse_page_ranges(range_str: str, total_pages: int) -> List[int]:
-    """
-    Parse une chaîne de plages de pages (ex: "1,3-5,7") en une liste d'indices de pages.
-    Les numéros de pages commencent à 1, mais retourne des indices 0-based pour PyPDF2.
-    """
-    page_indices = []
-    
-    # Diviser la chaîne en plages séparées par des virgules
-    parts = range_str.split(",")
-    
-    for part in parts:
-        part = part.strip()
-        
-        # Cas d'une plage (ex: "3-7")
-        if "-" in part:
-            try:
-                start, end = part.split("-")
-                start = int(start.strip())
-                end = int(end.strip())
-                
-                # Vérifier que les pages sont dans les limites
-                if start < 1:
-                    start = 1
-                if end > total_pages:
-                    end = total_pages
-                
-                # Ajouter toutes les pages de la plage
-                for i in range(start - 1, end):  # 0-indexed pour PyPDF2
-                    if i not in page_indices:
-                        page_indices.append(i)
-                        
-            except ValueError:
-                raise ValueError(f"Format de plage invalide: {part}")
-                
-        # Cas d'une page unique
-        else:
-            try:
-                page = int(part)
-                
-                # Vérifier que la page est dans les limites
-                if 1 <= page <= total_pages:
-                    page_idx = page - 1  # 0-indexed pour PyPDF2
-                    if page_idx not in page_indices:
-                        page_indices.append(page_idx)
-                        
-            except ValueError:
-                raise ValueError(f"Numéro de page invalide: {part}")
-    
-    # Trier les indices de pages
-    page_indices.sort()
-    
-    return page_indices 
\ No newline at end of file
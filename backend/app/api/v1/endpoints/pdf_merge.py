@@ -1,11 +1,7 @@
 # Importation de FastAPI pour créer une sous-route (APIRouter = route modulaire)
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Request
-# Pour renvoyer un fichier en réponse (le PDF fusionné)
-from fastapi.responses import FileResponse
 # Pour les types comme List
 from typing import List, Dict, Any
-# Librairie pour manipuler des PDF (ici pour les fusionner)
-from PyPDF2 import PdfMerger
 # Pour créer un dossier temporaire où stocker les fichiers PDF à traiter
 import tempfile
 # Pour gérer les fichiers/dossiers localement
@@ -16,6 +12,9 @@ import re
 import logging
 
 from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.results import result_response
+from ....core.supervisor import OperationAborted, run_supervised
 from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
 from ....services.pdf_utils import merge_pdfs
 
@@ -74,8 +73,7 @@ async def merge_pdf_files(
     operation_id = str(uuid.uuid4())
     
     # Préparer les chemins des fichiers
-    temp_dir = os.path.join(settings.TEMP_DIR, operation_id)
-    os.makedirs(temp_dir, exist_ok=True)
+    temp_dir = create_operation_dir(operation_id)
     
     pdf_paths = []
     try:
@@ -105,7 +103,7 @@ async def merge_pdf_files(
         output_path = os.path.join(temp_dir, output_filename)
         
         # Fusionner les PDF
-        merge_pdfs(pdf_paths, output_path)
+        await run_supervised(merge_pdfs, pdf_paths, output_path)
         
         # Supprimer les fichiers intermédiaires en arrière-plan
         if settings.SECURE_MODE:
@@ -113,11 +111,9 @@ async def merge_pdf_files(
                 background_tasks.add_task(secure_delete_file, path)
         
         # Renvoyer le fichier fusionné
-        background_tasks.add_task(secure_delete_file, output_path)
-        
-        return FileResponse(
-            path=output_path,
-            filename=output_filename,
+        return result_response(
+            output_path,
+            output_filename,
             media_type="application/pdf",
             background=background_tasks
         )
@@ -129,6 +125,8 @@ async def merge_pdf_files(
                 secure_delete_file(path)
             except:
                 pass
+        if isinstance(e, OperationAborted):
+            raise
         
         logger.error(f"Erreur lors de la fusion des PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
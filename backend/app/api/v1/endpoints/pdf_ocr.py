@@ -0,0 +1,128 @@
+import os
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+import uuid
+
+from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.results import result_response
+from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
+from ....core.supervisor import OperationAborted
+from ....services.ocr_utils import ocr_pdf, get_progress, OCR_ENGINES
+
+router = APIRouter()
+
+
+@router.post("/ocr", summary="Rendre un PDF scanné recherchable (OCR)")
+async def ocr_pdf_file(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    lang: str = Form("fra+eng"),
+    dpi: Optional[int] = Form(None),
+    engine: str = Form("tesseract"),
+    max_concurrency: Optional[int] = Form(None),
+    skip_text_pages: bool = Form(True),
+    use_cache: bool = Form(True),
+    job_id: Optional[str] = Form(None),
+    output_filename: str = Form(None)
+):
+    """
+    Reconnaît le texte des pages et l'ajoute au PDF sous forme de couche invisible.
+
+    - **file**: Fichier PDF à traiter
+    - **lang**: Langues Tesseract (ex: "fra+eng")
+    - **dpi**: Résolution de rendu des pages (optionnel)
+    - **engine**: Moteur de reconnaissance (tesseract, stub)
+    - **max_concurrency**: Nombre maximal de pages reconnues en parallèle (optionnel)
+    - **skip_text_pages**: Ne pas reconnaître les pages qui contiennent déjà du texte
+    - **use_cache**: Réutiliser les résultats des pages déjà reconnues
+    - **job_id**: Identifiant permettant de suivre la progression via /ocr/progress/{job_id} (optionnel)
+    - **output_filename**: Nom du fichier de sortie (optionnel)
+    """
+
+    # Vérifier que le fichier est un PDF
+    if not is_valid_file_extension(file.filename, settings.ALLOWED_EXTENSIONS["pdf"]):
+        raise HTTPException(status_code=400, detail="Le fichier n'est pas un PDF valide")
+
+    if engine not in OCR_ENGINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Moteur invalide. Valeurs acceptées: {', '.join(OCR_ENGINES)}"
+        )
+
+    if dpi is not None and not 50 <= dpi <= 600:
+        raise HTTPException(status_code=400, detail="La résolution doit être comprise entre 50 et 600 DPI")
+
+    if max_concurrency is not None and max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency doit être supérieur ou égal à 1")
+
+    # Créer un identifiant unique pour cette opération
+    operation_id = str(uuid.uuid4())
+    job_id = job_id or operation_id
+
+    # Préparer les chemins des fichiers
+    temp_dir = create_operation_dir(operation_id)
+
+    try:
+        # Sauvegarder le fichier PDF
+        pdf_path = save_upload_file(file, temp_dir, "upload")
+
+        # Définir le nom du fichier de sortie
+        if not output_filename:
+            base_name = os.path.splitext(os.path.basename(file.filename))[0]
+            output_filename = f"{base_name}_ocr.pdf"
+        elif not output_filename.lower().endswith(".pdf"):
+            output_filename += ".pdf"
+
+        output_path = os.path.join(temp_dir, output_filename)
+
+        # Reconnaissance hors de la boucle d'événements pour que la progression reste consultable
+        summary = await run_in_threadpool(
+            ocr_pdf, str(pdf_path), output_path,
+            lang=lang, dpi=dpi, engine=engine,
+            max_concurrency=max_concurrency, job_id=job_id,
+            skip_text_pages=skip_text_pages, use_cache=use_cache
+        )
+
+        # Supprimer le fichier intermédiaire en arrière-plan
+        if settings.SECURE_MODE:
+            background_tasks.add_task(secure_delete_file, str(pdf_path))
+
+        return result_response(
+            output_path,
+            output_filename,
+            media_type="application/pdf",
+            headers={
+                "X-OCR-Job-Id": job_id,
+                "X-OCR-Pages": str(summary["recognized_pages"]),
+                "X-OCR-Cached-Pages": str(summary["cached_pages"]),
+                "X-OCR-Skipped-Pages": str(summary["skipped_pages"]),
+                "X-OCR-Words": str(summary["words"]),
+            },
+            background=background_tasks
+        )
+
+    except Exception as e:
+        # Nettoyer en cas d'erreur
+        if 'pdf_path' in locals():
+            secure_delete_file(str(pdf_path))
+        if isinstance(e, OperationAborted):
+            raise
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=400, detail=str(e))
+
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/ocr/progress/{job_id}", summary="Progression d'une reconnaissance de texte")
+async def ocr_progress(job_id: str):
+    """
+    Renvoie l'avancement d'une opération OCR (pages reconnues / total).
+
+    - **job_id**: Identifiant fourni lors de l'appel à /ocr
+    """
+    progress = get_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Opération OCR introuvable")
+    return {"job_id": job_id, **progress}
@@ -1,13 +1,16 @@
 import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
 from typing import List
 import tempfile
 import uuid
 
 from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.results import result_response
+from ....core.supervisor import OperationAborted, run_supervised
 from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
 from ....services.pdf_utils import remove_pages
+from ....services.page_selection import parse_page_selection
 
 router = APIRouter()
 
@@ -16,14 +19,15 @@ router = APIRouter()
 async def remove_pdf_pages(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    pages: str = Form(...),  # Format: "1,3,5-7"
+    pages: str = Form(...),  # Format: "1,3,5-7", "even", "-1", "10-"...
     output_filename: str = Form(None)
 ):
     """
     Supprime des pages spécifiques d'un fichier PDF.
     
     - **file**: Fichier PDF source
-    - **pages**: Pages à supprimer (format: "1,3,5-7")
+    - **pages**: Pages à supprimer (format: "1,3,5-7" ; aussi "10-", "-1", "odd"/"even"
+      ou "1-100:2")
     - **output_filename**: Nom du fichier de sortie (optionnel)
     """
     
@@ -31,12 +35,17 @@ async def remove_pdf_pages(
     if not is_valid_file_extension(file.filename, settings.ALLOWED_EXTENSIONS["pdf"]):
         raise HTTPException(status_code=400, detail="Le fichier n'est pas un PDF valide")
     
+    # Vérifier la syntaxe de la sélection avant de recevoir le fichier
+    try:
+        parse_page_selection(pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # Créer un identifiant unique pour cette opération
     operation_id = str(uuid.uuid4())
     
     # Préparer les chemins des fichiers
-    temp_dir = os.path.join(settings.TEMP_DIR, operation_id)
-    os.makedirs(temp_dir, exist_ok=True)
+    temp_dir = create_operation_dir(operation_id)
     
     try:
         # Sauvegarder le fichier PDF
@@ -51,29 +60,16 @@ async def remove_pdf_pages(
             
         output_path = os.path.join(temp_dir, output_filename)
         
-        # Traiter la chaîne de pages (convertir "1,3,5-7" en liste d'entiers)
-        page_list = []
-        for part in pages.split(','):
-            part = part.strip()
-            if '-' in part:
-                start, end = map(int, part.split('-'))
-                page_list.extend(range(start, end + 1))
-            else:
-                page_list.append(int(part))
-        
-        # Supprimer les pages
-        remove_pages(str(pdf_path), output_path, page_list)
+        # Supprimer les pages (la sélection est résolue sur le nombre de pages du document)
+        await run_supervised(remove_pages, str(pdf_path), output_path, pages)
         
         # Supprimer le fichier intermédiaire en arrière-plan
         if settings.SECURE_MODE:
             background_tasks.add_task(secure_delete_file, str(pdf_path))
         
-        # Supprimer le fichier de sortie après envoi
-        background_tasks.add_task(secure_delete_file, output_path)
-        
-        return FileResponse(
-            path=output_path,
-            filename=output_filename,
+        return result_response(
+            output_path,
+            output_filename,
             media_type="application/pdf",
             background=background_tasks
         )
@@ -82,5 +78,7 @@ async def remove_pdf_pages(
         # Nettoyer en cas d'erreur
         if 'pdf_path' in locals():
             secure_delete_file(str(pdf_path))
+        if isinstance(e, OperationAborted):
+            raise
         
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
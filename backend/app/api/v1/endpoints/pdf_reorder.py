@@ -1,16 +1,34 @@
 import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
-from typing import List
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
 import tempfile
 import uuid
 import json
+import logging
 
 from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.results import result_response
+from ....core.supervisor import (
+    OperationAborted, OperationCancelled, cancellation_scope, current_token, run_supervised
+)
 from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
-from ....services.pdf_utils import reorder_pages, get_pdf_info
+from ....services.pdf_utils import (
+    reorder_pages, get_pdf_info, pdf_info_stream, page_thumbnail, INFO_LAYOUTS, THUMBNAIL_FORMATS
+)
+from ....services.render_utils import render_backend
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Formats de réponse de /get-pdf-info
+INFO_FORMATS = ("json", "ndjson")
+
+# Largeur des miniatures (pixels)
+THUMBNAIL_MIN_WIDTH = 16
+THUMBNAIL_MAX_WIDTH = 2000
 
 
 @router.post("/reorder", summary="Réorganiser les pages d'un PDF")
@@ -36,8 +54,7 @@ async def reorder_pdf_pages(
     operation_id = str(uuid.uuid4())
     
     # Préparer les chemins des fichiers
-    temp_dir = os.path.join(settings.TEMP_DIR, operation_id)
-    os.makedirs(temp_dir, exist_ok=True)
+    temp_dir = create_operation_dir(operation_id)
     
     try:
         # Sauvegarder le fichier PDF
@@ -62,7 +79,7 @@ async def reorder_pdf_pages(
             raise HTTPException(status_code=400, detail="Format JSON invalide pour le nouvel ordre")
         
         # Obtenir les informations sur le PDF pour vérifier que l'ordre est valide
-        pdf_info = get_pdf_info(str(pdf_path))
+        pdf_info = await run_supervised(get_pdf_info, str(pdf_path))
         total_pages = pdf_info["total_pages"]
         
         # Vérifier que le nouvel ordre contient le bon nombre de pages
@@ -81,18 +98,15 @@ async def reorder_pdf_pages(
                 )
         
         # Réorganiser les pages
-        reorder_pages(str(pdf_path), output_path, pages_order)
+        await run_supervised(reorder_pages, str(pdf_path), output_path, pages_order)
         
         # Supprimer le fichier intermédiaire en arrière-plan
         if settings.SECURE_MODE:
             background_tasks.add_task(secure_delete_file, str(pdf_path))
         
-        # Supprimer le fichier de sortie après envoi
-        background_tasks.add_task(secure_delete_file, output_path)
-        
-        return FileResponse(
-            path=output_path,
-            filename=output_filename,
+        return result_response(
+            output_path,
+            output_filename,
             media_type="application/pdf",
             background=background_tasks
         )
@@ -101,6 +115,8 @@ async def reorder_pdf_pages(
         # Nettoyer en cas d'erreur
         if 'pdf_path' in locals():
             secure_delete_file(str(pdf_path))
+        if isinstance(e, OperationAborted):
+            raise
         
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -108,42 +124,175 @@ async def reorder_pdf_pages(
 @router.post("/get-pdf-info", summary="Obtenir les informations d'un PDF")
 async def get_pdf_metadata(
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    start_page: int = Form(1),
+    page_limit: Optional[int] = Form(None),
+    format: str = Form("json"),
+    layout: str = Form("pages")
 ):
     """
     Récupère les métadonnées et informations sur un PDF.
     Utile pour l'UI de réorganisation des pages.
     
     - **file**: Fichier PDF source
+    - **start_page**: Première page décrite (défaut : 1)
+    - **page_limit**: Nombre de pages décrites (défaut : toutes) ; la réponse
+      indique alors `next_start_page` pour demander la tranche suivante
+    - **format**: "json" (une seule réponse) ou "ndjson" (un objet JSON par
+      ligne : le document, puis chaque page dès qu'elle est analysée)
+    - **layout**: en JSON, "pages" (un objet par page) ou "columns" (colonnes
+      compactes : tailles par plages de pages identiques, puis rotation et
+      présence de texte par page), bien plus légères pour les gros documents
     """
     
     # Vérifier que le fichier est un PDF
     if not is_valid_file_extension(file.filename, settings.ALLOWED_EXTENSIONS["pdf"]):
         raise HTTPException(status_code=400, detail="Le fichier n'est pas un PDF valide")
     
+    if start_page < 1 or (page_limit is not None and page_limit < 1):
+        raise HTTPException(status_code=400, detail="start_page et page_limit doivent être supérieurs ou égaux à 1")
+    
+    if format not in INFO_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format invalide. Valeurs acceptées: {', '.join(INFO_FORMATS)}"
+        )
+    
+    if layout not in INFO_LAYOUTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Disposition invalide. Valeurs acceptées: {', '.join(INFO_LAYOUTS)}"
+        )
+    
     # Créer un identifiant unique pour cette opération
     operation_id = str(uuid.uuid4())
     
     # Préparer les chemins des fichiers
-    temp_dir = os.path.join(settings.TEMP_DIR, operation_id)
-    os.makedirs(temp_dir, exist_ok=True)
+    temp_dir = create_operation_dir(operation_id)
     
     try:
         # Sauvegarder le fichier PDF
         pdf_path = save_upload_file(file, temp_dir, "upload")
         
+        if format == "ndjson":
+            # Diffusion hors processus supervisé (une page décrite à la fois,
+            # mémoire bornée) : l'ouverture du document et chaque page passent par
+            # le threadpool, sous le jeton de la requête (durée, déconnexion)
+            token = current_token()
+            try:
+                header, records = await run_in_threadpool(pdf_info_stream, str(pdf_path), start_page, page_limit)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            def next_record():
+                with cancellation_scope(token):
+                    return next(records, None)
+            
+            async def ndjson():
+                yield json.dumps(header, ensure_ascii=False) + "\n"
+                try:
+                    while True:
+                        record = await run_in_threadpool(next_record)
+                        if record is None:
+                            break
+                        yield json.dumps(record, ensure_ascii=False) + "\n"
+                except OperationCancelled:
+                    # Client déconnecté : personne ne lira la suite
+                    return
+                except Exception as e:
+                    # Les en-têtes sont déjà envoyés : signaler l'erreur dans le flux
+                    logger.error(f"Erreur lors de l'analyse du PDF: {str(e)}")
+                    yield json.dumps({"type": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+                finally:
+                    records.close()
+            
+            # Supprimer le fichier après envoi
+            background_tasks.add_task(secure_delete_file, str(pdf_path))
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson", background=background_tasks)
+        
         # Obtenir les informations sur le PDF
-        pdf_info = get_pdf_info(str(pdf_path))
+        pdf_info = await run_supervised(get_pdf_info, str(pdf_path), start_page, page_limit, layout)
         
         # Supprimer le fichier intermédiaire en arrière-plan
         if settings.SECURE_MODE:
             background_tasks.add_task(secure_delete_file, str(pdf_path))
         
-        return pdf_info
+        # Déjà sérialisable : éviter le parcours de jsonable_encoder sur chaque page
+        return JSONResponse(content=pdf_info, background=background_tasks)
+        
+    except HTTPException:
+        if 'pdf_path' in locals():
+            secure_delete_file(str(pdf_path))
+        raise
         
     except Exception as e:
         # Nettoyer en cas d'erreur
         if 'pdf_path' in locals():
             secure_delete_file(str(pdf_path))
+        if isinstance(e, OperationAborted):
+            raise
         
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/page-thumbnail", summary="Obtenir la miniature d'une page")
+async def get_page_thumbnail(
+    file: UploadFile = File(...),
+    page: int = Form(1),
+    width: int = Form(150),
+    format: str = Form("png")
+):
+    """
+    Rend une page en image réduite, pour l'UI de réorganisation des pages.
+    
+    - **file**: Fichier PDF source
+    - **page**: Numéro de la page (défaut : 1)
+    - **width**: Largeur de la miniature en pixels (défaut : 150)
+    - **format**: "png" ou "jpeg"
+    """
+    
+    # Vérifier que le fichier est un PDF
+    if not is_valid_file_extension(file.filename, settings.ALLOWED_EXTENSIONS["pdf"]):
+        raise HTTPException(status_code=400, detail="Le fichier n'est pas un PDF valide")
+    
+    if not THUMBNAIL_MIN_WIDTH <= width <= THUMBNAIL_MAX_WIDTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"La largeur doit être comprise entre {THUMBNAIL_MIN_WIDTH} et {THUMBNAIL_MAX_WIDTH} pixels"
+        )
+    
+    if format not in THUMBNAIL_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format invalide. Valeurs acceptées: {', '.join(THUMBNAIL_FORMATS)}"
+        )
+    
+    # Créer un identifiant unique pour cette opération
+    operation_id = str(uuid.uuid4())
+    
+    # Préparer les chemins des fichiers
+    temp_dir = create_operation_dir(operation_id)
+    
+    try:
+        # Sauvegarder le fichier PDF
+        pdf_path = save_upload_file(file, temp_dir, "upload")
+        
+        try:
+            # Moteur de rendu déterminé ici : le processus supervisé ne le mesure pas à nouveau
+            backend = await run_in_threadpool(render_backend)
+            thumbnail = await run_supervised(page_thumbnail, str(pdf_path), page, width, format, backend)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        return Response(content=thumbnail, media_type=THUMBNAIL_FORMATS[format][1])
+        
+    except (HTTPException, OperationAborted):
+        raise
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+        
+    finally:
+        # Miniature renvoyée en mémoire : le fichier source n'est plus utile
+        if 'pdf_path' in locals():
+            secure_delete_file(str(pdf_path))
@@ -0,0 +1,76 @@
+import logging
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Query
+from fastapi.concurrency import run_in_threadpool
+import uuid
+
+from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.document_store import document_store
+from ....core.supervisor import OperationAborted
+from ....core.security import save_upload_file, is_valid_file_extension
+from ....services.search_utils import search_document, complete_search_index
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.post("/documents", summary="Déposer un PDF pour des opérations ultérieures")
+async def upload_document(
+    file: UploadFile = File(...)
+):
+    """
+    Range un PDF dans le stockage adressé par contenu et renvoie son identifiant.
+    Un fichier identique déjà déposé conserve le même identifiant (et son index).
+
+    - **file**: Fichier PDF à déposer
+    """
+    # Vérifier que le fichier est un PDF
+    if not is_valid_file_extension(file.filename, settings.ALLOWED_EXTENSIONS["pdf"]):
+        raise HTTPException(status_code=400, detail="Le fichier n'est pas un PDF valide")
+
+    operation_id = str(uuid.uuid4())
+    temp_dir = create_operation_dir(operation_id)
+
+    try:
+        pdf_path = save_upload_file(file, temp_dir, "upload")
+        document_id = await run_in_threadpool(document_store.put, str(pdf_path))
+        return {"document_id": document_id, "filename": file.filename}
+
+    except Exception as e:
+        logger.error(f"Erreur lors du dépôt du document: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/search", summary="Rechercher du texte dans un document déposé")
+async def search_in_document(
+    background_tasks: BackgroundTasks,
+    document_id: str = Query(..., description="Identifiant renvoyé par /documents"),
+    q: str = Query(..., min_length=1, description="Termes recherchés"),
+    start_page: int = Query(1, ge=1, description="Page à partir de laquelle chercher"),
+    limit: int = Query(20, ge=1, le=500, description="Nombre maximal de pages renvoyées")
+):
+    """
+    Renvoie les pages contenant tous les termes recherchés et les rectangles
+    à surligner ([x0, y0, x1, y1] en points, origine en haut à gauche).
+
+    La première recherche construit l'index du document au fur et à mesure ;
+    l'indexation des pages restantes se poursuit en arrière-plan.
+    Utiliser `next_page` comme `start_page` pour obtenir la suite des résultats.
+    """
+    try:
+        # Extraction du texte et indexation : hors de la boucle d'événements
+        result = await run_in_threadpool(search_document, document_id, q, start_page=start_page, limit=limit)
+    except OperationAborted:
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not result["index_complete"]:
+        background_tasks.add_task(complete_search_index, document_id)
+
+    return result
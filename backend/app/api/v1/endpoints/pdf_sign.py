@@ -1,16 +1,24 @@
 import os
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError, parse_obj_as
 from typing import List, Optional
 import tempfile
 import uuid
 import json
+import logging
 
 from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.results import result_response
+from ....core.supervisor import OperationAborted, run_supervised
 from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
-from ....services.pdf_utils import add_signature
+from ....services.pdf_utils import add_signature, decode_signature, sign_pdfs_batch
+from ....services.file_utils import stream_zip, unique_name
+from ....schemas.pdf import SignaturePosition
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 @router.post("/sign", summary="Ajouter une signature à un PDF")
@@ -58,8 +66,7 @@ async def sign_pdf(
     operation_id = str(uuid.uuid4())
     
     # Préparer les chemins des fichiers
-    temp_dir = os.path.join(settings.TEMP_DIR, operation_id)
-    os.makedirs(temp_dir, exist_ok=True)
+    temp_dir = create_operation_dir(operation_id)
     
     try:
         # Sauvegarder le fichier PDF
@@ -90,7 +97,8 @@ async def sign_pdf(
             raise HTTPException(status_code=400, detail="Format JSON invalide pour la position")
         
         # Ajouter la signature
-        add_signature(
+        await run_supervised(
+            add_signature,
             str(pdf_path),
             output_path,
             str(signature_path) if signature_path else None,
@@ -104,12 +112,9 @@ async def sign_pdf(
             if signature_path:
                 background_tasks.add_task(secure_delete_file, str(signature_path))
         
-        # Supprimer le fichier de sortie après envoi
-        background_tasks.add_task(secure_delete_file, output_path)
-        
-        return FileResponse(
-            path=output_path,
-            filename=output_filename,
+        return result_response(
+            output_path,
+            output_filename,
             media_type="application/pdf",
             background=background_tasks
         )
@@ -120,5 +125,120 @@ async def sign_pdf(
             secure_delete_file(str(pdf_path))
         if 'signature_path' in locals() and signature_path:
             secure_delete_file(str(signature_path))
+        if isinstance(e, OperationAborted):
+            raise
+        
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/sign-batch", summary="Signer plusieurs PDF ou plusieurs emplacements en une fois")
+async def sign_pdf_batch(
+    files: List[UploadFile] = File(...),
+    signature_image: Optional[UploadFile] = File(None),
+    signature_data: Optional[str] = Form(None),
+    placements: str = Form(...),  # JSON: [{"page": 1, "x": 10, "y": 20, "width": 100, "height": 50}, ...]
+    output_filename: str = Form(None)
+):
+    """
+    Applique la même signature à un ou plusieurs PDF, à un ou plusieurs emplacements.
+    La signature est décodée une seule fois et chaque document ne contient qu'une
+    copie de l'image, référencée par tous ses emplacements. Les documents sont
+    traités en parallèle et renvoyés dans une archive ZIP envoyée au fil de l'eau.
+    
+    - **files**: Fichiers PDF à signer
+    - **signature_image**: Image de signature uploadée (optionnel si signature_data fourni)
+    - **signature_data**: Données base64 de la signature dessinée (optionnel si signature_image fourni)
+    - **placements**: Liste JSON d'emplacements (même format que la position de /sign),
+      appliqués à chaque document
+    - **output_filename**: Nom de l'archive ZIP (optionnel)
+    """
+    
+    # Vérifier que les fichiers sont des PDF
+    for file in files:
+        if not is_valid_file_extension(file.filename, settings.ALLOWED_EXTENSIONS["pdf"]):
+            raise HTTPException(status_code=400, detail=f"Le fichier {file.filename} n'est pas un PDF valide")
+    
+    # Vérifier qu'une signature est fournie (image ou données)
+    if not signature_image and not signature_data:
+        raise HTTPException(
+            status_code=400,
+            detail="Vous devez fournir soit une image de signature, soit des données de signature dessinée"
+        )
+    
+    if signature_image and not is_valid_file_extension(
+        signature_image.filename,
+        settings.ALLOWED_EXTENSIONS["image"]
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="L'image de signature doit être au format JPEG, PNG, GIF ou BMP"
+        )
+    
+    # Valider les emplacements (un objet seul est accepté)
+    try:
+        placements_data = json.loads(placements)
+        if isinstance(placements_data, dict):
+            placements_data = [placements_data]
+        positions = [p.dict() for p in parse_obj_as(List[SignaturePosition], placements_data)]
+    except (json.JSONDecodeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Format JSON invalide pour les emplacements: {str(e)}")
+    if not positions:
+        raise HTTPException(status_code=400, detail="Au moins un emplacement de signature est requis")
+    
+    # Créer un identifiant unique pour cette opération
+    operation_id = str(uuid.uuid4())
+    temp_dir = create_operation_dir(operation_id)
+    
+    saved = []
+    try:
+        # Décoder la signature une seule fois pour tout le lot
+        signature_path = save_upload_file(signature_image, temp_dir, "signature") if signature_image else None
+        signature = decode_signature(str(signature_path) if signature_path else None, signature_data)
+        if signature_path and settings.SECURE_MODE:
+            secure_delete_file(str(signature_path))
         
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        # Sauvegarder les PDF et préparer les noms de sortie
+        used_names = set()
+        for index, file in enumerate(files):
+            pdf_path = save_upload_file(file, temp_dir, f"upload{index}")
+            base_name = os.path.splitext(os.path.basename(file.filename))[0]
+            arcname = unique_name(f"{base_name}_signe.pdf", used_names)
+            saved.append((str(pdf_path), os.path.join(temp_dir, f"signed{index}.pdf"), arcname))
+    
+    except Exception as e:
+        for pdf_path, _, _ in saved:
+            secure_delete_file(pdf_path)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    arcnames = {output_path: arcname for _, output_path, arcname in saved}
+    
+    def entries():
+        errors = []
+        try:
+            results = sign_pdfs_batch([(pdf_path, output_path) for pdf_path, output_path, _ in saved], signature, positions)
+            for pdf_path, output_path, error in results:
+                secure_delete_file(pdf_path)
+                if error is not None:
+                    logger.error(f"Erreur lors de la signature de {arcnames[output_path]}: {error}")
+                    errors.append({"file": arcnames[output_path], "error": error})
+                    continue
+                yield arcnames[output_path], output_path, None
+                secure_delete_file(output_path)
+            if errors:
+                # Les documents en échec sont signalés dans l'archive sans interrompre le lot
+                yield "erreurs.json", None, json.dumps(errors, ensure_ascii=False, indent=2).encode("utf-8")
+        finally:
+            for pdf_path, output_path, _ in saved:
+                secure_delete_file(pdf_path)
+                secure_delete_file(output_path)
+    
+    if not output_filename:
+        output_filename = "documents_signes.zip"
+    elif not output_filename.lower().endswith(".zip"):
+        output_filename += ".zip"
+    
+    return StreamingResponse(
+        stream_zip(entries()),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{output_filename}"'}
+    )
@@ -1,16 +1,22 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, status, Query
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from PyPDF2 import PdfReader, PdfWriter
+from fastapi.concurrency import run_in_threadpool
 import os
 import uuid
 import tempfile
 import shutil
 from typing import List, Optional
-import zipfile
 from app.core.security import save_upload_file, secure_delete_file, is_valid_file_extension
 from app.core.config import settings
-from app.services.pdf_utils import split_pdf
+from app.core.temp_manager import create_operation_dir, temp_manager
+from app.core.results import result_response
+from app.core.metrics import time_stage
+from app.core.supervisor import OperationAborted, run_supervised
+# split_pdf est aussi le nom de la route /split
+from app.services.pdf_utils import count_pages, extract_pages, split_pdf as split_into_files
+from app.services.file_utils import unique_name, write_zip
+from app.services.page_selection import select_pages
 import json
 import re
 import logging
@@ -34,7 +40,8 @@ async def split_pdf(
     Divise un PDF en extrayant les pages spécifiées selon les plages indiquées.
     
     - **file**: Fichier PDF à diviser
-    - **pages**: Format: "1,3-5,7" (page 1, pages 3 à 5, page 7)
+    - **pages**: Format: "1,3-5,7" (page 1, pages 3 à 5, page 7) ; sont aussi acceptés
+      "10-", "-1", "odd"/"even", un pas ("1-100:2") et des exclusions ("1-20,!5")
     - **output_filename**: Nom personnalisé pour le fichier résultant (optionnel)
     - **clean_after**: Si True, les fichiers temporaires sont supprimés après traitement
     - **metadata**: Si True, renvoie des informations sur le fichier traité
@@ -52,14 +59,8 @@ async def split_pdf(
     temp_dir = create_temp_dir()
     
     try:
-        # Sauvegarder le fichier uploadé
-        file_path = os.path.join(temp_dir, f"upload_{uuid.uuid4()}.pdf")
-        file_content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-        
-        # Remettre le curseur au début pour réutilisation éventuelle
-        file.file.seek(0)
+        # Sauvegarder le fichier uploadé (copie par blocs)
+        file_path = str(save_upload_file(file, temp_dir, "upload"))
         
         # Vérifier que le fichier est un PDF valide
         if not validate_pdf_file(file_path):
@@ -68,22 +69,24 @@ async def split_pdf(
                 detail=f"Le fichier {file.filename} n'est pas un PDF valide"
             )
         
-        # Obtenir le nombre de pages
-        with open(file_path, 'rb') as f:
-            reader = PdfReader(f)
-            total_pages = len(reader.pages)
+        # Obtenir le nombre de pages (sans charger les pages)
+        total_pages = count_pages(file_path)
         
         # Vérifier que la chaîne des plages de pages est valide
         try:
-            pages_indices = parse_page_ranges(pages, total_pages)
-        except HTTPException:
-            raise
+            pages_indices = select_pages(pages, total_pages)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Format de plage de pages invalide: {str(e)}"
             )
         
+        if not pages_indices:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Aucune page valide spécifiée"
+            )
+        
         # Créer un nom de fichier unique pour le résultat
         if output_filename:
             # S'assurer que le nom du fichier se termine par .pdf
@@ -95,26 +98,12 @@ async def split_pdf(
         # Chemin complet du fichier de sortie
         output_path = os.path.join(temp_dir, output_filename)
         
-        # Créer un nouveau PDF pour le résultat
-        writer = PdfWriter()
-        
-        # Ouvrir à nouveau le fichier PDF
-        with open(file_path, 'rb') as f:
-            reader = PdfReader(f)
-            
-            # Ajouter les pages demandées au nouveau PDF
-            for page_idx in pages_indices:
-                try:
-                    writer.add_page(reader.pages[page_idx])
-                except IndexError:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Page {page_idx + 1} introuvable. Le PDF a {total_pages} pages."
-                    )
-        
-        # Sauvegarder le résultat
-        with open(output_path, "wb") as output_file:
-            writer.write(output_file)
+        # Créer le PDF résultat : seules les pages demandées (et leurs ressources) sont lues
+        try:
+            # La sélection est transmise telle quelle, pas la liste de ses pages
+            await run_supervised(extract_pages, file_path, output_path, pages)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         
         # Récupérer la taille du fichier résultant
         output_size = os.path.getsize(output_path)
@@ -148,15 +137,15 @@ async def split_pdf(
             if clean_after or settings.SECURE_MODE:
                 background_tasks.add_task(clean_temp_files, temp_dir=temp_dir)
             
-            return FileResponse(
+            return result_response(
                 output_path,
                 filename=output_filename,
                 media_type="application/pdf",
                 background=background_tasks
             )
     
-    except HTTPException:
-        # Nettoyer les fichiers temporaires en cas d'erreur HTTP
+    except (HTTPException, OperationAborted):
+        # Nettoyer les fichiers temporaires en cas d'erreur HTTP ou d'interruption
         background_tasks.add_task(clean_temp_files, temp_dir=temp_dir)
         raise
         
@@ -204,14 +193,8 @@ async def split_pdf_to_multiple(
     os.makedirs(output_dir, exist_ok=True)
     
     try:
-        # Sauvegarder le fichier uploadé
-        file_path = os.path.join(temp_dir, f"upload_{uuid.uuid4()}.pdf")
-        file_content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-        
-        # Remettre le curseur au début pour réutilisation éventuelle
-        file.file.seek(0)
+        # Sauvegarder le fichier uploadé (copie par blocs)
+        file_path = str(save_upload_file(file, temp_dir, "upload"))
         
         # Vérifier que le fichier est un PDF valide
         if not validate_pdf_file(file_path):
@@ -225,62 +208,33 @@ async def split_pdf_to_multiple(
             # Utiliser le nom du fichier original sans extension
             prefix = os.path.splitext(file.filename)[0]
         
-        # Ouvrir le PDF source
-        with open(file_path, 'rb') as f:
-            reader = PdfReader(f)
-            total_pages = len(reader.pages)
-            
-            # Vérifier que le PDF a au moins une page
-            if total_pages < 1:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Le PDF ne contient aucune page"
-                )
-            
-            # Créer un fichier PDF séparé pour chaque page
-            output_files = []
-            
-            for i in range(total_pages):
-                # Créer un nom de fichier avec numéro de page
-                if include_page_numbers:
-                    output_filename = f"{prefix}_page_{i+1}.pdf"
-                else:
-                    output_filename = f"{prefix}_{i+1}.pdf"
-                
-                output_path = os.path.join(output_dir, output_filename)
-                output_files.append(output_path)
-                
-                # Créer un nouveau PDF pour cette page
-                writer = PdfWriter()
-                writer.add_page(reader.pages[i])
-                
-                # Sauvegarder la page
-                with open(output_path, "wb") as output_file:
-                    writer.write(output_file)
+        # Créer un fichier PDF séparé pour chaque page (processus supervisé)
+        parts = await run_supervised(split_into_files, file_path, output_dir, "all")
         
-        # Créer un fichier ZIP contenant tous les fichiers PDF
+        # Créer un fichier ZIP contenant tous les fichiers PDF (hors de la boucle d'événements)
         zip_filename = f"{prefix}_all_pages.zip"
         zip_path = os.path.join(temp_dir, zip_filename)
+        label = "page_" if include_page_numbers else ""
         
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            for output_file in output_files:
-                # Ajouter chaque fichier PDF au ZIP en ne conservant que le nom du fichier
-                zipf.write(output_file, os.path.basename(output_file))
+        with time_stage("write"):
+            await run_in_threadpool(
+                write_zip, zip_path, [(f"{prefix}_{label}{i}.pdf", part) for i, part in enumerate(parts, 1)]
+            )
         
         # Planifier le nettoyage des fichiers temporaires
         if clean_after or settings.SECURE_MODE:
             background_tasks.add_task(clean_temp_files, temp_dir=temp_dir)
         
         # Retourner le fichier ZIP
-        return FileResponse(
+        return result_response(
             zip_path,
             filename=zip_filename,
             media_type="application/zip",
             background=background_tasks
         )
     
-    except HTTPException:
-        # Nettoyer les fichiers temporaires en cas d'erreur HTTP
+    except (HTTPException, OperationAborted):
+        # Nettoyer les fichiers temporaires en cas d'erreur HTTP ou d'interruption
         background_tasks.add_task(clean_temp_files, temp_dir=temp_dir)
         raise
         
@@ -320,24 +274,16 @@ async def split_pdf_file(
         )
     
     # Créer un dossier temporaire unique
-    temp_dir = tempfile.mkdtemp(dir=settings.TEMP_DIR)
+    temp_dir = create_operation_dir()
     output_dir = os.path.join(temp_dir, "output")
     os.makedirs(output_dir, exist_ok=True)
     
     try:
-        # Sauvegarder le fichier uploadé
-        file_path = os.path.join(temp_dir, f"upload_{uuid.uuid4()}.pdf")
-        file_content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        # Sauvegarder le fichier uploadé (copie par blocs)
+        file_path = str(save_upload_file(file, temp_dir, "upload"))
         
-        # Remettre le curseur au début pour réutilisation éventuelle
-        file.file.seek(0)
-        
-        # Déterminer le nombre total de pages du PDF
-        with open(file_path, 'rb') as f:
-            reader = PdfReader(f)
-            total_pages = len(reader.pages)
+        # Déterminer le nombre total de pages du PDF (sans charger les pages)
+        total_pages = count_pages(file_path)
         
         # Définir le préfixe des fichiers de sortie
         if not output_filename_prefix:
@@ -346,36 +292,23 @@ async def split_pdf_file(
         
         # Traiter selon si ranges est au format JSON ou 'each'
         if ranges == 'each':
-            # Une page par fichier
-            output_files = []
+            # Une page par fichier (processus supervisé)
+            parts = await run_supervised(split_into_files, file_path, output_dir, "all")
             
-            with open(file_path, 'rb') as f:
-                reader = PdfReader(f)
-                
-                for i in range(total_pages):
-                    output_filename = f"{output_filename_prefix}_page_{i+1}.pdf"
-                    output_path = os.path.join(output_dir, output_filename)
-                    output_files.append(output_path)
-                    
-                    writer = PdfWriter()
-                    writer.add_page(reader.pages[i])
-                    
-                    with open(output_path, "wb") as output_file:
-                        writer.write(output_file)
-            
-            # Créer un fichier ZIP avec tous les PDF
+            # Créer un fichier ZIP avec tous les PDF (hors de la boucle d'événements)
             zip_filename = f"{output_filename_prefix}_all_pages.zip"
             zip_path = os.path.join(temp_dir, zip_filename)
             
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for output_file in output_files:
-                    # Ajouter chaque fichier au ZIP en ne conservant que le nom du fichier
-                    zipf.write(output_file, os.path.basename(output_file))
+            with time_stage("write"):
+                await run_in_threadpool(
+                    write_zip, zip_path,
+                    [(f"{output_filename_prefix}_page_{i}.pdf", part) for i, part in enumerate(parts, 1)]
+                )
             
             # Planifier le nettoyage des fichiers temporaires
             background_tasks.add_task(clean_temp_files, temp_dir=temp_dir)
             
-            return FileResponse(
+            return result_response(
                 zip_path,
                 filename=zip_filename,
                 media_type="application/zip",
@@ -386,7 +319,14 @@ async def split_pdf_file(
             # Essayer de parser les plages comme JSON
             try:
                 ranges_data = json.loads(ranges)
-                output_files = []
+                if not ranges_data:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Aucune plage spécifiée"
+                    )
+                terms = []
+                names = []
+                used_names = set()
                 
                 # Pour chaque plage définie
                 for range_item in ranges_data:
@@ -400,49 +340,37 @@ async def split_pdf_file(
                     if end < start or end > total_pages:
                         end = total_pages
                     
+                    terms.append(f"{start}-{end}")
                     # Convertir en nom de fichier valide
-                    safe_name = re.sub(r'[^a-zA-Z0-9]', '_', name)
-                    output_filename = f"{safe_name}.pdf"
-                    output_path = os.path.join(output_dir, output_filename)
-                    output_files.append(output_path)
-                    
-                    # Extraire les pages
-                    with open(file_path, 'rb') as f:
-                        reader = PdfReader(f)
-                        writer = PdfWriter()
-                        
-                        for page_num in range(start, end + 1):
-                            # PyPDF2 est 0-indexed
-                            writer.add_page(reader.pages[page_num - 1])
-                        
-                        with open(output_path, "wb") as output_file:
-                            writer.write(output_file)
+                    names.append(unique_name(f"{re.sub(r'[^a-zA-Z0-9]', '_', name)}.pdf", used_names))
+                
+                # Un seul processus supervisé pour toutes les plages : un fichier
+                # par terme de la sélection, seules les pages des plages sont lues
+                parts = await run_supervised(split_into_files, file_path, output_dir, ",".join(terms))
                 
                 # Si on a une seule plage, retourner le PDF directement
-                if len(output_files) == 1:
+                if len(parts) == 1:
                     # Planifier le nettoyage des fichiers temporaires
                     background_tasks.add_task(clean_temp_files, temp_dir=temp_dir)
                     
-                    return FileResponse(
-                        output_files[0],
-                        filename=os.path.basename(output_files[0]),
+                    return result_response(
+                        parts[0],
+                        filename=names[0],
                         media_type="application/pdf",
                         background=background_tasks
                     )
                 
-                # Sinon, créer un fichier ZIP avec tous les PDF
+                # Sinon, créer un fichier ZIP avec tous les PDF (hors de la boucle d'événements)
                 zip_filename = f"{output_filename_prefix}_splits.zip"
                 zip_path = os.path.join(temp_dir, zip_filename)
                 
-                with zipfile.ZipFile(zip_path, 'w') as zipf:
-                    for output_file in output_files:
-                        # Ajouter chaque fichier au ZIP en ne conservant que le nom du fichier
-                        zipf.write(output_file, os.path.basename(output_file))
+                with time_stage("write"):
+                    await run_in_threadpool(write_zip, zip_path, list(zip(names, parts)))
                 
                 # Planifier le nettoyage des fichiers temporaires
                 background_tasks.add_task(clean_temp_files, temp_dir=temp_dir)
                 
-                return FileResponse(
+                return result_response(
                     zip_path,
                     filename=zip_filename,
                     media_type="application/zip",
@@ -455,8 +383,8 @@ async def split_pdf_file(
                     detail="Format JSON des plages invalide"
                 )
             
-    except HTTPException:
-        # Nettoyer les fichiers temporaires en cas d'erreur HTTP
+    except (HTTPException, OperationAborted):
+        # Nettoyer les fichiers temporaires en cas d'erreur HTTP ou d'interruption
         background_tasks.add_task(clean_temp_files, temp_dir=temp_dir)
         raise
         
@@ -475,7 +403,7 @@ def clean_temp_files(temp_dir: str):
     Supprime récursivement un répertoire temporaire et son contenu.
     """
     try:
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        temp_manager.remove(temp_dir)
     except Exception as e:
         logger.error(f"Erreur lors du nettoyage des fichiers temporaires: {str(e)}")
 
@@ -483,78 +411,14 @@ def create_temp_dir() -> str:
     """
     Crée un répertoire temporaire unique et retourne son chemin.
     """
-    temp_dir = tempfile.mkdtemp(dir=settings.TEMP_DIR)
-    return temp_dir
+    return create_operation_dir()
 
 def validate_pdf_file(file_path: str) -> bool:
     """
     Vérifie si un fichier est un PDF valide.
     """
     try:
-        with open(file_path, 'rb') as f:
-            reader = PdfReader(f)
-            # Vérifier qu'il y a au moins une page
-            if len(reader.pages) > 0:
-                return True
-            return False
+        # Vérifier qu'il y a au moins une page (compteur de l'arbre des pages)
+        return count_pages(file_path) > 0
     except Exception:
         return False
-
-def parse_page_ranges(ranges_str: str, total_pages: int) -> List[int]:
-    """
-    Parse une chaîne de plages de pages (ex: "1,3-5,7") en une liste d'indices de pages.
-    Les numéros de pages commencent à 1, mais retourne des indices 0-based pour PyPDF2.
-    """
-    if not ranges_str or ranges_str.lower() == "all":
-        return list(range(total_pages))
-    
-    page_indices = []
-    
-    # Diviser la chaîne en plages séparées par des virgules
-    parts = ranges_str.split(",")
-    
-    for part in parts:
-        part = part.strip()
-        
-        # Cas d'une plage (ex: "3-7")
-        if "-" in part:
-            try:
-                start, end = part.split("-")
-                start = int(start.strip())
-                end = int(end.strip())
-                
-                # Vérifier que les pages sont dans les limites
-                if start < 1:
-                    start = 1
-                if end > total_pages:
-                    end = total_pages
-                
-                # Ajouter toutes les pages de la plage
-                for i in range(start - 1, end):  # 0-indexed pour PyPDF2
-                    if i not in page_indices:
-                        page_indices.append(i)
-                        
-            except ValueError:
-                raise ValueError(f"Format de plage invalide: {part}")
-                
-        # Cas d'une page unique
-        else:
-            try:
-                page = int(part)
-                
-                # Vérifier que la page est dans les limites
-                if 1 <= page <= total_pages:
-                    page_idx = page - 1  # 0-indexed pour PyPDF2
-                    if page_idx not in page_indices:
-                        page_indices.append(page_idx)
-                        
-            except ValueError:
-                raise ValueError(f"Numéro de page invalide: {part}")
-    
-    # Trier les indices de pages
-    page_indices.sort()
-    
-    if not page_indices:
-        raise ValueError("Aucune page valide spécifiée")
-        
-    return page_indices
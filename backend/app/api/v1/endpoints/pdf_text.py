@@ -0,0 +1,74 @@
+import json
+import logging
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import uuid
+
+from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
+from ....services.text_utils import extract_text_stream, TEXT_BACKENDS
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.post("/text", summary="Extraire le texte d'un PDF (NDJSON)")
+async def extract_text_from_pdf(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    pages: Optional[str] = Form(None),
+    words: bool = Form(False),
+    backend: str = Form("pymupdf")
+):
+    """
+    Extrait le texte page par page et le renvoie au fil de l'eau au format NDJSON
+    (un objet JSON par ligne).
+
+    La première ligne décrit le document (`"type": "document"`), puis chaque page
+    produit une ligne `"type": "page"`. En cas d'erreur pendant l'envoi, une ligne
+    `"type": "error"` termine le flux.
+
+    - **file**: Fichier PDF à traiter
+    - **pages**: Pages à extraire (ex: "1,3-5,7", toutes par défaut)
+    - **words**: Inclure les mots et leurs boîtes [texte, x0, y0, x1, y1]
+    - **backend**: Bibliothèque d'extraction (pymupdf, pdfplumber)
+    """
+
+    # Vérifier que le fichier est un PDF
+    if not is_valid_file_extension(file.filename, settings.ALLOWED_EXTENSIONS["pdf"]):
+        raise HTTPException(status_code=400, detail="Le fichier n'est pas un PDF valide")
+
+    if backend not in TEXT_BACKENDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Moteur invalide. Valeurs acceptées: {', '.join(TEXT_BACKENDS)}"
+        )
+
+    # Créer un identifiant unique pour cette opération
+    operation_id = str(uuid.uuid4())
+    temp_dir = create_operation_dir(operation_id)
+
+    pdf_path = save_upload_file(file, temp_dir, "upload")
+
+    try:
+        header, records = extract_text_stream(str(pdf_path), pages, include_words=words, backend=backend)
+    except ValueError as e:
+        secure_delete_file(str(pdf_path))
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def ndjson():
+        yield json.dumps(header, ensure_ascii=False) + "\n"
+        try:
+            for record in records:
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+        except Exception as e:
+            # Les en-têtes sont déjà envoyés : signaler l'erreur dans le flux
+            logger.error(f"Erreur lors de l'extraction du texte: {str(e)}")
+            yield json.dumps({"type": "error", "detail": str(e)}, ensure_ascii=False) + "\n"
+
+    # Supprimer le fichier après envoi
+    background_tasks.add_task(secure_delete_file, str(pdf_path))
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", background=background_tasks)
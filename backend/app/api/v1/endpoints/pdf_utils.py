@@ -1,6 +1,5 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
 from typing import List
-from PyPDF2 import PdfReader
 import os
 import tempfile
 import uuid
@@ -9,6 +8,10 @@ import logging
 
 from ....core.config import settings
 from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
+from ....core.lazy_imports import lazy_import
+from ....services.page_tree import PageTree
+
+PyPDF2 = lazy_import("PyPDF2")
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -37,8 +40,8 @@ async def pdf_page_count(
         
         # Utiliser BytesIO pour créer un objet fichier en mémoire
         with io.BytesIO(pdf_data) as pdf_stream:
-            reader = PdfReader(pdf_stream)
-            page_count = len(reader.pages)
+            # Compteur de l'arbre des pages : les pages elles-mêmes ne sont pas lues
+            page_count = len(PageTree(PyPDF2.PdfReader(pdf_stream)))
         
         # Retourner le nombre de pages - S'assurer d'avoir la même clé entre pagecount et get-pdf-info
         return {"page_count": page_count, "pageCount": page_count}
@@ -0,0 +1,157 @@
+import os
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
+from typing import Optional
+import uuid
+
+from ....core.config import settings
+from ....core.temp_manager import create_operation_dir
+from ....core.results import result_response
+from ....core.supervisor import OperationAborted, run_supervised
+from ....core.security import save_upload_file, secure_delete_file, is_valid_file_extension
+from ....services.watermark_utils import add_watermark, validate_label_template, WATERMARK_POSITIONS
+
+router = APIRouter()
+
+
+@router.post("/watermark", summary="Ajouter un filigrane ou une numérotation à un PDF")
+async def watermark_pdf(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    text: Optional[str] = Form(None),
+    image: Optional[UploadFile] = File(None),
+    position: str = Form("center"),
+    rotation: Optional[float] = Form(None),
+    opacity: float = Form(0.3),
+    font_size: float = Form(48),
+    color: str = Form("#808080"),
+    scale: float = Form(50),
+    pages: Optional[str] = Form(None),
+    label: Optional[str] = Form(None),
+    label_position: str = Form("bottom-right"),
+    label_font_size: float = Form(10),
+    bates_prefix: str = Form(""),
+    bates_start: int = Form(1),
+    bates_digits: int = Form(6),
+    output_filename: str = Form(None)
+):
+    """
+    Ajoute un filigrane (texte ou image) et/ou un libellé par page (numéros de page,
+    numérotation Bates). Le filigrane est stocké une seule fois dans le document.
+    
+    - **file**: Fichier PDF à traiter
+    - **text**: Texte du filigrane (optionnel)
+    - **image**: Image du filigrane (optionnel, prioritaire sur le texte)
+    - **position**: center, top-left, top-center, top-right, bottom-left, bottom-center, bottom-right
+    - **rotation**: Angle en degrés (45 par défaut pour un texte centré)
+    - **opacity**: Opacité entre 0 et 1
+    - **font_size**: Taille du texte du filigrane
+    - **color**: Couleur du texte (#RRGGBB)
+    - **scale**: Largeur du filigrane en pourcentage de la largeur de page
+    - **pages**: Pages concernées (ex: "1,3-5", toutes par défaut)
+    - **label**: Libellé par page, avec les champs {page}, {total} et {bates}
+      (ex: "Page {page}/{total}" ou "{bates}")
+    - **label_position**: Position du libellé
+    - **label_font_size**: Taille du libellé
+    - **bates_prefix**, **bates_start**, **bates_digits**: Format de la numérotation Bates
+    - **output_filename**: Nom du fichier de sortie (optionnel)
+    """
+    
+    # Vérifier que le fichier est un PDF
+    if not is_valid_file_extension(file.filename, settings.ALLOWED_EXTENSIONS["pdf"]):
+        raise HTTPException(status_code=400, detail="Le fichier n'est pas un PDF valide")
+    
+    if not text and not image and not label:
+        raise HTTPException(status_code=400, detail="Vous devez fournir un texte, une image ou un libellé")
+    
+    if image and not is_valid_file_extension(image.filename, settings.ALLOWED_EXTENSIONS["image"]):
+        raise HTTPException(status_code=400, detail="Format d'image non supporté pour le filigrane")
+    
+    for value in (position, label_position):
+        if value not in WATERMARK_POSITIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Position invalide. Valeurs acceptées: {', '.join(WATERMARK_POSITIONS)}"
+            )
+    
+    if not 0 <= opacity <= 1:
+        raise HTTPException(status_code=400, detail="L'opacité doit être comprise entre 0 et 1")
+    
+    if not 0 < scale <= 100:
+        raise HTTPException(status_code=400, detail="L'échelle doit être comprise entre 0 et 100")
+    
+    if font_size <= 0 or label_font_size <= 0:
+        raise HTTPException(status_code=400, detail="La taille du texte doit être positive")
+    
+    if not 1 <= bates_digits <= 12 or bates_start < 0:
+        raise HTTPException(status_code=400, detail="Format de numérotation Bates invalide")
+    
+    if label:
+        try:
+            validate_label_template(label)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # Créer un identifiant unique pour cette opération
+    operation_id = str(uuid.uuid4())
+    
+    # Préparer les chemins des fichiers
+    temp_dir = create_operation_dir(operation_id)
+    
+    try:
+        # Sauvegarder les fichiers
+        pdf_path = save_upload_file(file, temp_dir, "upload")
+        image_path = save_upload_file(image, temp_dir, "watermark") if image else None
+        
+        # Définir le nom du fichier de sortie
+        if not output_filename:
+            base_name = os.path.splitext(os.path.basename(file.filename))[0]
+            output_filename = f"{base_name}_filigrane.pdf"
+        elif not output_filename.lower().endswith(".pdf"):
+            output_filename += ".pdf"
+            
+        output_path = os.path.join(temp_dir, output_filename)
+        
+        await run_supervised(
+            add_watermark,
+            str(pdf_path),
+            output_path,
+            text=text,
+            image_path=str(image_path) if image_path else None,
+            position=position,
+            rotation=rotation,
+            opacity=opacity,
+            font_size=font_size,
+            color=color,
+            scale=scale,
+            pages=pages,
+            label=label,
+            label_position=label_position,
+            label_font_size=label_font_size,
+            bates_prefix=bates_prefix,
+            bates_start=bates_start,
+            bates_digits=bates_digits,
+        )
+        
+        # Supprimer les fichiers intermédiaires en arrière-plan
+        if settings.SECURE_MODE:
+            background_tasks.add_task(secure_delete_file, str(pdf_path))
+            if image_path:
+                background_tasks.add_task(secure_delete_file, str(image_path))
+        
+        return result_response(
+            output_path,
+            output_filename,
+            media_type="application/pdf",
+            background=background_tasks
+        )
+        
+    except Exception as e:
+        # Nettoyer en cas d'erreur
+        if 'pdf_path' in locals():
+            secure_delete_file(str(pdf_path))
+        if 'image_path' in locals() and image_path:
+            secure_delete_file(str(image_path))
+        if isinstance(e, OperationAborted):
+            raise
+        
+        raise HTTPException(status_code=500, detail=str(e))
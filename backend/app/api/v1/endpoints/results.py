@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException
+
+from ....core.results import result_store, ResultFileResponse
+
+router = APIRouter()
+
+
+def _get_result(result_id: str):
+    try:
+        result = result_store.get(result_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Résultat introuvable ou expiré")
+    return result
+
+
+@router.api_route("/results/{result_id}", methods=["GET", "HEAD"], summary="Télécharger le résultat d'une opération")
+async def download_result(result_id: str):
+    """
+    Renvoie un résultat conservé (identifiant fourni par l'en-tête X-Result-Id
+    de l'opération).
+
+    Un téléchargement interrompu peut être repris avec l'en-tête Range
+    (et If-Range avec l'ETag reçu) ; If-None-Match et If-Modified-Since
+    permettent de vérifier qu'une copie locale est à jour (304).
+    """
+    return ResultFileResponse(_get_result(result_id))
+
+
+@router.delete("/results/{result_id}", summary="Supprimer le résultat d'une opération")
+async def delete_result(result_id: str):
+    """
+    Supprime un résultat dès que le client l'a bien reçu, sans attendre
+    l'expiration (RESULT_RETENTION_SECONDS).
+    """
+    _get_result(result_id)
+    result_store.delete(result_id)
+    return {"success": True, "result_id": result_id}
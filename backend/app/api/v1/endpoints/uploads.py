@@ -0,0 +1,135 @@
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Form, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+
+from ....core.config import settings
+from ....core.security import is_valid_file_extension
+from ....core.uploads import upload_store, UploadBusy, UploadIncomplete
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+ALLOWED_UPLOAD_EXTENSIONS = [extension for extensions in settings.ALLOWED_EXTENSIONS.values() for extension in extensions]
+
+
+@router.post("/uploads", status_code=201, summary="Commencer un envoi par morceaux")
+async def create_upload(
+    filename: str = Form(...),
+    size: int = Form(...),
+    chunk_size: Optional[int] = Form(None),
+    sha256: Optional[str] = Form(None)
+):
+    """
+    Ouvre un envoi reprenable pour un fichier volumineux. Les morceaux sont
+    ensuite envoyés (éventuellement en parallèle, dans n'importe quel ordre)
+    par PUT /uploads/{upload_id}?offset=..., puis l'envoi est finalisé par
+    POST /uploads/{upload_id}/complete, qui renvoie un document_id utilisable
+    par /jobs ou /search.
+
+    - **filename**: Nom du fichier
+    - **size**: Taille totale en octets
+    - **chunk_size**: Taille des morceaux en octets (défaut : CHUNKED_UPLOAD_CHUNK_SIZE_MB)
+    - **sha256**: Empreinte du fichier entier, vérifiée à la finalisation (optionnel)
+    """
+    if not is_valid_file_extension(filename, ALLOWED_UPLOAD_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Format de fichier non pris en charge")
+
+    try:
+        upload = await run_in_threadpool(upload_store.create, filename, size, chunk_size, sha256)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        logger.error(f"Erreur lors de l'ouverture de l'envoi: {str(e)}")
+        raise HTTPException(status_code=507, detail=str(e))
+
+    return JSONResponse(status_code=201, content=upload, headers={"Location": upload["upload_url"]})
+
+
+@router.put("/uploads/{upload_id}", summary="Envoyer un morceau")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., description="Position du morceau dans le fichier (multiple de chunk_size)"),
+    x_chunk_sha256: Optional[str] = Header(None, description="Empreinte SHA-256 du morceau")
+):
+    """
+    Écrit un morceau (corps brut de la requête) à sa position dans le fichier.
+    Si l'en-tête X-Chunk-SHA256 est fourni, un morceau altéré est refusé (400)
+    et peut être renvoyé. Renvoie l'état de l'envoi (positions manquantes).
+    """
+    try:
+        expected = upload_store.expected_length(upload_id, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if expected is None:
+        raise HTTPException(status_code=404, detail="Envoi introuvable ou expiré")
+
+    # Le morceau est lu en mémoire (au plus CHUNKED_UPLOAD_MAX_CHUNK_SIZE_MB) puis écrit en place
+    data = bytearray()
+    async for part in request.stream():
+        data += part
+        if len(data) > expected:
+            raise HTTPException(status_code=400, detail=f"Morceau trop long : {expected} octets attendus")
+
+    try:
+        return await run_in_threadpool(upload_store.write_chunk, upload_id, offset, bytes(data), x_chunk_sha256)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Envoi introuvable ou expiré")
+    except UploadBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erreur lors de l'écriture du morceau: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/uploads/{upload_id}", summary="État d'un envoi par morceaux")
+async def get_upload(upload_id: str):
+    """
+    Renvoie les positions des morceaux encore manquants : pour reprendre un
+    envoi interrompu, il suffit de renvoyer ces morceaux puis de finaliser.
+    """
+    try:
+        upload = await run_in_threadpool(upload_store.status, upload_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Envoi introuvable ou expiré")
+    return upload
+
+
+@router.post("/uploads/{upload_id}/complete", summary="Finaliser un envoi par morceaux")
+async def complete_upload(upload_id: str):
+    """
+    Vérifie chaque morceau et l'empreinte du fichier entier, puis range le
+    fichier dans le stockage des documents. Des morceaux manquants ou
+    corrompus donnent une erreur 409 : consulter GET /uploads/{upload_id},
+    renvoyer les morceaux manquants et finaliser à nouveau.
+    """
+    try:
+        return await run_in_threadpool(upload_store.complete, upload_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Envoi introuvable ou expiré")
+    except (UploadIncomplete, UploadBusy) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Erreur lors de la finalisation de l'envoi: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/uploads/{upload_id}", summary="Abandonner un envoi par morceaux")
+async def abort_upload(upload_id: str):
+    """Abandonne un envoi et libère l'espace des morceaux déjà reçus"""
+    try:
+        aborted = await run_in_threadpool(upload_store.abort, upload_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not aborted:
+        raise HTTPException(status_code=404, detail="Envoi introuvable ou expiré")
+    return {"success": True, "upload_id": upload_id}
@@ -0,0 +1,42 @@
+"""
+Comparaison des moteurs de rendu (PyMuPDF, PDFium) sur un corpus de PDF.
+
+    python -m app.benchmark_render corpus/*.pdf [--scale 2.0] [--max-pages N] [--grayscale]
+
+Pour chaque moteur installé : pages rendues, durée, pages par seconde et
+écart moyen avec le rendu de PyMuPDF. Le plus rapide sur des documents
+représentatifs est à fixer dans RENDER_BACKEND (ou à laisser choisir au
+démarrage avec RENDER_BACKEND=auto et RENDER_BENCHMARK_FILE).
+Utiliser --scale 0.75 pour la compression, --scale 4.17 --grayscale pour
+l'OCR à 300 dpi.
+"""
+import argparse
+import json
+
+from .services.render_utils import available_backends, benchmark_renderers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Comparaison des moteurs de rendu PDF-Reader")
+    parser.add_argument("files", nargs="+", help="PDF du corpus")
+    parser.add_argument("--scale", type=float, default=2.0, help="Échelle de rendu (1.0 = 72 dpi)")
+    parser.add_argument("--max-pages", type=int, default=None, help="Pages rendues par document (défaut : toutes)")
+    parser.add_argument("--grayscale", action="store_true", help="Rendu en niveaux de gris (comme l'OCR)")
+    parser.add_argument("--no-compare", action="store_true", help="Ne pas mesurer l'écart entre les rendus")
+    args = parser.parse_args()
+
+    backends = available_backends()
+    results = benchmark_renderers(
+        args.files,
+        scale=args.scale,
+        max_pages=args.max_pages,
+        backends=backends,
+        grayscale=args.grayscale,
+        compare=not args.no_compare,
+    )
+    fastest = max(results, key=lambda name: results[name]["pages_per_second"] or 0) if results else None
+    print(json.dumps({"documents": len(args.files), "scale": args.scale, "fastest": fastest, "backends": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .config import settings
+
+# Facteur appliqué à la taille de la requête pour estimer l'espace disque
+# consommé par une opération (upload + fichiers intermédiaires + résultat)
+OPERATION_DISK_FACTORS = {
+    "/compress": 2.0,
+    "/split": 2.0,
+    "/split-all": 3.0,
+    "/split-file": 3.0,
+    "/extract": 2.0,
+    "/remove-pages": 2.0,
+    "/reorder": 2.0,
+    "/merge": 2.0,
+    "/sign": 2.0,
+    "/sign-batch": 3.0,
+    "/images-to-pdf": 6.0,  # Les images décodées sont réencodées sans perte
+    "/convert-to-pdf": 4.0,
+    "/ocr": 2.0,
+    "/text": 1.0,
+    "/documents": 1.0,
+    "/uploads": 0.0,  # Ouverture d'un envoi par morceaux (espace réservé par store_admission_controller)
+    "/watermark": 2.0,
+    "/get-pdf-info": 1.0,
+    "/page-thumbnail": 1.0,
+    "/pagecount": 0.0,  # Traitement en mémoire
+}
+DEFAULT_DISK_FACTOR = 2.0
+
+
+class AdmissionRejected(Exception):
+    """Levée quand l'espace disque disponible ne permet pas d'accepter la requête"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Reservation:
+    """Espace disque réservé pour une requête en cours"""
+    __slots__ = ("reservation_id", "operation", "size", "created_at")
+
+    def __init__(self, reservation_id: int, operation: str, size: int):
+        self.reservation_id = reservation_id
+        self.operation = operation
+        self.size = size
+        self.created_at = time.time()
+
+
+class DiskAdmissionController:
+    """
+    Contrôle d'admission basé sur l'espace disque du dossier temporaire.
+
+    Avant d'accepter une requête, l'espace qu'elle consommera est estimé
+    (Content-Length × facteur de l'opération) et réservé. Si le budget est
+    épuisé, la requête attend qu'une réservation soit libérée puis est rejetée
+    après ADMISSION_QUEUE_TIMEOUT_SECONDS.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        budget_bytes: int = 0,
+        safety_margin_bytes: int = 0,
+        queue_timeout: float = 10.0,
+        max_reservation_age: float = 3600.0,
+    ):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.safety_margin_bytes = safety_margin_bytes
+        self.queue_timeout = queue_timeout
+        self.max_reservation_age = max_reservation_age
+        self._reservations: Dict[int, Reservation] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._waiters: List[asyncio.Future] = []
+        self.rejected = 0
+
+    def estimate(self, operation: str, content_length: Optional[int]) -> int:
+        """Estime l'espace disque nécessaire à une opération"""
+        factor = DEFAULT_DISK_FACTOR
+        for suffix, value in OPERATION_DISK_FACTORS.items():
+            if operation.endswith(suffix):
+                factor = value
+                break
+        if content_length is None:
+            # Taille inconnue (transfert par morceaux) : supposer la taille maximale
+            content_length = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+        return int(content_length * factor)
+
+    def _free_bytes(self) -> int:
+        try:
+            return shutil.disk_usage(self.root).free
+        except OSError:
+            return 0
+
+    def _prune_stale(self) -> None:
+        """
+        Filet de sécurité : le middleware de mesure libère chaque réservation en
+        fin de requête, quelle qu'en soit l'issue ; seule une réservation prise
+        hors requête et jamais libérée peut atteindre max_reservation_age
+        """
+        limit = time.time() - self.max_reservation_age
+        for reservation_id in [r.reservation_id for r in self._reservations.values() if r.created_at < limit]:
+            del self._reservations[reservation_id]
+
+    def try_reserve(self, operation: str, size: int) -> Optional[Reservation]:
+        """Réserve l'espace si possible, sans attendre"""
+        with self._lock:
+            self._prune_stale()
+            reserved = sum(r.size for r in self._reservations.values())
+            if self.budget_bytes and reserved + size > self.budget_bytes:
+                return None
+            # L'espace déjà réservé n'est pas forcément encore écrit : rester prudent
+            if size > 0 and reserved + size > self._free_bytes() - self.safety_margin_bytes:
+                return None
+            reservation = Reservation(next(self._ids), operation, size)
+            self._reservations[reservation.reservation_id] = reservation
+            return reservation
+
+    async def reserve(self, operation: str, content_length: Optional[int]) -> Reservation:
+        """Réserve l'espace nécessaire, en attendant au plus queue_timeout secondes"""
+        size = self.estimate(operation, content_length)
+        deadline = time.monotonic() + self.queue_timeout
+
+        while True:
+            reservation = self.try_reserve(operation, size)
+            if reservation is not None:
+                return reservation
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.rejected += 1
+                raise AdmissionRejected(
+                    "Espace disque temporaire insuffisant, veuillez réessayer plus tard",
+                    retry_after=max(1, int(self.queue_timeout)),
+                )
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def release(self, reservation: Optional[Reservation]) -> None:
+        """Libère une réservation et réveille les requêtes en attente"""
+        if reservation is None:
+            return
+        with self._lock:
+            self._reservations.pop(reservation.reservation_id, None)
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def snapshot(self) -> Dict[str, object]:
+        """État courant des réservations"""
+        with self._lock:
+            self._prune_stale()
+            reservations = list(self._reservations.values())
+        now = time.time()
+        return {
+            "budget_bytes": self.budget_bytes,
+            "free_bytes": self._free_bytes(),
+            "reserved_bytes": sum(r.size for r in reservations),
+            "waiting": len(self._waiters),
+            "rejected": self.rejected,
+            "reservations": [
+                {
+                    "id": r.reservation_id,
+                    "operation": r.operation,
+                    "bytes": r.size,
+                    "age_seconds": round(now - r.created_at, 3),
+                }
+                for r in reservations
+            ],
+        }
+
+
+# Les réservations sont propres à chaque worker : le budget est réparti entre eux
+admission_controller = DiskAdmissionController(
+    settings.TEMP_DIR,
+    budget_bytes=settings.TEMP_DISK_BUDGET_MB * 1024 * 1024 // max(settings.WORKERS, 1),
+    safety_margin_bytes=settings.TEMP_DISK_SAFETY_MARGIN_MB * 1024 * 1024,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    max_reservation_age=settings.FILE_RETENTION_SECONDS,
+)
+
+# Envois par morceaux : espace de STORE_DIR réservé le temps d'allouer le fichier
+# de l'envoi, pour que deux envois ouverts ensemble ne comptent pas sur le même
+# espace libre (une fois alloué, il est déduit de l'espace libre du disque)
+store_admission_controller = DiskAdmissionController(
+    settings.STORE_DIR,
+    safety_margin_bytes=settings.TEMP_DISK_SAFETY_MARGIN_MB * 1024 * 1024,
+)
@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .metrics import record_cache
+from .supervisor import CancelToken, OperationCancelled, cancellation_scope, current_token, operation_token
+from .temp_manager import create_operation_dir, temp_manager
+from .shared_state import MULTI_WORKER, shared_state, worker_id
+
+# Intervalle de scrutation d'un calcul mené par un autre worker
+SHARED_POLL_SECONDS = 0.1
+
+# Intervalle de vérification de la déconnexion des clients en attente d'un calcul
+WAIT_POLL_SECONDS = 0.1
+
+
+class CachedResult:
+    """Fichier résultat partagé entre les requêtes identiques"""
+    __slots__ = ("key", "path", "directory", "expires_at", "refs", "shared")
+
+    def __init__(self, key: str, path: str, directory: str, expires_at: float, shared: bool = False):
+        self.key = key
+        self.path = path
+        self.directory = directory
+        self.expires_at = expires_at
+        self.refs = 0
+        # Lien vers le résultat d'un autre worker : libéré par ses détenteurs,
+        # jamais conservé dans le cache de ce worker
+        self.shared = shared
+
+
+class ResultCoalescer:
+    """
+    Déduplication des opérations identiques (single-flight) avec un cache court.
+
+    Les requêtes portant sur le même contenu, la même opération et les mêmes
+    paramètres se rattachent au calcul en cours au lieu de le refaire ; le
+    résultat reste ensuite servi pendant ttl_seconds. Chaque réponse détient
+    une référence sur le fichier, supprimé quand il a expiré et n'est plus
+    en cours d'envoi.
+
+    Toutes les méthodes s'exécutent sur la boucle d'événements ; le calcul
+    et les accès à l'état partagé (SQLite) sont déportés dans le pool de threads.
+
+    En mode multi-worker, les résultats sont aussi annoncés dans l'état
+    partagé : un autre worker les réutilise, et attend la fin d'un calcul
+    identique déjà mené ailleurs au lieu de le refaire.
+
+    Le calcul a les limites de la requête qui l'a lancé, mais ne dépend pas
+    d'elle : il n'est annulé que lorsque tous les clients qui l'attendent se
+    sont déconnectés, et travaille sur sa propre copie (liens) des fichiers
+    d'entrée, que la requête peut supprimer sans attendre.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._results: Dict[str, CachedResult] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._tokens: Dict[str, CancelToken] = {}
+        self._waiters: Dict[str, int] = {}
+
+    @staticmethod
+    def make_key(operation: str, content_hashes: List[str], params: Dict[str, Any]) -> str:
+        """Clé d'une opération : empreintes des fichiers, opération et paramètres"""
+        payload = json.dumps([operation, content_hashes, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _discard(self, entry: CachedResult) -> None:
+        temp_manager.remove(entry.directory)
+
+    def _prune(self, now: float) -> None:
+        for key, entry in list(self._results.items()):
+            if entry.expires_at <= now and entry.refs == 0:
+                del self._results[key]
+                self._discard(entry)
+
+    def _shared_lookup(self, key: str) -> Optional[CachedResult]:
+        """
+        Résultat annoncé par un autre worker et encore valable, lié dans un
+        dossier de ce worker : le propriétaire peut supprimer l'original dès
+        son expiration. Un lien impossible (fichier déjà supprimé, autre
+        système de fichiers) équivaut à une absence du cache.
+        """
+        published = shared_state.get("results", key)
+        if published is None or published["expires_at"] <= time.time():
+            return None
+        # À côté du dossier d'origine : le lien reste sur le même système de fichiers
+        directory = os.path.join(os.path.dirname(published["directory"]), uuid.uuid4().hex)
+        path = os.path.join(directory, os.path.basename(published["path"]))
+        try:
+            os.makedirs(directory)
+            temp_manager.register(directory)
+            os.link(published["path"], path)
+        except OSError:
+            temp_manager.remove(directory)
+            return None
+        return CachedResult(key, path, directory, published["expires_at"], shared=True)
+
+    def _poll_shared(self, key: str) -> Tuple[bool, Optional[CachedResult]]:
+        """
+        Une scrutation de l'état partagé : (calcul pris en charge par ce
+        worker, résultat du worker qui en a la charge)
+        """
+        # Résultat cherché d'abord : le worker responsable l'annonce avant de
+        # libérer le calcul, qui serait sinon refait
+        found = self._shared_lookup(key)
+        if found is not None:
+            return False, found
+        me = worker_id()
+        if shared_state.add("inflight", key, me):
+            return True, None
+        owner = shared_state.get("inflight", key)
+        if owner is not None and owner not in shared_state.live_workers():
+            # Le worker responsable a disparu : reprendre le calcul
+            shared_state.delete("inflight", key)
+            return shared_state.add("inflight", key, me), None
+        return False, None
+
+    async def _await_other_worker(self, key: str) -> Optional[CachedResult]:
+        """
+        Prend la responsabilité du calcul `key` pour le nœud, ou attend le
+        worker qui l'a déjà prise. Renvoie son résultat, ou None si le calcul
+        revient au worker courant.
+        """
+        while True:
+            claimed, found = await run_in_threadpool(self._poll_shared, key)
+            if claimed:
+                return None
+            if found is not None:
+                return found
+            await asyncio.sleep(SHARED_POLL_SECONDS)
+
+    @staticmethod
+    def _stage_inputs(inputs: List[str]) -> Tuple[str, List[str]]:
+        """Lie (ou copie) les fichiers d'entrée dans un dossier propre au calcul"""
+        directory = create_operation_dir()
+        staged = []
+        try:
+            for index, path in enumerate(inputs):
+                # Un sous-dossier par fichier : les noms (et extensions) sont conservés
+                target_dir = os.path.join(directory, str(index))
+                os.makedirs(target_dir)
+                target = os.path.join(target_dir, os.path.basename(path))
+                try:
+                    os.link(path, target)
+                except OSError:
+                    shutil.copyfile(path, target)
+                staged.append(target)
+        except BaseException:
+            temp_manager.remove(directory)
+            raise
+        return directory, staged
+
+    async def _compute(
+        self, key: str, compute: Callable[..., Any], filename: str, staged: Optional[Tuple[str, List[str]]] = None
+    ) -> CachedResult:
+        claimed = False
+        try:
+            if MULTI_WORKER:
+                found = await self._await_other_worker(key)
+                if found is not None:
+                    return found
+                claimed = True
+
+            # Dossiers épinglés pendant le calcul, même si la requête qui l'a lancé se termine
+            with temp_manager.active_scope(*([staged[0]] if staged is not None else [])):
+                directory = create_operation_dir()
+                path = os.path.join(directory, filename)
+                try:
+                    with cancellation_scope(self._tokens[key]):
+                        if staged is None:
+                            await run_in_threadpool(compute, path)
+                        else:
+                            await run_in_threadpool(compute, path, staged[1])
+                except BaseException:
+                    temp_manager.remove(directory)
+                    raise
+
+            entry = CachedResult(key, path, directory, time.time() + self.ttl_seconds)
+            temp_manager.refresh_size(directory)
+            previous = self._results.get(key)
+            self._results[key] = entry
+            if previous is not None and previous.refs == 0:
+                self._discard(previous)
+            if MULTI_WORKER and self.ttl_seconds > 0:
+                await run_in_threadpool(
+                    shared_state.put, "results", key,
+                    {"path": path, "directory": directory, "expires_at": entry.expires_at},
+                    ttl=self.ttl_seconds,
+                )
+            return entry
+        finally:
+            self._inflight.pop(key, None)
+            self._tokens.pop(key, None)
+            if staged is not None:
+                temp_manager.remove(staged[0])
+            if claimed:
+                await run_in_threadpool(shared_state.delete, "inflight", key)
+
+    async def run(
+        self,
+        key: str,
+        compute: Callable[..., Any],
+        filename: str = "result.pdf",
+        inputs: Optional[List[str]] = None,
+    ) -> Tuple[CachedResult, str]:
+        """
+        Renvoie le résultat de l'opération `key` et sa provenance
+        ("cached", "coalesced" ou "computed").
+        `compute(chemin)` écrit le résultat dans le fichier indiqué. Avec inputs,
+        `compute(chemin, entrées)` reçoit les copies de ces fichiers propres au
+        calcul : l'appelant peut supprimer les siens dès le retour (ou l'annulation).
+        L'appelant doit libérer le résultat avec release() une fois la réponse envoyée.
+        """
+        now = time.time()
+        self._prune(now)
+
+        entry = self._results.get(key)
+        if entry is not None and entry.expires_at > now and os.path.exists(entry.path):
+            record_cache("results", True)
+            entry.refs += 1
+            return entry, "cached"
+        if MULTI_WORKER and key not in self._inflight:
+            entry = await run_in_threadpool(self._shared_lookup, key)
+            if entry is not None:
+                record_cache("results", True)
+                entry.refs += 1
+                return entry, "cached"
+        record_cache("results", False)
+
+        task = self._inflight.get(key)
+        staged = None
+        if task is None and inputs is not None:
+            staged = await run_in_threadpool(self._stage_inputs, inputs)
+            # Un calcul identique a pu démarrer pendant la copie
+            task = self._inflight.get(key)
+            if task is not None:
+                temp_manager.remove(staged[0])
+                staged = None
+        source = "coalesced"
+        if task is None:
+            # La tâche n'appartient à aucune requête : la déconnexion du premier
+            # client n'interrompt pas le calcul attendu par les autres
+            leader = current_token()
+            self._tokens[key] = leader.derive() if leader is not None else operation_token("")
+            task = asyncio.ensure_future(self._compute(key, compute, filename, staged))
+            # Issue consultée même si plus personne n'attend le calcul
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._inflight[key] = task
+            source = "computed"
+        record_cache("singleflight", source == "coalesced")
+
+        entry = await self._wait(key, task)
+        if entry.shared:
+            source = "coalesced"
+        entry.refs += 1
+        return entry, source
+
+    async def _wait(self, key: str, task: asyncio.Task) -> CachedResult:
+        """Attend le calcul ; le dernier client à se déconnecter l'annule"""
+        request_token = current_token()
+        if request_token is None:
+            return await asyncio.shield(task)
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=WAIT_POLL_SECONDS)
+                if done:
+                    return task.result()
+                if request_token.cancelled:
+                    raise OperationCancelled(request_token.reason)
+        finally:
+            self._waiters[key] -= 1
+            if self._waiters[key] == 0:
+                del self._waiters[key]
+                computation = self._tokens.get(key)
+                if computation is not None and not task.done() and request_token.cancelled:
+                    computation.cancel("Plus aucun client n'attend ce résultat")
+
+    async def release(self, entry: CachedResult) -> None:
+        """Libère une référence (après la copie du résultat pour la réponse)"""
+        entry.refs -= 1
+        if entry.refs > 0:
+            return
+        if entry.shared:
+            # Lien propre aux requêtes qui l'ont obtenu
+            self._discard(entry)
+            return
+        current = self._results.get(entry.key)
+        if current is not entry:
+            # Remplacé par un calcul plus récent
+            self._discard(entry)
+        elif entry.expires_at <= time.time():
+            del self._results[entry.key]
+            self._discard(entry)
+
+
+result_coalescer = ResultCoalescer(settings.RESULT_CACHE_TTL_SECONDS)
@@ -0,0 +1,198 @@
+import zlib
+from typing import List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .lazy_imports import lazy_import, module_available
+
+brotli = lazy_import("brotli")
+
+# Contenus déjà compressés : les recompresser coûte du temps sans rien gagner
+INCOMPRESSIBLE_TYPES = {
+    "application/pdf",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/octet-stream",
+    "font/woff",
+    "font/woff2",
+}
+INCOMPRESSIBLE_PREFIXES = ("image/", "video/", "audio/")
+COMPRESSIBLE_IMAGES = {"image/svg+xml", "image/bmp", "image/x-icon"}
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    """Indique si un type de contenu gagne à être compressé"""
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in COMPRESSIBLE_IMAGES:
+        return True
+    return media_type not in INCOMPRESSIBLE_TYPES and not media_type.startswith(INCOMPRESSIBLE_PREFIXES)
+
+
+def negotiate_encoding(accept_encoding: str, brotli_available: bool) -> Optional[str]:
+    """Codage retenu d'après Accept-Encoding (br de préférence à qualité égale), ou None"""
+    supported = ["br", "gzip"] if brotli_available else ["gzip"]
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name == "*":
+            for encoding in supported:
+                weights.setdefault(encoding, quality)
+        elif name in supported:
+            weights[name] = quality
+    candidates = [(quality, -supported.index(name), name) for name, quality in weights.items() if quality > 0]
+    return max(candidates)[2] if candidates else None
+
+
+class _Compressor:
+    """Compression incrémentale ; flush() rend disponible tout ce qui a été reçu"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31 : en-tête et somme de contrôle gzip
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + (self._brotli.flush() if flush else b"")
+        return self._zlib.compress(data) + (self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compression gzip ou brotli (si le paquet brotli est installé) des réponses.
+
+    Ne sont compressées que les réponses d'au moins minimum_size octets dont le
+    type s'y prête : PDF, ZIP, images... sont transmis tels quels, de même que
+    les réponses déjà codées ou servies par plages (Accept-Ranges, Content-Range :
+    les positions doivent rester celles du fichier). Les réponses diffusées au fil
+    de l'eau (NDJSON) sont compressées morceau par morceau, chaque morceau étant
+    transmis immédiatement.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.brotli_available = module_available("brotli")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.brotli_available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressedResponder(send, encoding, self)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressedResponder:
+    def __init__(self, send: Send, encoding: str, middleware: CompressionMiddleware):
+        self._send = send
+        self.encoding = encoding
+        self.middleware = middleware
+        self.start: Optional[Message] = None
+        self.buffered: List[bytes] = []
+        self.buffered_size = 0
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    def _eligible(self, message: Message) -> Tuple[bool, bool]:
+        """(compressible d'après les en-têtes, ajouter Vary)"""
+        headers = Headers(raw=message["headers"])
+        status = message["status"]
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False, False
+        if "content-range" in headers or "accept-ranges" in headers:
+            return False, False
+        if not is_compressible(headers.get("content-type")):
+            return False, False
+        content_length = headers.get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) < self.middleware.minimum_size:
+            return False, True
+        return True, True
+
+    async def _start(self, compress: bool, content_length: Optional[int] = None) -> None:
+        headers = MutableHeaders(raw=self.start["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if compress:
+            headers["Content-Encoding"] = self.encoding
+            if content_length is None:
+                # Taille finale inconnue : envoi par blocs
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(content_length)
+        await self._send(self.start)
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            compress, vary = self._eligible(message)
+            if not compress:
+                if vary:
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                self.passthrough = True
+                await self._send(message)
+                return
+            self.start = message
+            return
+
+        if self.passthrough or message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is not None:
+            # Diffusion en cours : chaque morceau part immédiatement
+            data = self.compressor.compress(body, flush=True) if more_body else self.compressor.finish(body)
+            if data or not more_body:
+                await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        # Accumuler jusqu'au seuil pour décider de compresser ou non
+        self.buffered.append(body)
+        self.buffered_size += len(body)
+        if more_body and self.buffered_size < self.middleware.minimum_size:
+            return
+        pending = b"".join(self.buffered)
+        self.buffered = []
+
+        if not more_body and self.buffered_size < self.middleware.minimum_size:
+            # Réponse trop petite : envoyée telle quelle
+            await self._start(compress=False)
+            await self._send({"type": "http.response.body", "body": pending, "more_body": False})
+            return
+
+        self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+        if not more_body:
+            data = self.compressor.finish(pending)
+            await self._start(compress=True, content_length=len(data))
+            await self._send({"type": "http.response.body", "body": data, "more_body": False})
+            return
+        await self._start(compress=True)
+        await self._send({"type": "http.response.body", "body": self.compressor.compress(pending, flush=True), "more_body": True})
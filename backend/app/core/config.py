@@ -1,7 +1,8 @@
 from pathlib import Path
 import tempfile
 import os
-from pydantic import BaseSettings
+from typing import Optional
+from pydantic import BaseSettings, Field
 
 # Configuration de base
 class Settings(BaseSettings):
@@ -11,12 +12,52 @@ class Settings(BaseSettings):
     # Dossier temporaire sécurisé pour les fichiers
     TEMP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "tmp")
     
+    # Stockage adressé par contenu des documents (et de leurs index de recherche)
+    STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "store")
+    
+    # État partagé entre les workers d'un même nœud (SQLite en mode WAL)
+    STATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "state")
+    
+    # Nombre de workers du serveur (uvicorn/gunicorn --workers, ou WEB_CONCURRENCY) :
+    # au-delà de 1, l'état (fichiers temporaires, suivi des travaux, résultats) est
+    # partagé, le nettoyage est assuré par un seul worker élu et les tâches lourdes
+    # sont réparties entre les workers
+    WORKERS: int = Field(1, env=["WORKERS", "WEB_CONCURRENCY"])
+    WORKER_LEASE_SECONDS: float = 90.0  # Un worker sans signe de vie depuis ce délai est considéré mort
+    SHARED_TASK_POLL_SECONDS: float = 0.05  # Intervalle de scrutation de la file de tâches partagée
+    
     # Durée max de conservation des fichiers (en secondes)
     FILE_RETENTION_SECONDS: int = 3600  # 1 heure par défaut
     
+    # Durée pendant laquelle un résultat reste téléchargeable via /results/{id}
+    # (sauf suppression explicite par le client)
+    RESULT_RETENTION_SECONDS: int = 3600
+    
+    # Intervalle maximal entre deux passes du gestionnaire de fichiers temporaires (en secondes)
+    TEMP_SWEEP_INTERVAL_SECONDS: float = 30.0
+    
+    # Quota disque du dossier temporaire (en Mo, 0 = illimité)
+    TEMP_DIR_QUOTA_MB: int = 0
+    
+    # Contrôle d'admission : espace disque réservable par les requêtes en cours
+    # (en Mo, 0 = limité uniquement par l'espace libre du volume)
+    TEMP_DISK_BUDGET_MB: int = 0
+    TEMP_DISK_SAFETY_MARGIN_MB: int = 512  # Espace libre à toujours préserver
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0  # Attente max avant rejet (503)
+    
+    # Espace de travail en mémoire (tmpfs, ex. "/dev/shm/pdf-reader") pour les petites
+    # opérations ; les opérations plus volumineuses débordent sur TEMP_DIR
+    SCRATCH_MEMORY_DIR: Optional[str] = None
+    SCRATCH_MEMORY_BUDGET_MB: int = 256
+    
     # Taille max des fichiers (en Mo)
     MAX_FILE_SIZE_MB: int = 100
     
+    # Envoi par morceaux (/uploads) des fichiers volumineux, reprenable et parallélisable
+    CHUNKED_UPLOAD_MAX_SIZE_MB: int = 10240
+    CHUNKED_UPLOAD_CHUNK_SIZE_MB: int = 8  # Taille des morceaux par défaut
+    CHUNKED_UPLOAD_MAX_CHUNK_SIZE_MB: int = 64  # Un morceau est reçu en mémoire avant écriture
+    
     # Types de fichiers autorisés
     ALLOWED_EXTENSIONS = {
         "pdf": [".pdf"],
@@ -34,17 +75,86 @@ class Settings(BaseSettings):
         ],
     }
     
+    # Conversion d'images en PDF
+    IMAGE_WORKERS: int = 0  # Threads de décodage (0 = nombre de cœurs)
+    IMAGE_PREFETCH: int = 0  # Images décodées à l'avance (0 = 2 × threads)
+    IMAGE_FLUSH_PAGES: int = 50  # Pages gardées en mémoire avant sauvegarde incrémentale
+
+    # Signature par lot
+    SIGN_WORKERS: int = 0  # Processus de signature (0 = nombre de cœurs)
+
+    # Rendu des pages en images (compression, miniatures, OCR) : "pymupdf",
+    # "pypdfium2" ou "auto" (le plus rapide des deux, mesuré au démarrage sur
+    # RENDER_BENCHMARK_FILE, un PDF représentatif, ou à défaut sur une page de test)
+    RENDER_BACKEND: str = "auto"
+    RENDER_BENCHMARK_FILE: Optional[str] = None
+    RENDER_BENCHMARK_PAGES: int = 5  # Pages rendues par moteur pour ce choix
+
+    # Reconnaissance de texte (OCR)
+    TESSERACT_CMD: str = "tesseract"  # Chemin ou nom de l'exécutable Tesseract
+    OCR_MAX_WORKERS: int = 0  # Processus de reconnaissance (0 = nombre de cœurs)
+    OCR_DEFAULT_DPI: int = 300  # Résolution de rendu des pages
+    OCR_CACHE_MAX_PAGES: int = 2000  # Pages reconnues gardées en cache mémoire (0 = désactivé)
+
+    # Recherche plein texte
+    SEARCH_INDEX_BATCH_PAGES: int = 50  # Pages indexées entre deux vérifications des résultats
+
+    # Regroupement des requêtes identiques (compression, conversion)
+    RESULT_CACHE_TTL_SECONDS: int = 60  # Durée de réutilisation d'un résultat (0 = regroupement seul)
+
+    # File de travaux asynchrones (/jobs) : "sqlite" (fichier partagé, JOB_QUEUE_PATH),
+    # "redis" (JOB_QUEUE_URL, paquet redis requis) ou "memory" (substitut Redis
+    # en mémoire, limité au processus). Pour répartir les travaux sur plusieurs
+    # nœuds, TEMP_DIR et STORE_DIR doivent être sur un volume partagé
+    JOB_QUEUE_BACKEND: str = "sqlite"
+    JOB_QUEUE_PATH: Optional[str] = None  # Défaut : STATE_DIR/jobs.sqlite
+    JOB_QUEUE_URL: str = "redis://localhost:6379/0"
+    JOB_WORKER_CONCURRENCY: int = 1  # Travaux exécutés par le serveur API (0 = workers dédiés uniquement)
+    JOB_LEASE_SECONDS: float = 60.0  # Un travail sans signe de vie de son worker est remis en file
+    JOB_MAX_ATTEMPTS: int = 3  # Tentatives avant échec définitif
+    JOB_POLL_SECONDS: float = 0.5  # Intervalle de scrutation de la file par un worker inactif
+
+    # Limites des opérations. Les traitements d'un document (compression,
+    # découpage, extraction...) s'exécutent dans un processus supervisé, tué
+    # au-delà de la durée permise ; sa mémoire allouée est bornée.
+    # Limites par suffixe de route, défauts sinon. OPERATION_ISOLATION=False :
+    # exécution dans le processus du serveur, limites de durée seules (vérifiées
+    # entre deux pages). Une requête dont le client se déconnecte est annulée
+    OPERATION_ISOLATION: bool = True
+    OPERATION_TIMEOUT_SECONDS: float = 300.0
+    OPERATION_TIMEOUTS: dict = {
+        "/ocr": 3600.0,
+        "/convert-to-pdf": 900.0,
+        "/images-to-pdf": 900.0,
+        "/sign-batch": 900.0,
+    }
+    OPERATION_MEMORY_LIMIT_MB: int = 2048  # 0 = sans limite
+    OPERATION_MEMORY_LIMITS_MB: dict = {}
+
+    # Démarrage : opérations dont les bibliothèques sont préchargées en arrière-plan
+    # (ex: ["compress", "ocr"], "all" pour toutes ; vide = import au premier usage)
+    WARMUP_OPERATIONS: list = []
+
+    # Compression des réponses (gzip ; brotli si le paquet brotli est installé).
+    # PDF, ZIP, images et réponses servies par plages ne sont jamais compressés
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # Octets en dessous desquels la réponse part telle quelle
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
     # CORS
     CORS_ORIGINS: list = ["http://localhost:5173", "http://localhost:3000"]  # Frontend dev servers
     
     # Sécurité
     SECURE_MODE: bool = True  # Mode ultra-sécurisé (nettoyage auto)
     
+    # Observabilité
+    TRACE_LOGGING: bool = True  # Log JSON des spans de chaque requête
+    PROFILING_ENABLED: bool = False  # Autoriser le mode ?profile=1
+    PROFILING_INTERVAL_SECONDS: float = 0.005  # Intervalle d'échantillonnage du profileur
+    
     class Config:
         case_sensitive = True
 
 
 settings = Settings()
-
-# Création du dossier temporaire s'il n'existe pas
-os.makedirs(settings.TEMP_DIR, exist_ok=True)
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import re
+import shutil
+from typing import Optional
+
+from .config import settings
+from .temp_manager import temp_manager
+
+# Nom du fichier source dans le dossier d'un document
+DOCUMENT_FILENAME = "document.pdf"
+
+_DOCUMENT_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Empreinte SHA-256 d'un fichier, lue par blocs"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentStore:
+    """
+    Stockage adressé par contenu des documents envoyés.
+
+    Chaque document est rangé dans STORE_DIR/<sha256>/ avec ses artefacts
+    dérivés (index de recherche, ...). Un même fichier envoyé plusieurs fois
+    n'est stocké qu'une fois. Les dossiers sont suivis par le gestionnaire de
+    fichiers temporaires : ils expirent après FILE_RETENTION_SECONDS sans accès.
+    """
+
+    def __init__(self, root: str, retention_seconds: float):
+        self.root = os.path.abspath(root)
+        self.retention_seconds = retention_seconds
+
+    def _document_dir(self, document_id: str) -> str:
+        if not _DOCUMENT_ID.match(document_id or ""):
+            raise ValueError("Identifiant de document invalide")
+        return os.path.join(self.root, document_id)
+
+    def _touch(self, document_dir: str) -> None:
+        """Prolonge la durée de vie d'un document consulté"""
+        os.utime(document_dir)
+        temp_manager.register(document_dir, ttl=self.retention_seconds)
+
+    def put(self, source_path: str, document_id: Optional[str] = None) -> str:
+        """
+        Range un fichier dans le stockage et renvoie son identifiant (SHA-256).
+        Le fichier source est déplacé (ou supprimé s'il est déjà stocké).
+        document_id évite de relire le fichier si son empreinte est déjà connue.
+        """
+        document_id = document_id or file_sha256(source_path)
+        document_dir = self._document_dir(document_id)
+        target = os.path.join(document_dir, DOCUMENT_FILENAME)
+
+        os.makedirs(document_dir, exist_ok=True)
+        if os.path.exists(target):
+            os.remove(source_path)
+        else:
+            # Écriture atomique : le document n'est visible qu'une fois complet
+            partial = target + ".part"
+            shutil.move(source_path, partial)
+            os.replace(partial, target)
+        self._touch(document_dir)
+        return document_id
+
+    def path(self, document_id: str) -> Optional[str]:
+        """Chemin du fichier d'un document, ou None s'il n'est pas (ou plus) stocké"""
+        document_dir = self._document_dir(document_id)
+        target = os.path.join(document_dir, DOCUMENT_FILENAME)
+        if not os.path.exists(target):
+            return None
+        self._touch(document_dir)
+        return target
+
+    def artifact_path(self, document_id: str, name: str) -> str:
+        """Chemin d'un artefact dérivé rangé à côté du document"""
+        return os.path.join(self._document_dir(document_id), name)
+
+
+document_store = DocumentStore(settings.STORE_DIR, settings.FILE_RETENTION_SECONDS)
@@ -0,0 +1,417 @@
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from .config import settings
+from .lazy_imports import lazy_import, module_available
+from .shared_state import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+redis = lazy_import("redis")
+
+# États d'un travail
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def new_job(operation: str, inputs: List[Dict[str, str]], params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Description d'un travail à mettre en file.
+    inputs : fichiers sources rangés dans le stockage partagé
+    ({"document_id": ..., "filename": ...}), dans l'ordre de l'opération.
+    """
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "operation": operation,
+        "inputs": inputs,
+        "params": params,
+        "status": QUEUED,
+        "worker": None,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+        "result": None,
+        "error": None,
+    }
+
+
+def valid_job_id(job_id: str) -> bool:
+    return bool(_JOB_ID.match(job_id or ""))
+
+
+class JobBackend:
+    """
+    Interface des files de travaux.
+
+    Un travail pris par un worker (claim) lui est loué pour lease_seconds :
+    le worker prolonge le bail tant qu'il travaille (heartbeat). Un travail
+    dont le bail expire (worker arrêté, nœud perdu) est remis en file par
+    requeue_expired, jusqu'à max_attempts tentatives.
+    """
+
+    def enqueue(self, job: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def claim(self, worker: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Prend le plus ancien travail en attente, ou renvoie None"""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker: str, lease_seconds: float) -> bool:
+        """Prolonge le bail ; False si le travail n'appartient plus au worker"""
+        raise NotImplementedError
+
+    def finish(
+        self,
+        job_id: str,
+        worker: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> bool:
+        """Enregistre l'issue d'un travail ; False si le travail n'appartient plus au worker"""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def cancel(self, job_id: str) -> bool:
+        """Annule un travail encore en attente"""
+        raise NotImplementedError
+
+    def requeue_expired(self, max_attempts: int) -> int:
+        """Remet en file (ou fait échouer) les travaux dont le bail a expiré"""
+        raise NotImplementedError
+
+    def purge(self, older_than: float) -> int:
+        """Oublie les travaux terminés avant la date indiquée"""
+        raise NotImplementedError
+
+
+class SQLiteJobBackend(SQLiteDatabase, JobBackend):
+    """
+    File de travaux dans une base SQLite : suffisante pour plusieurs processus
+    d'un même nœud, ou pour des tests locaux. Le fichier peut être placé sur
+    un volume partagé entre quelques nœuds si le système de fichiers prend
+    correctement en charge les verrous.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, status TEXT, worker TEXT, lease_expires REAL,
+            attempts INTEGER DEFAULT 0, created_at REAL, updated_at REAL, data TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+    """
+
+    _COLUMNS = "id, status, worker, attempts, created_at, updated_at, data"
+
+    @staticmethod
+    def _job(row) -> Dict[str, Any]:
+        job_id, status, worker, attempts, created_at, updated_at, data = row
+        return {
+            "id": job_id,
+            "status": status,
+            "worker": worker,
+            "attempts": attempts,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            **json.loads(data),
+        }
+
+    def enqueue(self, job: Dict[str, Any]) -> None:
+        data = {key: job[key] for key in ("operation", "inputs", "params", "result", "error")}
+        self.execute(
+            "INSERT INTO jobs (id, status, worker, attempts, created_at, updated_at, data) "
+            "VALUES (?, ?, NULL, 0, ?, ?, ?)",
+            (job["id"], QUEUED, job["created_at"], job["updated_at"], json.dumps(data)),
+        )
+
+    def claim(self, worker: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        # Vérification en lecture seule : un worker inactif ne prend pas le verrou d'écriture
+        if self.execute("SELECT 1 FROM jobs WHERE status = ? LIMIT 1", (QUEUED,)).fetchone() is None:
+            return None
+        rows = self.execute(
+            "UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+            f"RETURNING {self._COLUMNS}",
+            (RUNNING, worker, now + lease_seconds, now, QUEUED),
+        ).fetchall()
+        return self._job(rows[0]) if rows else None
+
+    def heartbeat(self, job_id: str, worker: str, lease_seconds: float) -> bool:
+        cursor = self.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time() + lease_seconds, job_id, worker, RUNNING),
+        )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id, worker, status, result=None, error=None) -> bool:
+        cursor = self.execute(
+            "UPDATE jobs SET status = ?, lease_expires = NULL, updated_at = ?, "
+            "data = json_set(data, '$.result', json(?), '$.error', ?) "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (status, time.time(), json.dumps(result), error, job_id, worker, RUNNING),
+        )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row is not None else None
+
+    def cancel(self, job_id: str) -> bool:
+        cursor = self.execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, QUEUED),
+        )
+        return cursor.rowcount == 1
+
+    def requeue_expired(self, max_attempts: int) -> int:
+        now = time.time()
+        with self.transaction() as connection:
+            requeued = connection.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE status = ? AND lease_expires <= ? AND attempts < ?",
+                (QUEUED, now, RUNNING, now, max_attempts),
+            ).rowcount
+            failed = connection.execute(
+                "UPDATE jobs SET status = ?, lease_expires = NULL, updated_at = ?, "
+                "data = json_set(data, '$.error', ?) "
+                "WHERE status = ? AND lease_expires <= ?",
+                (FAILED, now, "Travail abandonné après plusieurs tentatives", RUNNING, now),
+            ).rowcount
+        return requeued + failed
+
+    def purge(self, older_than: float) -> int:
+        cursor = self.execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATUSES))}) AND updated_at <= ?",
+            (*FINISHED_STATUSES, older_than),
+        )
+        return cursor.rowcount
+
+
+class RedisJobBackend(JobBackend):
+    """
+    File de travaux sur un serveur compatible Redis, partagée par tous les nœuds.
+
+    - <prefix>:job:<id> : description JSON du travail
+    - <prefix>:queue : identifiants en attente (pris par RPOPLPUSH)
+    - <prefix>:running : identifiants en cours
+    - <prefix>:leases : échéance du bail de chaque travail en cours (ensemble trié)
+
+    Seules quelques commandes sont utilisées (voir LocalRedis) : le client
+    redis-py (decode_responses=True) ou tout objet offrant la même interface
+    convient.
+    """
+
+    def __init__(self, client, prefix: str = "pdf-reader:jobs", retention_seconds: float = 3600):
+        self.client = client
+        self.prefix = prefix
+        self.retention_seconds = retention_seconds
+        self.queue_key = f"{prefix}:queue"
+        self.running_key = f"{prefix}:running"
+        self.leases_key = f"{prefix}:leases"
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def _save(self, job: Dict[str, Any], finished: bool = False) -> None:
+        job["updated_at"] = time.time()
+        # Les travaux terminés expirent d'eux-mêmes
+        self.client.set(self._key(job["id"]), json.dumps(job), ex=int(self.retention_seconds) if finished else None)
+
+    def enqueue(self, job: Dict[str, Any]) -> None:
+        self._save(job)
+        self.client.lpush(self.queue_key, job["id"])
+
+    def claim(self, worker: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        job_id = self.client.rpoplpush(self.queue_key, self.running_key)
+        if job_id is None:
+            return None
+        job = self.get(job_id)
+        if job is None or job["status"] != QUEUED:
+            self.client.lrem(self.running_key, 0, job_id)
+            return None
+        job.update(status=RUNNING, worker=worker, attempts=job["attempts"] + 1)
+        self._save(job)
+        self.client.zadd(self.leases_key, {job_id: time.time() + lease_seconds})
+        return job
+
+    def heartbeat(self, job_id: str, worker: str, lease_seconds: float) -> bool:
+        job = self.get(job_id)
+        if job is None or job["worker"] != worker or job["status"] != RUNNING:
+            return False
+        self.client.zadd(self.leases_key, {job_id: time.time() + lease_seconds})
+        return True
+
+    def finish(self, job_id, worker, status, result=None, error=None) -> bool:
+        job = self.get(job_id)
+        if job is None or job["worker"] != worker or job["status"] != RUNNING:
+            return False
+        job.update(status=status, result=result, error=error)
+        self._save(job, finished=True)
+        self.client.zrem(self.leases_key, job_id)
+        self.client.lrem(self.running_key, 0, job_id)
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = self.client.get(self._key(job_id))
+        return json.loads(data) if data is not None else None
+
+    def cancel(self, job_id: str) -> bool:
+        # LREM est atomique : un travail retiré de la file ne peut plus être pris
+        if not self.client.lrem(self.queue_key, 0, job_id):
+            return False
+        job = self.get(job_id)
+        if job is not None:
+            job["status"] = CANCELLED
+            self._save(job, finished=True)
+        return True
+
+    def requeue_expired(self, max_attempts: int) -> int:
+        count = 0
+        for job_id in self.client.zrangebyscore(self.leases_key, "-inf", time.time()):
+            # Un seul nœud obtient le retrait du bail et traite le travail
+            if not self.client.zrem(self.leases_key, job_id):
+                continue
+            self.client.lrem(self.running_key, 0, job_id)
+            job = self.get(job_id)
+            if job is None:
+                continue
+            if job["attempts"] >= max_attempts:
+                job.update(status=FAILED, error="Travail abandonné après plusieurs tentatives")
+                self._save(job, finished=True)
+            else:
+                job.update(status=QUEUED, worker=None)
+                self._save(job)
+                # Repris en priorité (la file est consommée par la droite)
+                self.client.rpush(self.queue_key, job_id)
+            count += 1
+        return count
+
+    def purge(self, older_than: float) -> int:
+        # Les travaux terminés expirent via le TTL des clés
+        return 0
+
+
+class LocalRedis:
+    """
+    Substitut en mémoire des quelques commandes Redis utilisées par
+    RedisJobBackend (mêmes signatures que redis-py avec decode_responses=True).
+    Limité au processus courant : pour les tests et le développement.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, name: str) -> Any:
+        expires_at = self._expires.get(name)
+        if expires_at is not None and expires_at <= time.time():
+            self._values.pop(name, None)
+            self._expires.pop(name, None)
+        return self._values.get(name)
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._live(name)
+
+    def set(self, name: str, value: str, ex: Optional[int] = None) -> bool:
+        with self._lock:
+            self._values[name] = value
+            if ex is not None:
+                self._expires[name] = time.time() + ex
+            else:
+                self._expires.pop(name, None)
+            return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            count = 0
+            for name in names:
+                count += self._live(name) is not None
+                self._values.pop(name, None)
+                self._expires.pop(name, None)
+            return count
+
+    def lpush(self, name: str, *values: str) -> int:
+        with self._lock:
+            items = self._values.setdefault(name, [])
+            for value in values:
+                items.insert(0, value)
+            return len(items)
+
+    def rpush(self, name: str, *values: str) -> int:
+        with self._lock:
+            items = self._values.setdefault(name, [])
+            items.extend(values)
+            return len(items)
+
+    def rpoplpush(self, src: str, dst: str) -> Optional[str]:
+        with self._lock:
+            items = self._values.get(src)
+            if not items:
+                return None
+            value = items.pop()
+            self._values.setdefault(dst, []).insert(0, value)
+            return value
+
+    def lrem(self, name: str, count: int, value: str) -> int:
+        # Seul count = 0 (toutes les occurrences) est utilisé
+        with self._lock:
+            items = self._values.get(name, [])
+            kept = [item for item in items if item != value]
+            self._values[name] = kept
+            return len(items) - len(kept)
+
+    def zadd(self, name: str, mapping: Dict[str, float]) -> int:
+        with self._lock:
+            scores = self._values.setdefault(name, {})
+            added = sum(member not in scores for member in mapping)
+            scores.update(mapping)
+            return added
+
+    def zrem(self, name: str, *values: str) -> int:
+        with self._lock:
+            scores = self._values.get(name, {})
+            return sum(scores.pop(value, None) is not None for value in values)
+
+    def zrangebyscore(self, name: str, min: Any, max: Any) -> List[str]:
+        with self._lock:
+            low, high = float(min), float(max)
+            ordered = sorted((score, member) for member, score in self._values.get(name, {}).items())
+            start = bisect.bisect_left(ordered, (low, ""))
+            return [member for score, member in ordered[start:] if score <= high]
+
+
+def create_job_backend() -> JobBackend:
+    """File de travaux choisie par JOB_QUEUE_BACKEND"""
+    backend = settings.JOB_QUEUE_BACKEND
+    if backend == "sqlite":
+        return SQLiteJobBackend(settings.JOB_QUEUE_PATH or os.path.join(settings.STATE_DIR, "jobs.sqlite"))
+    if backend == "memory":
+        return RedisJobBackend(LocalRedis(), retention_seconds=settings.RESULT_RETENTION_SECONDS)
+    if backend == "redis":
+        if not module_available("redis"):
+            raise RuntimeError("Le paquet redis est requis pour JOB_QUEUE_BACKEND=redis")
+        client = redis.Redis.from_url(settings.JOB_QUEUE_URL, decode_responses=True)
+        return RedisJobBackend(client, retention_seconds=settings.RESULT_RETENTION_SECONDS)
+    raise ValueError(f"File de travaux inconnue: {backend}")
+
+
+job_queue = create_job_backend()
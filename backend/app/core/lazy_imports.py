@@ -0,0 +1,126 @@
+import importlib
+import logging
+import threading
+import time
+import types
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Modules lourds nécessaires à chaque famille d'opérations (préchargement)
+OPERATION_MODULES: Dict[str, List[str]] = {
+    "merge": ["PyPDF2"],
+    "split": ["PyPDF2"],
+    "extract": ["PyPDF2"],
+    "remove": ["PyPDF2"],
+    "reorder": ["PyPDF2"],
+    "info": ["PyPDF2", "fitz"],
+    "thumbnail": ["fitz", "pypdfium2", "PIL.Image"],
+    "compress": ["fitz", "pypdfium2", "PIL.Image"],
+    "convert": ["PyPDF2", "fitz", "PIL.Image"],
+    "sign": ["fitz", "PIL.Image"],
+    "watermark": ["fitz", "PIL.Image"],
+    "text": ["fitz"],
+    "search": ["fitz"],
+    "ocr": ["fitz", "pypdfium2", "numpy", "cv2", "pytesseract"],
+}
+
+_modules: Dict[str, "LazyModule"] = {}
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module importé au premier accès à l'un de ses attributs.
+    Le temps d'import est mesuré pour le rapport de démarrage.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_module: Optional[types.ModuleType] = None
+        self._lazy_error: Optional[ImportError] = None
+        self._lazy_seconds: Optional[float] = None
+        self._lazy_lock = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        module = self._lazy_module
+        if module is not None:
+            return module
+        with self._lazy_lock:
+            if self._lazy_module is None:
+                if self._lazy_error is not None:
+                    raise self._lazy_error
+                start = time.perf_counter()
+                try:
+                    self._lazy_module = importlib.import_module(self.__name__)
+                except ImportError as e:
+                    self._lazy_error = e
+                    raise
+                finally:
+                    self._lazy_seconds = time.perf_counter() - start
+                logger.debug(f"Module {self.__name__} importé en {self._lazy_seconds:.3f} s")
+            return self._lazy_module
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "chargé" if self._lazy_module is not None else "différé"
+        return f"<module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Renvoie le module `name` sans l'importer ; l'import a lieu au premier usage"""
+    with _lock:
+        module = _modules.get(name)
+        if module is None:
+            module = LazyModule(name)
+            _modules[name] = module
+        return module
+
+
+def module_available(name: str) -> bool:
+    """Importe (si besoin) un module optionnel et indique s'il est utilisable"""
+    try:
+        lazy_import(name)._load()
+        return True
+    except ImportError:
+        return False
+
+
+def preload(names: Iterable[str]) -> Dict[str, bool]:
+    """Importe les modules indiqués (les modules optionnels absents sont ignorés)"""
+    return {name: module_available(name) for name in names}
+
+
+def operation_modules(operations: Iterable[str]) -> List[str]:
+    """Modules nécessaires aux opérations indiquées ("all" = toutes)"""
+    operations = list(operations)
+    if "all" in operations:
+        operations = list(OPERATION_MODULES)
+    names: List[str] = []
+    for operation in operations:
+        if operation not in OPERATION_MODULES:
+            logger.warning(f"Opération inconnue pour le préchargement: {operation}")
+            continue
+        for name in OPERATION_MODULES[operation]:
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def lazy_import_report() -> Dict[str, Dict[str, object]]:
+    """État des modules différés : chargés ou non, durée d'import"""
+    with _lock:
+        modules = list(_modules.values())
+    return {
+        module.__name__: {
+            "loaded": module._lazy_module is not None,
+            "available": None if module._lazy_seconds is None else module._lazy_error is None,
+            "import_seconds": None if module._lazy_seconds is None else round(module._lazy_seconds, 4),
+        }
+        for module in modules
+    }
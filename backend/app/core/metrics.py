@@ -0,0 +1,370 @@
+import time
+import threading
+import bisect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .tracing import span
+
+# Opération en cours (chemin de la route), positionnée par le middleware
+# pour que les services puissent étiqueter leurs mesures sans la recevoir en paramètre
+current_operation: ContextVar[str] = ContextVar("current_operation", default="none")
+
+# Mesures relevées dans un processus supervisé, rejouées par le processus parent
+_captured: ContextVar[Optional[list]] = ContextVar("captured_metrics", default=None)
+
+# Bornes par défaut des histogrammes de latence (en secondes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = "") -> str:
+    """Formate les labels au format texte Prometheus"""
+    parts = []
+    for name, value in zip(label_names, label_values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base commune des métriques : nom, aide, labels et verrou"""
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Tuple[str, ...]) -> Tuple[str, ...]:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"{self.name} attend les labels {self.label_names}")
+        return tuple(str(v) for v in labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        return []
+
+
+class Counter(_Metric):
+    """Compteur monotone"""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Valeur instantanée, éventuellement calculée au moment de la collecte"""
+    metric_type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Tuple[str, ...] = (),
+        callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None,
+    ):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, *labels: str, value: float) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def get(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        if self._callback is not None:
+            try:
+                values = dict(self._callback())
+            except Exception:
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}"
+            for k, v in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif à bornes fixes"""
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # clé -> [compteurs par borne (+Inf inclus), somme, total]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = state
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = []
+        for key, (counts, total_sum, total_count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {total_count}")
+        return lines
+
+
+class Registry:
+    """Ensemble des métriques exposées par /metrics"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS_TOTAL = registry.register(Counter(
+    "pdf_reader_requests_total", "Nombre de requêtes HTTP traitées", ("method", "route", "status")
+))
+REQUEST_DURATION = registry.register(Histogram(
+    "pdf_reader_request_duration_seconds", "Durée de traitement des requêtes HTTP", ("method", "route")
+))
+REQUESTS_IN_PROGRESS = registry.register(Gauge(
+    "pdf_reader_requests_in_progress", "Requêtes HTTP en cours de traitement", ("route",)
+))
+STAGE_DURATION = registry.register(Histogram(
+    "pdf_reader_stage_duration_seconds",
+    "Durée des étapes d'une opération (upload, parse, process, write, send)",
+    ("operation", "stage"),
+))
+BYTES_IN = registry.register(Counter(
+    "pdf_reader_bytes_received_total", "Octets reçus dans les corps de requête", ("route",)
+))
+BYTES_OUT = registry.register(Counter(
+    "pdf_reader_bytes_sent_total", "Octets envoyés dans les corps de réponse", ("route",)
+))
+PAGES_PROCESSED = registry.register(Counter(
+    "pdf_reader_pages_processed_total", "Pages traitées par opération", ("operation",)
+))
+PIPELINE_QUEUE = registry.register(Gauge(
+    "pdf_reader_pipeline_queue_depth", "Tâches soumises aux pools de traitement et non encore consommées", ("pipeline",)
+))
+CACHE_REQUESTS = registry.register(Counter(
+    "pdf_reader_cache_requests_total", "Accès aux caches (hit/miss)", ("cache", "result")
+))
+JOBS_TOTAL = registry.register(Counter(
+    "pdf_reader_jobs_total", "Travaux asynchrones exécutés par ce processus", ("operation", "status")
+))
+
+
+def _worker_pool_stats() -> Dict[Tuple[str, ...], float]:
+    """Occupation du pool de threads utilisé par FastAPI pour le travail bloquant"""
+    import anyio.to_thread
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    stats = limiter.statistics()
+    return {
+        ("threadpool", "busy"): stats.borrowed_tokens,
+        ("threadpool", "capacity"): limiter.total_tokens,
+        ("threadpool", "waiting"): stats.tasks_waiting,
+    }
+
+
+def _temp_dir_usage() -> Dict[Tuple[str, ...], float]:
+    """
+    Taille et nombre d'artefacts de TEMP_DIR d'après l'index du gestionnaire
+    de fichiers temporaires : pas de parcours du disque à chaque collecte,
+    qui s'exécute sur la boucle d'événements
+    """
+    from .temp_manager import temp_manager
+
+    usage = temp_manager.usage()
+    return {("bytes",): usage["bytes"], ("files",): usage["entries"]}
+
+
+def _temp_manager_usage() -> Dict[Tuple[str, ...], float]:
+    """Artefacts temporaires suivis par le gestionnaire de cycle de vie"""
+    from .temp_manager import temp_manager
+
+    usage = temp_manager.usage()
+    return {("entries",): usage["entries"], ("bytes",): usage["bytes"]}
+
+
+def _admission_state() -> Dict[Tuple[str, ...], float]:
+    """Réservations d'espace disque du contrôle d'admission"""
+    from .admission import admission_controller
+
+    snapshot = admission_controller.snapshot()
+    return {
+        ("reserved_bytes",): snapshot["reserved_bytes"],
+        ("reservations",): len(snapshot["reservations"]),
+        ("waiting",): snapshot["waiting"],
+        ("rejected",): snapshot["rejected"],
+    }
+
+
+def _scratch_usage() -> Dict[Tuple[str, ...], float]:
+    """Occupation de l'espace de travail en mémoire"""
+    from .scratch import scratch_manager
+
+    return {(key,): value for key, value in scratch_manager.usage().items()}
+
+
+WORKER_POOL = registry.register(Gauge(
+    "pdf_reader_worker_pool", "État des pools de workers", ("pool", "state"), callback=_worker_pool_stats
+))
+TEMP_DIR_USAGE = registry.register(Gauge(
+    "pdf_reader_temp_dir_usage", "Occupation du dossier temporaire", ("unit",), callback=_temp_dir_usage
+))
+ADMISSION = registry.register(Gauge(
+    "pdf_reader_disk_admission", "État du contrôle d'admission disque", ("state",), callback=_admission_state
+))
+TEMP_TRACKED = registry.register(Gauge(
+    "pdf_reader_temp_tracked", "Artefacts temporaires suivis avec une expiration", ("unit",), callback=_temp_manager_usage
+))
+SCRATCH_USAGE = registry.register(Gauge(
+    "pdf_reader_scratch_memory", "Espace de travail en mémoire (tmpfs)", ("state",), callback=_scratch_usage
+))
+
+
+@contextmanager
+def time_stage(stage: str, operation: Optional[str] = None):
+    """
+    Mesure la durée d'une étape de l'opération en cours (histogramme et span de trace).
+    L'opération est déduite de la requête si elle n'est pas fournie.
+    """
+    operation = operation or current_operation.get()
+    start = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(operation, stage, value=elapsed)
+        captured = _captured.get()
+        if captured is not None:
+            captured.append(("stage", stage, elapsed))
+
+
+def record_pages(count: int, operation: Optional[str] = None) -> None:
+    """Comptabilise des pages traitées pour l'opération en cours"""
+    PAGES_PROCESSED.inc(operation or current_operation.get(), amount=count)
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(("pages", None, count))
+
+
+@contextmanager
+def capture_metrics():
+    """
+    Relève les durées d'étapes et pages traitées du bloc (dans un processus
+    supervisé) pour que le processus parent les rejoue avec replay_metrics()
+    """
+    observations: list = []
+    token = _captured.set(observations)
+    try:
+        yield observations
+    finally:
+        _captured.reset(token)
+
+
+def replay_metrics(observations: list, operation: Optional[str] = None) -> None:
+    """Comptabilise pour l'opération en cours les mesures relevées par capture_metrics()"""
+    operation = operation or current_operation.get()
+    for kind, stage, value in observations:
+        if kind == "stage":
+            STAGE_DURATION.observe(operation, stage, value=value)
+        else:
+            PAGES_PROCESSED.inc(operation, amount=value)
+    captured = _captured.get()
+    if captured is not None:
+        captured.extend(observations)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Comptabilise un accès à un cache"""
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def render_metrics() -> str:
+    """Exporte toutes les métriques au format texte Prometheus"""
+    return registry.render()
@@ -0,0 +1,234 @@
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .config import settings
+from .shared_state import MULTI_WORKER, SharedState, shared_state, worker_id
+
+logger = logging.getLogger(__name__)
+
+# Pools de processus nommés, partagés entre les requêtes (un par famille de
+# tâches pour qu'une opération longue n'affame pas les autres)
+_pools: Dict[str, ProcessPoolExecutor] = {}
+_queues: Dict[str, "SharedTaskQueue"] = {}
+_lock = threading.Lock()
+
+
+def get_process_pool(name: str, max_workers: int = 0) -> ProcessPoolExecutor:
+    """
+    Renvoie le pool de processus `name`, créé au premier usage.
+    Les processus sont lancés en mode "spawn" : le serveur est multi-thread
+    et un fork pourrait copier des verrous détenus par d'autres threads.
+    """
+    with _lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pools[name] = pool
+        return pool
+
+
+def reset_process_pool(name: str) -> None:
+    """Abandonne un pool (ex: processus tué) ; il sera recréé au prochain appel"""
+    with _lock:
+        pool = _pools.pop(name, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class SharedTaskQueue:
+    """
+    File de tâches commune aux workers d'un nœud (mode multi-worker).
+
+    Les tâches soumises par un worker sont inscrites dans l'état partagé.
+    Chaque worker en exécute autant qu'il a de processus libres dans son
+    pool local, en servant d'abord les siennes puis celles des autres : un
+    worker inoccupé vole ainsi le travail d'un worker chargé, et chaque
+    cœur du nœud reste utilisé sans lancer plus de processus qu'il n'y en a.
+    Le résultat (ou l'exception) revient au demandeur par la même table.
+
+    Les fonctions et arguments doivent être sérialisables (pickle) et les
+    chemins de fichiers accessibles à tous les workers du nœud.
+    """
+
+    def __init__(self, name: str, state: SharedState, slots: int):
+        self.name = name
+        self.state = state
+        self.slots = max(1, slots)
+        self._futures: Dict[int, Future] = {}
+        self._running = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Inscrit une tâche dans la file partagée et renvoie son Future local"""
+        self._start()
+        future: Future = Future()
+        cursor = self.state.execute(
+            "INSERT INTO tasks (queue, owner, state, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+            (self.name, worker_id(), pickle.dumps((fn, args)), time.time()),
+        )
+        with self._lock:
+            self._futures[cursor.lastrowid] = future
+        self._wakeup.set()
+        return future
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            # Signe de vie immédiat : nos tâches ne doivent pas passer pour orphelines
+            self.state.heartbeat()
+            self._thread = threading.Thread(target=self._run, name=f"shared-queue-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+
+    # --- Exécution des tâches (les nôtres d'abord, puis celles des autres) ---
+
+    def _claim(self, count: int) -> List[Tuple[int, bytes]]:
+        # Lecture préalable : éviter de prendre le verrou d'écriture quand la file est vide
+        if self.state.execute(
+            "SELECT 1 FROM tasks WHERE queue = ? AND state = 'queued' LIMIT 1", (self.name,)
+        ).fetchone() is None:
+            return []
+        me = worker_id()
+        return self.state.execute(
+            "UPDATE tasks SET state = 'running', claimed_by = ? WHERE id IN ("
+            " SELECT id FROM tasks WHERE queue = ? AND state = 'queued'"
+            " ORDER BY owner = ? DESC, id LIMIT ?"
+            ") RETURNING id, payload",
+            (me, self.name, me, count),
+        ).fetchall()
+
+    def _execute(self, task_id: int, payload: bytes) -> None:
+        with self._lock:
+            self._running += 1
+        try:
+            fn, args = pickle.loads(payload)
+            local = get_process_pool(self.name, self.slots).submit(fn, *args)
+        except BaseException as e:
+            if isinstance(e, BrokenProcessPool):
+                reset_process_pool(self.name)
+            self._finish(task_id, ("error", e))
+            return
+        local.add_done_callback(lambda done: self._finish(task_id, _outcome(done, self.name)))
+
+    def _finish(self, task_id: int, outcome: Tuple[str, Any]) -> None:
+        try:
+            result = pickle.dumps(outcome)
+        except Exception as e:
+            result = pickle.dumps(("error", RuntimeError(f"Résultat non transmissible: {str(e)}")))
+        try:
+            self.state.execute(
+                "UPDATE tasks SET state = 'done', result = ?, payload = NULL WHERE id = ? AND state = 'running'",
+                (result, task_id),
+            )
+        except Exception as e:
+            logger.error(f"Impossible d'enregistrer le résultat de la tâche {task_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._wakeup.set()
+
+    # --- Retour des résultats à nos Futures ------------------------------
+
+    def _collect(self) -> None:
+        with self._lock:
+            if not self._futures:
+                return
+            cancelled = [task_id for task_id, future in self._futures.items() if future.cancelled()]
+            for task_id in cancelled:
+                del self._futures[task_id]
+        if cancelled:
+            self.state.execute(
+                f"DELETE FROM tasks WHERE id IN ({','.join('?' * len(cancelled))})", tuple(cancelled)
+            )
+
+        rows = self.state.execute(
+            "SELECT id, result FROM tasks WHERE owner = ? AND queue = ? AND state = 'done'",
+            (worker_id(), self.name),
+        ).fetchall()
+        if not rows:
+            return
+        self.state.execute(
+            f"DELETE FROM tasks WHERE id IN ({','.join('?' * len(rows))})", tuple(row[0] for row in rows)
+        )
+        for task_id, result in rows:
+            with self._lock:
+                future = self._futures.pop(task_id, None)
+            if future is None or future.done():
+                continue
+            status, value = pickle.loads(result)
+            if status == "ok":
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _run(self) -> None:
+        while not self._stopping:
+            try:
+                with self._lock:
+                    free = self.slots - self._running
+                if free > 0:
+                    for task_id, payload in self._claim(free):
+                        self._execute(task_id, payload)
+                self._collect()
+            except Exception as e:
+                logger.error(f"Erreur de la file de tâches partagée {self.name}: {str(e)}")
+            self._wakeup.wait(settings.SHARED_TASK_POLL_SECONDS)
+            self._wakeup.clear()
+
+
+def _outcome(future: Future, pool_name: str) -> Tuple[str, Any]:
+    """Résultat ou exception d'une tâche exécutée dans le pool local"""
+    try:
+        return "ok", future.result()
+    except BrokenProcessPool as e:
+        reset_process_pool(pool_name)
+        return "error", e
+    except BaseException as e:
+        return "error", e
+
+
+def get_executor(name: str, max_workers: int = 0) -> Union[ProcessPoolExecutor, SharedTaskQueue]:
+    """
+    Exécuteur des tâches lourdes `name` : le pool de processus local, ou en
+    mode multi-worker la file partagée entre les workers du nœud (les cœurs
+    sont alors répartis entre les workers, sauf si max_workers est fixé).
+    """
+    if not MULTI_WORKER:
+        return get_process_pool(name, max_workers)
+    with _lock:
+        queue = _queues.get(name)
+        if queue is None:
+            slots = max_workers or max(1, (os.cpu_count() or 1) // settings.WORKERS)
+            queue = SharedTaskQueue(name, shared_state, slots)
+            _queues[name] = queue
+        return queue
+
+
+def shutdown_process_pools() -> None:
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        queues = list(_queues.values())
+        _queues.clear()
+    for queue in queues:
+        queue.stop()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage : relève périodiquement la pile d'un thread
+    et agrège les piles au format "folded" (compatible flamegraph.pl / speedscope).
+
+    D'autres threads (traitement déporté dans le pool de threads) peuvent être
+    suivis le temps d'un bloc avec watch_thread(), et les piles relevées dans
+    un processus supervisé ajoutées avec merge().
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.thread_ids = {self.thread_id}
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _sample(self) -> None:
+        frames = sys._current_frames()
+        for thread_id in list(self.thread_ids):
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    @contextmanager
+    def watch_thread(self):
+        """Échantillonne aussi le thread courant pendant le bloc"""
+        thread_id = threading.get_ident()
+        added = thread_id not in self.thread_ids
+        self.thread_ids.add(thread_id)
+        try:
+            yield
+        finally:
+            if added:
+                self.thread_ids.discard(thread_id)
+
+    def merge(self, stacks: Dict[str, int], samples: int, root: str = "") -> None:
+        """Ajoute des piles relevées ailleurs (sous le cadre racine root s'il est fourni)"""
+        for stack, count in stacks.items():
+            self.stacks[f"{root};{stack}" if root else stack] += count
+        self.samples += samples
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "SamplingProfiler":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def folded(self) -> str:
+        """Exporte les piles agrégées, une ligne "pile;appelée nombre" par pile"""
+        lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        return "\n".join(lines) + "\n"
+
+
+_current_profiler: ContextVar[Optional[SamplingProfiler]] = ContextVar("current_profiler", default=None)
+
+
+def current_profiler() -> Optional[SamplingProfiler]:
+    """Profileur de la requête courante (mode ?profile=1), s'il y en a un"""
+    return _current_profiler.get()
+
+
+@contextmanager
+def profiling_scope(profiler: SamplingProfiler):
+    reset = _current_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _current_profiler.reset(reset)
@@ -0,0 +1,242 @@
+import json
+import os
+import re
+import shutil
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from .config import settings
+from .temp_manager import temp_manager
+
+# Fichiers d'un résultat dans son dossier
+CONTENT_FILENAME = "content"
+META_FILENAME = "result.json"
+
+# Préfixe des dossiers de résultats dans TEMP_DIR
+RESULT_DIR_PREFIX = "result-"
+
+_RESULT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class StoredResult:
+    """Fichier résultat conservé et son nom de téléchargement"""
+    __slots__ = ("result_id", "path", "filename", "media_type", "stat")
+
+    def __init__(self, result_id: str, path: str, filename: str, media_type: str, stat: os.stat_result):
+        self.result_id = result_id
+        self.path = path
+        self.filename = filename
+        self.media_type = media_type
+        self.stat = stat
+
+    @property
+    def etag(self) -> str:
+        # Un résultat n'est jamais modifié : son identifiant suffit comme ETag fort
+        return f'"{self.result_id}"'
+
+    @property
+    def url(self) -> str:
+        return f"{settings.API_V1_STR}/results/{self.result_id}"
+
+
+class ResultStore:
+    """
+    Résultats des opérations, adressables par identifiant.
+
+    Chaque résultat est rangé dans TEMP_DIR/result-<id>/ et suivi par le
+    gestionnaire de fichiers temporaires : il reste téléchargeable (et
+    reprenable) jusqu'à expiration ou jusqu'à sa suppression explicite.
+    L'identifiant, aléatoire, sert aussi de droit d'accès.
+    """
+
+    def __init__(self, root: str, retention_seconds: float):
+        self.root = os.path.abspath(root)
+        self.retention_seconds = retention_seconds
+
+    def _result_dir(self, result_id: str) -> str:
+        if not _RESULT_ID.match(result_id or ""):
+            raise ValueError("Identifiant de résultat invalide")
+        return os.path.join(self.root, RESULT_DIR_PREFIX + result_id)
+
+    def put(self, source_path: str, filename: str, media_type: str = "application/pdf", copy: bool = False) -> StoredResult:
+        """
+        Conserve un fichier résultat. Le fichier est déplacé, ou lié (copié à
+        défaut) si copy est vrai, par exemple pour un résultat partagé.
+        """
+        result_id = uuid.uuid4().hex
+        result_dir = self._result_dir(result_id)
+        target = os.path.join(result_dir, CONTENT_FILENAME)
+        os.makedirs(result_dir)
+        if copy:
+            try:
+                os.link(source_path, target)
+            except OSError:
+                shutil.copyfile(source_path, target)
+        else:
+            shutil.move(source_path, target)
+        with open(os.path.join(result_dir, META_FILENAME), "w", encoding="utf-8") as f:
+            json.dump({"filename": filename, "media_type": media_type}, f)
+        temp_manager.register(result_dir, ttl=self.retention_seconds)
+        return StoredResult(result_id, target, filename, media_type, os.stat(target))
+
+    def get(self, result_id: str) -> Optional[StoredResult]:
+        """Résultat `result_id`, ou None s'il n'existe pas (ou plus)"""
+        result_dir = self._result_dir(result_id)
+        target = os.path.join(result_dir, CONTENT_FILENAME)
+        try:
+            with open(os.path.join(result_dir, META_FILENAME), encoding="utf-8") as f:
+                meta = json.load(f)
+            stat = os.stat(target)
+        except (OSError, ValueError):
+            return None
+        return StoredResult(result_id, target, meta["filename"], meta["media_type"], stat)
+
+    def delete(self, result_id: str) -> bool:
+        """Supprime un résultat (accusé de réception du client)"""
+        result_dir = self._result_dir(result_id)
+        if not os.path.isdir(result_dir):
+            return False
+        temp_manager.remove(result_dir)
+        return True
+
+
+class ResultFileResponse(FileResponse):
+    """
+    Envoi d'un résultat conservé : requêtes partielles (Range, If-Range),
+    requêtes conditionnelles (If-None-Match, If-Modified-Since, If-Match) et
+    envoi sans copie lorsque le serveur propose les extensions ASGI
+    "http.response.pathsend" ou "http.response.zerocopy".
+    """
+
+    def __init__(
+        self,
+        result: StoredResult,
+        headers: Optional[Dict[str, str]] = None,
+        background: Optional[BackgroundTask] = None,
+    ):
+        all_headers = {
+            "ETag": result.etag,
+            "Cache-Control": "private, no-transform",
+            "X-Result-Id": result.result_id,
+            "X-Result-Url": result.url,
+        }
+        all_headers.update(headers or {})
+        super().__init__(
+            path=result.path,
+            filename=result.filename,
+            media_type=result.media_type,
+            headers=all_headers,
+            background=background,
+            stat_result=result.stat,
+        )
+        self.result = result
+        self._extensions: Dict[str, dict] = {}
+
+    def _precondition_status(self, request_headers: Headers) -> Optional[int]:
+        """Statut 304/412 imposé par les en-têtes conditionnels, sinon None"""
+        etag = self.result.etag
+
+        if_match = request_headers.get("if-match")
+        if if_match is not None and if_match.strip() != "*" and etag not in _etag_list(if_match):
+            return 412
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            if if_none_match.strip() == "*" or etag in _etag_list(if_none_match):
+                return 304
+            return None
+
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return None
+            if int(self.result.stat.st_mtime) <= since:
+                return 304
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        status = self._precondition_status(Headers(scope=scope))
+        if status is not None:
+            response = Response(
+                status_code=status,
+                headers={
+                    "ETag": self.result.etag,
+                    "Last-Modified": formatdate(self.result.stat.st_mtime, usegmt=True),
+                },
+                background=self.background,
+            )
+            await response(scope, receive, send)
+            return
+
+        self._extensions = scope.get("extensions") or {}
+        await super().__call__(scope, receive, send)
+
+    async def _send_zerocopy(self, send: Send, offset: int, count: int) -> None:
+        file = await run_in_threadpool(open, self.path, "rb")
+        try:
+            await send({
+                "type": "http.response.zerocopy",
+                "file": file,
+                "offset": offset,
+                "count": count,
+                "more_body": False,
+            })
+        finally:
+            await run_in_threadpool(file.close)
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if send_header_only or not (
+            "http.response.pathsend" in self._extensions or "http.response.zerocopy" in self._extensions
+        ):
+            await super()._handle_simple(send, send_header_only)
+            return
+
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if "http.response.pathsend" in self._extensions:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+        else:
+            await self._send_zerocopy(send, 0, self.result.stat.st_size)
+
+    async def _handle_single_range(self, send: Send, start: int, end: int, file_size: int, send_header_only: bool) -> None:
+        if send_header_only or "http.response.zerocopy" not in self._extensions:
+            await super()._handle_single_range(send, start, end, file_size, send_header_only)
+            return
+
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        await self._send_zerocopy(send, start, end - start)
+
+
+def _etag_list(header: str) -> list:
+    """Valeurs d'un en-tête If-Match / If-None-Match (comparaison faible)"""
+    return [value.strip().removeprefix("W/") for value in header.split(",")]
+
+
+def result_response(
+    output_path: str,
+    filename: str,
+    media_type: str = "application/pdf",
+    headers: Optional[Dict[str, str]] = None,
+    background: Optional[BackgroundTask] = None,
+    copy: bool = False,
+) -> ResultFileResponse:
+    """
+    Conserve le fichier produit par une opération et le renvoie.
+    Le résultat reste ensuite téléchargeable via X-Result-Url (GET /results/{id})
+    jusqu'à expiration ou jusqu'à DELETE /results/{id}.
+    """
+    result = result_store.put(output_path, filename, media_type, copy=copy)
+    return ResultFileResponse(result, headers=headers, background=background)
+
+
+result_store = ResultStore(settings.TEMP_DIR, settings.RESULT_RETENTION_SECONDS)
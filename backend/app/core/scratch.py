@@ -0,0 +1,157 @@
+import logging
+import os
+import threading
+import uuid
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ScratchRequest:
+    """Espace de travail demandé par une requête (taille estimée et dossiers alloués)"""
+    __slots__ = ("expected_size", "allocations")
+
+    def __init__(self, expected_size: int = 0):
+        self.expected_size = expected_size
+        self.allocations: List[str] = []
+
+
+_current_request: ContextVar[Optional[ScratchRequest]] = ContextVar("current_scratch_request", default=None)
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+class ScratchManager:
+    """
+    Répartit les dossiers de travail entre un espace en mémoire (tmpfs, ex. /dev/shm)
+    et le dossier temporaire sur disque.
+
+    Une opération est placée en mémoire si sa taille estimée tient dans le budget
+    restant (occupation du tmpfs + estimations des requêtes en cours) ;
+    sinon elle déborde sur le disque.
+
+    L'occupation du tmpfs est un compteur : augmenté en fin de requête de la
+    taille réelle de ses dossiers, puis recalculé par un parcours complet à
+    chaque passe du thread de nettoyage (refresh), jamais lors d'une allocation.
+    """
+
+    def __init__(self, disk_root: str, memory_root: Optional[str] = None, memory_budget_bytes: int = 0):
+        self.disk_root = disk_root
+        self.memory_root = None
+        self.memory_budget_bytes = memory_budget_bytes
+        self._pending: Dict[str, int] = {}
+        self._memory_used = 0
+        self._lock = threading.Lock()
+
+        if memory_root and memory_budget_bytes > 0:
+            try:
+                os.makedirs(memory_root, exist_ok=True)
+                self.memory_root = memory_root
+            except OSError as e:
+                logger.warning(f"Espace de travail en mémoire indisponible ({memory_root}): {str(e)}")
+        self.refresh()
+
+    @property
+    def roots(self) -> List[str]:
+        return [root for root in (self.disk_root, self.memory_root) if root]
+
+    def begin_request(self, expected_size: int) -> ScratchRequest:
+        """Associe une taille estimée à la requête courante"""
+        request = ScratchRequest(expected_size)
+        _current_request.set(request)
+        return request
+
+    def end_request(self, request: Optional[ScratchRequest]) -> None:
+        """
+        Fin de requête : les estimations sont remplacées par la taille réelle
+        des dossiers de la requête (le plus souvent vidés ou déplacés vers les résultats)
+        """
+        if request is None:
+            return
+        used = sum(_tree_size(path) for path in request.allocations)
+        with self._lock:
+            for path in request.allocations:
+                self._pending.pop(os.path.abspath(path), None)
+            self._memory_used += used
+
+    def refresh(self) -> None:
+        """Recalcule l'occupation réelle du tmpfs (suppressions, autres workers)"""
+        if self.memory_root is None:
+            return
+        used = _tree_size(self.memory_root)
+        with self._lock:
+            self._memory_used = used
+
+    def _memory_fits(self, size: int) -> bool:
+        if self.memory_root is None:
+            return False
+        with self._lock:
+            pending = sum(self._pending.values())
+            return self._memory_used + pending + size <= self.memory_budget_bytes
+
+    def allocate(self, operation_id: Optional[str] = None, expected_size: Optional[int] = None) -> str:
+        """
+        Crée le dossier de travail d'une opération et renvoie son chemin.
+        Sans taille fournie, l'estimation de la requête courante est utilisée ;
+        hors requête, la taille est inconnue et le dossier est créé sur disque.
+        """
+        request = _current_request.get()
+        if expected_size is None and request is not None:
+            expected_size = request.expected_size
+
+        name = operation_id or str(uuid.uuid4())
+        in_memory = expected_size is not None and self._memory_fits(expected_size)
+        root = self.memory_root if in_memory else self.disk_root
+        path = os.path.join(root, name)
+        os.makedirs(path, exist_ok=True)
+
+        if in_memory:
+            with self._lock:
+                self._pending[os.path.abspath(path)] = expected_size
+            if request is not None:
+                request.allocations.append(path)
+        return path
+
+    def release(self, path: str) -> None:
+        """Dossier supprimé : son estimation ne compte plus dans le budget"""
+        with self._lock:
+            self._pending.pop(os.path.abspath(path), None)
+
+    def is_in_memory(self, path: str) -> bool:
+        return bool(self.memory_root) and os.path.abspath(path).startswith(os.path.abspath(self.memory_root) + os.sep)
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes if self.memory_root else 0,
+                "memory_used_bytes": self._memory_used,
+                "memory_pending_bytes": sum(self._pending.values()),
+            }
+
+
+scratch_manager = ScratchManager(
+    settings.TEMP_DIR,
+    memory_root=settings.SCRATCH_MEMORY_DIR,
+    memory_budget_bytes=settings.SCRATCH_MEMORY_BUDGET_MB * 1024 * 1024,
+)
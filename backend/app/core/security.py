@@ -5,6 +5,10 @@ from datetime import datetime
 from pathlib import Path
 
 from .config import settings
+from .metrics import time_stage
+
+# Taille des blocs copiés lors de l'enregistrement d'un fichier envoyé
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 def is_valid_file_extension(filename, allowed_extensions):
@@ -58,9 +62,9 @@ def save_upload_file(upload_file, destination_folder: str, prefix: str = "") ->
     filename = generate_unique_filename(upload_file.filename, prefix)
     file_path = os.path.join(destination_folder, filename)
     
-    # Écrire le fichier
-    with open(file_path, "wb") as f:
-        f.write(upload_file.file.read())
+    # Écrire le fichier par blocs (sans le charger entièrement en mémoire)
+    with time_stage("upload"), open(file_path, "wb") as f:
+        shutil.copyfileobj(upload_file.file, f, UPLOAD_CHUNK_SIZE)
     
     return Path(file_path)
 
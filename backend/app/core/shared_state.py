@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Nom de la base dans STATE_DIR
+STATE_FILENAME = "shared.sqlite"
+
+# Mode multi-worker : plusieurs processus serveur partagent l'état du nœud
+MULTI_WORKER = settings.WORKERS > 1
+
+_process_locks: Dict[str, threading.Lock] = {}
+
+
+def worker_id() -> str:
+    """Identifiant du processus courant (calculé à l'appel : les workers peuvent être forkés)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@contextmanager
+def interprocess_lock(path: str) -> Iterator[None]:
+    """
+    Verrou exclusif sur un fichier, valable entre threads et entre processus
+    (chaque appel ouvre sa propre description de fichier).
+    Sans fcntl (Windows), seul un verrou par processus est pris.
+    """
+    if fcntl is None:
+        with _process_locks.setdefault(path, threading.Lock()):
+            yield
+        return
+    with open(path, "a+") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class SQLiteDatabase:
+    """
+    Base SQLite partagée entre threads et processus (mode WAL).
+    Une connexion est ouverte par thread (et par processus après un fork) ;
+    le schéma (SCHEMA) est créé à la première connexion.
+    """
+
+    SCHEMA = ""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        with self._schema_lock:
+            if not self._schema_ready:
+                self._init_schema(connection)
+                self._schema_ready = True
+        return connection
+
+    def _init_schema(self, connection: sqlite3.Connection) -> None:
+        connection.executescript(self.SCHEMA)
+
+    def execute(self, sql: str, parameters: Tuple = ()) -> sqlite3.Cursor:
+        return self._connection().execute(sql, parameters)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Transaction en écriture (verrou pris dès le début : lecture-modification-écriture sûre)"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+
+class SharedState(SQLiteDatabase):
+    """
+    État partagé entre les workers d'un nœud.
+
+    - kv : valeurs JSON par espace de noms, avec expiration optionnelle
+      (suivi des travaux, index des résultats réutilisables, ...)
+    - leases : baux nommés avec propriétaire et échéance (élection du worker
+      de nettoyage, signes de vie des workers)
+    - tasks : file de tâches consommée par tous les workers (vol de travail)
+    - temp_entries : index des fichiers temporaires (voir SharedTempFileManager)
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS kv (
+            namespace TEXT, key TEXT, value TEXT, expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        );
+        CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at);
+        CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL);
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            queue TEXT, owner TEXT, state TEXT,
+            claimed_by TEXT, payload BLOB, result BLOB, created_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS tasks_queue ON tasks (queue, state, id);
+        CREATE INDEX IF NOT EXISTS tasks_owner ON tasks (owner, state);
+        CREATE TABLE IF NOT EXISTS temp_entries (
+            path TEXT PRIMARY KEY, created_at REAL, expires_at REAL, size INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS temp_entries_expires ON temp_entries (expires_at);
+    """
+
+    # --- Valeurs ----------------------------------------------------------
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        self.execute(
+            "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires_at),
+        )
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self.execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def update(self, namespace: str, key: str, values: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        """Fusionne des champs dans une valeur dictionnaire"""
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            current = json.loads(row[0]) if row is not None else {}
+            current.update(values)
+            expires_at = time.time() + ttl if ttl is not None else None
+            connection.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(current), expires_at),
+            )
+
+    def add(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Écrit la valeur seulement si la clé est absente ou expirée (renvoie True si écrite)"""
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute(
+                "DELETE FROM kv WHERE namespace = ? AND key = ? AND expires_at <= ?", (namespace, key, now)
+            )
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), now + ttl if ttl is not None else None),
+            )
+            return cursor.rowcount == 1
+
+    def delete(self, namespace: str, key: str) -> None:
+        self.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Supprime les valeurs expirées"""
+        cursor = self.execute("DELETE FROM kv WHERE expires_at <= ?", (now or time.time(),))
+        return cursor.rowcount
+
+    # --- Baux -------------------------------------------------------------
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Prend ou renouvelle un bail ; échoue s'il est détenu par un autre propriétaire non expiré"""
+        now = time.time()
+        cursor = self.execute(
+            "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+            (name, owner, now + ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def live_workers(self) -> List[str]:
+        """Workers ayant donné signe de vie récemment"""
+        rows = self.execute(
+            "SELECT owner FROM leases WHERE name LIKE 'worker:%' AND expires_at > ?", (time.time(),)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def heartbeat(self, ttl: Optional[float] = None) -> None:
+        """Signale que le worker courant est vivant"""
+        owner = worker_id()
+        self.acquire_lease(f"worker:{owner}", owner, ttl or settings.WORKER_LEASE_SECONDS)
+
+    def recover_orphans(self) -> int:
+        """
+        Remet en file les tâches prises par un worker mort et supprime celles
+        dont le demandeur est mort (plus personne n'attend leur résultat).
+        """
+        live = set(self.live_workers())
+        with self.transaction() as connection:
+            rows = connection.execute(
+                "SELECT id, owner, state, claimed_by FROM tasks WHERE state IN ('queued', 'running')"
+            ).fetchall()
+            orphaned = [task_id for task_id, owner, _, _ in rows if owner not in live]
+            stalled = [
+                task_id for task_id, owner, state, claimed_by in rows
+                if owner in live and state == "running" and claimed_by not in live
+            ]
+            connection.executemany("DELETE FROM tasks WHERE id = ?", [(i,) for i in orphaned])
+            connection.executemany(
+                "UPDATE tasks SET state = 'queued', claimed_by = NULL WHERE id = ?", [(i,) for i in stalled]
+            )
+            connection.execute(
+                "DELETE FROM leases WHERE name LIKE 'worker:%' AND expires_at <= ?", (time.time(),)
+            )
+        if orphaned or stalled:
+            logger.warning(f"Tâches partagées récupérées: {len(stalled)} remises en file, {len(orphaned)} abandonnées")
+        return len(orphaned) + len(stalled)
+
+
+shared_state = SharedState(os.path.join(settings.STATE_DIR, STATE_FILENAME))
@@ -0,0 +1,401 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import settings
+from .metrics import capture_metrics, replay_metrics
+from .profiling import SamplingProfiler, current_profiler
+from .tracing import get_current_span, get_current_trace, span, start_trace
+
+try:
+    import resource
+except ImportError:  # Windows : pas de limite de mémoire par processus
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Intervalle de surveillance d'un processus supervisé
+POLL_SECONDS = 0.05
+
+# Délai laissé au processus pour s'arrêter de lui-même (entre deux pages) avant d'être tué
+KILL_GRACE_SECONDS = 1.0
+
+# Modules chargés une fois pour toutes par le serveur de processus (forkserver) :
+# chaque opération démarre ainsi sans réimporter les bibliothèques
+_APP_PACKAGE = __name__.rsplit(".", 2)[0]
+SUPERVISED_PRELOAD = [
+    f"{_APP_PACKAGE}.services.pdf_utils", "fitz", "pypdfium2", "PyPDF2",
+    "PIL.Image", "PIL.PngImagePlugin", "PIL.JpegImagePlugin",
+]
+
+
+class OperationAborted(Exception):
+    """Opération interrompue avant son terme"""
+    status_code = 500
+    error_code = "operation_aborted"
+
+
+class OperationTimeout(OperationAborted):
+    """Durée permise dépassée"""
+    status_code = 504
+    error_code = "operation_timeout"
+
+
+class OperationMemoryExceeded(OperationAborted):
+    """Mémoire permise dépassée"""
+    status_code = 413
+    error_code = "operation_memory_exceeded"
+
+
+class OperationCancelled(OperationAborted):
+    """Opération annulée (client déconnecté, travail repris ailleurs...)"""
+    status_code = 499
+    error_code = "operation_cancelled"
+
+
+class CancelToken:
+    """
+    Annulation coopérative d'une opération : échéance (horloge murale, valable
+    d'un processus à l'autre), limite de mémoire et annulation explicite.
+    """
+    __slots__ = ("deadline", "memory_limit_mb", "reason", "_event")
+
+    def __init__(self, timeout: Optional[float] = None, memory_limit_mb: int = 0, deadline: Optional[float] = None):
+        self.deadline = deadline if deadline is not None else (time.time() + timeout if timeout else None)
+        self.memory_limit_mb = memory_limit_mb
+        self.reason = ""
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = "Opération annulée") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def derive(self) -> "CancelToken":
+        """Jeton de mêmes limites, annulable séparément"""
+        return CancelToken(memory_limit_mb=self.memory_limit_mb, deadline=self.deadline)
+
+    def check(self, grace: float = 0.0) -> None:
+        """Lève OperationCancelled ou OperationTimeout si l'opération doit s'arrêter"""
+        if self._event.is_set():
+            raise OperationCancelled(self.reason)
+        if self.deadline is not None and time.time() >= self.deadline + grace:
+            raise OperationTimeout("Durée de traitement maximale dépassée")
+
+
+_current_token: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+def _limit(limits: Dict[str, Any], operation: str, default: float) -> float:
+    for suffix, value in limits.items():
+        if operation.endswith(suffix):
+            return value
+    return default
+
+
+def operation_token(operation: str) -> CancelToken:
+    """Jeton portant les limites configurées pour une opération (suffixe de route)"""
+    return CancelToken(
+        timeout=_limit(settings.OPERATION_TIMEOUTS, operation, settings.OPERATION_TIMEOUT_SECONDS),
+        memory_limit_mb=int(_limit(settings.OPERATION_MEMORY_LIMITS_MB, operation, settings.OPERATION_MEMORY_LIMIT_MB)),
+    )
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+@contextmanager
+def cancellation_scope(token: Optional[CancelToken]):
+    """Rend le jeton courant pour le bloc (check_cancelled, supervise)"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def check_cancelled() -> None:
+    """
+    Point d'arrêt des boucles de pages : lève OperationAborted si l'opération
+    courante est annulée ou a dépassé sa durée. Hors opération, ne fait rien.
+    """
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+
+# --- Processus supervisés --------------------------------------------------
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def _process_context():
+    """
+    Processus lancés par un serveur de processus (forkserver) qui a déjà
+    importé les bibliothèques : démarrage rapide, sans copier l'état du serveur
+    multi-thread. "spawn" là où forkserver n'existe pas (Windows).
+    """
+    global _context
+    with _context_lock:
+        if _context is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                _context = multiprocessing.get_context("forkserver")
+                _context.set_forkserver_preload(SUPERVISED_PRELOAD)
+            else:
+                _context = multiprocessing.get_context("spawn")
+        return _context
+
+
+def _run_child(connection, fn: Callable[..., Any], args: tuple, kwargs: dict, options: Dict[str, Any]) -> None:
+    """
+    Point d'entrée du processus supervisé. options : échéance et limite de
+    mémoire de l'opération, trace et intervalle de profilage de la requête
+    """
+    # Interrompu par le parent uniquement (pas par le Ctrl+C du terminal)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    memory_limit_mb = options["memory_limit_mb"]
+    if memory_limit_mb and resource is not None:
+        limit = memory_limit_mb * MB
+        try:
+            # Mémoire allouée (tas, mmap privés), et non espace d'adressage : PDFium
+            # réserve d'emblée un large espace d'adressage qu'il n'utilise pas
+            resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+        except (ValueError, OSError) as e:
+            logger.warning(f"Limite de mémoire non appliquée: {str(e)}")
+
+    # Spans et piles du traitement, rattachés par le parent à la trace et au
+    # profil de la requête
+    trace = start_trace("supervised") if options["trace"] else None
+    profiler = SamplingProfiler(interval=options["profile_interval"]) if options["profile_interval"] else None
+    observations: list = []
+    try:
+        if profiler is not None:
+            profiler.start()
+        # Même échéance que le parent : les boucles de pages s'arrêtent d'elles-mêmes
+        with capture_metrics() as observations, cancellation_scope(CancelToken(deadline=options["deadline"])):
+            outcome = ("ok", fn(*args, **kwargs))
+    except MemoryError:
+        outcome = ("memory", None)
+    except BaseException as e:
+        outcome = ("error", e)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    telemetry = {
+        "metrics": observations,
+        "trace": trace.export() if trace is not None else None,
+        "profile": (dict(profiler.stacks), profiler.samples) if profiler is not None else None,
+    }
+    try:
+        connection.send(outcome + (telemetry,))
+    except Exception as e:
+        connection.send(("error", RuntimeError(f"Résultat non transmissible: {str(e)}"), telemetry))
+    connection.close()
+
+
+def _replay_telemetry(telemetry: Dict[str, Any], fn: Callable[..., Any]) -> None:
+    """Mesures, spans et piles du processus supervisé ajoutés à ceux de la requête"""
+    replay_metrics(telemetry["metrics"])
+    trace = get_current_trace()
+    if trace is not None and telemetry["trace"] is not None:
+        trace.merge(telemetry["trace"], get_current_span())
+    profiler = current_profiler()
+    if profiler is not None and telemetry["profile"] is not None:
+        stacks, samples = telemetry["profile"]
+        profiler.merge(stacks, samples, root=f"supervised:{getattr(fn, '__name__', '')}")
+
+
+def _supervise_process(fn: Callable[..., Any], args: tuple, kwargs: dict, token: CancelToken) -> Any:
+    context = _process_context()
+    receiver, sender = context.Pipe(duplex=False)
+    profiler = current_profiler()
+    options = {
+        "deadline": token.deadline,
+        "memory_limit_mb": token.memory_limit_mb,
+        "trace": get_current_trace() is not None,
+        "profile_interval": profiler.interval if profiler is not None else None,
+    }
+    process = context.Process(target=_run_child, args=(sender, fn, args, kwargs, options), daemon=True)
+    process.start()
+    sender.close()
+    outcome = None
+    killed = False
+    try:
+        while outcome is None:
+            # Annulation immédiate ; au-delà de l'échéance, le processus est tué
+            # s'il ne s'est pas arrêté de lui-même
+            token.check(grace=KILL_GRACE_SECONDS)
+            if receiver.poll(POLL_SECONDS):
+                try:
+                    outcome = receiver.recv()
+                except EOFError:
+                    # Canal fermé sans résultat : le processus est en train de se terminer
+                    process.join(KILL_GRACE_SECONDS)
+                    break
+            elif not process.is_alive() and not receiver.poll():
+                break
+    finally:
+        if process.is_alive() and outcome is None:
+            process.kill()
+            killed = True
+        process.join()
+        receiver.close()
+
+    if outcome is None:
+        if process.exitcode == -signal.SIGKILL and not killed:
+            # Tué par le système : le plus souvent faute de mémoire
+            raise OperationMemoryExceeded("Le traitement a été interrompu par le système (mémoire insuffisante)")
+        raise OperationAborted(f"Le traitement s'est interrompu (code {process.exitcode})")
+
+    status, value, telemetry = outcome
+    _replay_telemetry(telemetry, fn)
+    if status == "ok":
+        return value
+    if status == "memory":
+        raise OperationMemoryExceeded(f"Mémoire maximale dépassée ({token.memory_limit_mb} Mo)")
+    raise value
+
+
+def supervise(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Exécute fn(*args, **kwargs) dans les limites de l'opération courante (bloquant).
+
+    Avec OPERATION_ISOLATION, fn s'exécute dans un processus séparé dont la
+    mémoire est bornée et qui est tué à l'échéance ou à l'annulation : un
+    document malformé ne peut ni bloquer ni épuiser le serveur. fn et ses
+    arguments doivent alors être sérialisables (fonction de module, chemins),
+    et fn ne doit pas elle-même utiliser de pool de processus. Les mesures,
+    spans et piles de profilage du processus sont ajoutés à ceux de la requête.
+    Sans isolation, fn s'exécute sur place et s'arrête à son prochain
+    check_cancelled().
+    """
+    token = _current_token.get() or operation_token("")
+    token.check()
+    if not settings.OPERATION_ISOLATION:
+        profiler = current_profiler()
+        with cancellation_scope(token), (profiler.watch_thread() if profiler is not None else nullcontext()):
+            return fn(*args, **kwargs)
+    with span("supervised", function=getattr(fn, "__name__", "")):
+        return _supervise_process(fn, args, kwargs, token)
+
+
+def _kill_process_group(process: subprocess.Popen) -> None:
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+    process.communicate()
+
+
+def run_command(cmd: List[str], **kwargs: Any) -> subprocess.CompletedProcess:
+    """
+    subprocess.run(cmd, capture_output=True, text=True) dans les limites de
+    l'opération courante : la commande, et les processus qu'elle a lancés
+    (LibreOffice en démarre plusieurs), est tuée à l'échéance ou à l'annulation.
+    """
+    token = _current_token.get()
+    process = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, start_new_session=True, **kwargs
+    )
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                if token is not None:
+                    token.check()
+    except BaseException:
+        _kill_process_group(process)
+        raise
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+async def run_supervised(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """supervise() depuis une route, sans bloquer la boucle d'événements"""
+    return await run_in_threadpool(supervise, fn, *args, **kwargs)
+
+
+# --- Annulation à la déconnexion du client -----------------------------------
+
+class CancellationMiddleware:
+    """
+    Associe à chaque requête un jeton d'annulation portant les limites de son
+    opération, et l'annule dès que le client se déconnecte : le traitement en
+    cours s'arrête (processus supervisé tué, boucle de pages interrompue) au
+    lieu de consommer CPU et disque pour une réponse que personne ne lira.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = operation_token(scope["path"])
+        watcher = _DisconnectWatcher(receive, token)
+        with cancellation_scope(token):
+            try:
+                await self.app(scope, watcher.receive, send)
+            finally:
+                watcher.close()
+
+
+class _DisconnectWatcher:
+    """
+    Relaie le canal de réception. Une fois le corps de la requête entièrement
+    lu, seul un message de déconnexion peut encore arriver : il est alors
+    attendu en tâche de fond (et transmis à l'application si elle le demande).
+    """
+
+    def __init__(self, receive: Receive, token: CancelToken):
+        self._receive = receive
+        self.token = token
+        self._task: Optional[asyncio.Task] = None
+        self._disconnect: Optional[Message] = None
+        self._disconnected = asyncio.Event()
+
+    async def receive(self) -> Message:
+        if self._task is None:
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                self.token.cancel("Client déconnecté")
+            elif not message.get("more_body", False):
+                self._task = asyncio.ensure_future(self._watch())
+            return message
+        await self._disconnected.wait()
+        return self._disconnect
+
+    async def _watch(self) -> None:
+        message = await self._receive()
+        if message["type"] == "http.disconnect":
+            self.token.cancel("Client déconnecté")
+        self._disconnect = message
+        self._disconnected.set()
+
+    def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
@@ -0,0 +1,561 @@
+import heapq
+import itertools
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from .config import settings
+from .scratch import scratch_manager
+from .shared_state import MULTI_WORKER, SharedState, shared_state, worker_id
+
+logger = logging.getLogger(__name__)
+
+# Âge minimum avant qu'un élément puisse être évincé pour respecter le quota
+# (les dossiers d'opération en cours d'utilisation sont en outre protégés, voir active_scope)
+MIN_EVICTION_AGE_SECONDS = 60
+
+# Préfixe des baux signalant, en mode multi-worker, un dossier en cours d'utilisation
+ACTIVE_LEASE_PREFIX = "active:"
+
+# Dossiers d'opération créés dans le bloc active_scope courant
+_active_paths: ContextVar[Optional[List[str]]] = ContextVar("active_temp_paths", default=None)
+
+
+def _path_size(path: str) -> int:
+    """Taille d'un fichier ou taille cumulée d'un dossier"""
+    try:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+    except OSError:
+        return 0
+
+    total = 0
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def _delete_path(path: str) -> None:
+    """Supprime un fichier ou un dossier en ignorant les erreurs"""
+    scratch_manager.release(path)
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path):
+            os.remove(path)
+    except Exception:
+        pass  # Ignorer les erreurs
+
+
+class TempEntry:
+    """Artefact temporaire suivi par le gestionnaire"""
+    __slots__ = ("path", "created_at", "expires_at", "size")
+
+    def __init__(self, path: str, created_at: float, expires_at: float, size: int = 0):
+        self.path = path
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.size = size
+
+
+class TempFileManager:
+    """
+    Gestionnaire du cycle de vie des fichiers temporaires.
+
+    Chaque artefact (fichier ou dossier d'opération) est enregistré avec sa date
+    d'expiration dans un tas : le thread de nettoyage se réveille à la prochaine
+    expiration au lieu de parcourir tout TEMP_DIR. Un quota disque optionnel est
+    appliqué en évinçant les artefacts les plus anciens.
+
+    Un artefact épinglé (pin, active_scope) n'expire pas et n'est pas évincé
+    tant qu'il est utilisé : une opération plus longue que la rétention garde
+    son dossier. Son expiration est reportée puis appliquée une fois libéré.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        retention_seconds: float,
+        quota_bytes: int = 0,
+        sweep_interval: float = 30.0,
+        extra_roots: Optional[List[str]] = None,
+    ):
+        self.root = os.path.abspath(root)
+        self.roots = [self.root] + [os.path.abspath(r) for r in (extra_roots or []) if r]
+        self.retention_seconds = retention_seconds
+        self.quota_bytes = quota_bytes
+        self.sweep_interval = sweep_interval
+        self._entries: Dict[str, TempEntry] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._last_size_refresh = 0.0
+        self._pins: Dict[str, int] = {}
+
+    # --- Enregistrement -------------------------------------------------
+
+    def register(self, path: str, ttl: Optional[float] = None, created_at: Optional[float] = None) -> str:
+        """
+        Enregistre (ou ré-enregistre) un artefact avec sa durée de vie.
+        Un nouvel enregistrement remplace l'expiration et la taille précédentes.
+        """
+        path = os.path.abspath(str(path))
+        now = time.time()
+        created_at = created_at if created_at is not None else now
+        expires_at = created_at + (ttl if ttl is not None else self.retention_seconds)
+        size = _path_size(path)
+
+        with self._condition:
+            entry = self._entries.get(path)
+            if entry is None:
+                entry = TempEntry(path, created_at, expires_at, size)
+                self._entries[path] = entry
+            else:
+                entry.expires_at = expires_at
+                entry.size = size
+            heapq.heappush(self._heap, (expires_at, next(self._counter), path))
+            # Réveiller le thread si cette expiration est la plus proche
+            if self._heap[0][2] == path:
+                self._condition.notify()
+        return path
+
+    def refresh_size(self, path: str) -> None:
+        """Met à jour la taille suivie d'un artefact après écriture"""
+        path = os.path.abspath(str(path))
+        size = _path_size(path)
+        with self._condition:
+            entry = self._entries.get(path)
+            if entry is not None:
+                entry.size = size
+
+    def remove(self, path: str) -> None:
+        """Supprime immédiatement un artefact et cesse de le suivre"""
+        path = os.path.abspath(str(path))
+        with self._condition:
+            self._entries.pop(path, None)
+        self._drop_pin(path)
+        _delete_path(path)
+
+    # --- Artefacts en cours d'utilisation -------------------------------
+
+    def pin(self, path: str) -> str:
+        """Protège un artefact de l'expiration et de l'éviction jusqu'à unpin() ou remove()"""
+        path = os.path.abspath(str(path))
+        with self._condition:
+            count = self._pins.get(path, 0)
+            self._pins[path] = count + 1
+        if count == 0:
+            self._activate(path)
+        return path
+
+    def unpin(self, path: str) -> None:
+        path = os.path.abspath(str(path))
+        with self._condition:
+            count = self._pins.get(path, 0)
+            if count > 1:
+                self._pins[path] = count - 1
+                return
+            if count == 0:
+                return
+            del self._pins[path]
+        self._deactivate(path)
+
+    def _drop_pin(self, path: str) -> None:
+        with self._condition:
+            pinned = self._pins.pop(path, None) is not None
+        if pinned:
+            self._deactivate(path)
+
+    def _activate(self, path: str) -> None:
+        """Premier épinglage d'un artefact (rien à partager avec un seul processus)"""
+
+    def _deactivate(self, path: str) -> None:
+        """Fin de l'épinglage d'un artefact"""
+
+    @contextmanager
+    def active_scope(self, *paths: str):
+        """
+        Épingle les dossiers d'opération créés dans le bloc (create_operation_dir),
+        ainsi que `paths`, jusqu'à la fin du bloc : requête, travail, calcul partagé.
+        """
+        pinned = [self.pin(path) for path in paths]
+        reset = _active_paths.set(pinned)
+        try:
+            yield
+        finally:
+            _active_paths.reset(reset)
+            for path in pinned:
+                self.unpin(path)
+
+    def rebuild(self) -> int:
+        """
+        Reconstruit l'index à partir du contenu de TEMP_DIR et de l'espace
+        de travail en mémoire (au démarrage).
+        L'expiration est calculée à partir de la date de modification.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        count = 0
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    try:
+                        mtime = entry.stat(follow_symlinks=False).st_mtime
+                    except OSError:
+                        continue
+                    self.register(entry.path, created_at=mtime)
+                    count += 1
+        return count
+
+    # --- Nettoyage ------------------------------------------------------
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Supprime les artefacts expirés et renvoie leur nombre"""
+        now = now if now is not None else time.time()
+        expired = []
+        postponed = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, _, path = heapq.heappop(self._heap)
+                entry = self._entries.get(path)
+                # Entrée obsolète (ré-enregistrée ou déjà supprimée)
+                if entry is None or entry.expires_at != expires_at:
+                    continue
+                if path in self._pins:
+                    # Encore utilisé : réexaminé à la passe suivante
+                    postponed.append(entry)
+                    continue
+                del self._entries[path]
+                expired.append(path)
+            for entry in postponed:
+                entry.expires_at = now + self.sweep_interval
+                heapq.heappush(self._heap, (entry.expires_at, next(self._counter), entry.path))
+
+        for path in expired:
+            _delete_path(path)
+        return len(expired)
+
+    def enforce_quota(self, now: Optional[float] = None) -> int:
+        """Évince les artefacts les plus anciens tant que le quota est dépassé"""
+        if self.quota_bytes <= 0:
+            return 0
+        now = now if now is not None else time.time()
+
+        evicted = []
+        with self._condition:
+            total = sum(entry.size for entry in self._entries.values())
+            if total <= self.quota_bytes:
+                return 0
+            for entry in sorted(self._entries.values(), key=lambda e: e.created_at):
+                if total <= self.quota_bytes:
+                    break
+                if now - entry.created_at < MIN_EVICTION_AGE_SECONDS:
+                    break
+                if entry.path in self._pins:
+                    continue
+                del self._entries[entry.path]
+                total -= entry.size
+                evicted.append(entry.path)
+
+        for path in evicted:
+            _delete_path(path)
+        if evicted:
+            logger.warning(f"Quota du dossier temporaire dépassé: {len(evicted)} éléments évincés")
+        return len(evicted)
+
+    def _refresh_all_sizes(self) -> None:
+        with self._condition:
+            paths = list(self._entries)
+        sizes = {path: _path_size(path) for path in paths}
+        with self._condition:
+            for path, size in sizes.items():
+                entry = self._entries.get(path)
+                if entry is not None:
+                    entry.size = size
+
+    def usage(self) -> Dict[str, int]:
+        """Nombre d'artefacts suivis et taille totale connue"""
+        with self._condition:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(entry.size for entry in self._entries.values()),
+            }
+
+    # --- Thread d'arrière-plan -----------------------------------------
+
+    def _next_wakeup(self) -> float:
+        if not self._heap:
+            return self.sweep_interval
+        delay = self._heap[0][0] - time.time()
+        return max(0.0, min(delay, self.sweep_interval))
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if self._stopping:
+                    return
+                self._condition.wait(self._next_wakeup())
+                if self._stopping:
+                    return
+            try:
+                self.sweep()
+                scratch_manager.refresh()
+                if self.quota_bytes > 0 and time.time() - self._last_size_refresh >= self.sweep_interval:
+                    self._refresh_all_sizes()
+                    self._last_size_refresh = time.time()
+                    self.enforce_quota()
+            except Exception as e:
+                logger.error(f"Erreur lors du nettoyage des fichiers temporaires: {str(e)}")
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="temp-file-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# Condition SQL : aucun worker ne détient de bail "active:" valide sur l'artefact
+_NOT_ACTIVE = (
+    f"'{ACTIVE_LEASE_PREFIX}' || path NOT IN "
+    f"(SELECT name FROM leases WHERE name LIKE '{ACTIVE_LEASE_PREFIX}%' AND expires_at > ?)"
+)
+
+
+class SharedTempFileManager(TempFileManager):
+    """
+    Variante multi-worker du gestionnaire.
+
+    L'index des artefacts est partagé par tous les workers du nœud (table
+    temp_entries de l'état partagé) : un artefact enregistré par un worker
+    peut être prolongé ou supprimé par un autre. Le nettoyage n'est effectué
+    que par le worker détenant le bail "cleanup" ; si ce worker disparaît,
+    un autre reprend le bail à son expiration. À chaque passe, chaque worker
+    signale aussi qu'il est vivant (reprise des tâches partagées orphelines).
+    """
+
+    LEASE_NAME = "cleanup"
+
+    def __init__(self, state: SharedState, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.state = state
+        self._leader = False
+
+    # --- Enregistrement -------------------------------------------------
+
+    def register(self, path: str, ttl: Optional[float] = None, created_at: Optional[float] = None) -> str:
+        path = os.path.abspath(str(path))
+        created_at = created_at if created_at is not None else time.time()
+        expires_at = created_at + (ttl if ttl is not None else self.retention_seconds)
+        self.state.execute(
+            "INSERT INTO temp_entries (path, created_at, expires_at, size) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET expires_at = excluded.expires_at, size = excluded.size",
+            (path, created_at, expires_at, _path_size(path)),
+        )
+        return path
+
+    def refresh_size(self, path: str) -> None:
+        path = os.path.abspath(str(path))
+        self.state.execute("UPDATE temp_entries SET size = ? WHERE path = ?", (_path_size(path), path))
+
+    def remove(self, path: str) -> None:
+        path = os.path.abspath(str(path))
+        self.state.execute("DELETE FROM temp_entries WHERE path = ?", (path,))
+        self._drop_pin(path)
+        _delete_path(path)
+
+    # --- Artefacts en cours d'utilisation -------------------------------
+    # Un bail par artefact épinglé, renouvelé à chaque passe par son worker :
+    # le worker chargé du nettoyage voit ceux de tous les workers, et le bail
+    # d'un worker disparu expire de lui-même
+
+    def _activate(self, path: str) -> None:
+        self.state.acquire_lease(ACTIVE_LEASE_PREFIX + path, worker_id(), settings.WORKER_LEASE_SECONDS)
+
+    def _deactivate(self, path: str) -> None:
+        self.state.release_lease(ACTIVE_LEASE_PREFIX + path, worker_id())
+
+    def _renew_pins(self) -> None:
+        with self._condition:
+            paths = list(self._pins)
+        for path in paths:
+            self._activate(path)
+
+    def rebuild(self) -> int:
+        """Ajoute à l'index partagé les artefacts qu'il ne connaît pas encore"""
+        os.makedirs(self.root, exist_ok=True)
+        rows = []
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    try:
+                        mtime = entry.stat(follow_symlinks=False).st_mtime
+                    except OSError:
+                        continue
+                    rows.append((entry.path, mtime, mtime + self.retention_seconds, _path_size(entry.path)))
+        with self.state.transaction() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO temp_entries (path, created_at, expires_at, size) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    # --- Nettoyage ------------------------------------------------------
+
+    def _acquire_leadership(self) -> bool:
+        leader = self.state.acquire_lease(self.LEASE_NAME, worker_id(), settings.WORKER_LEASE_SECONDS)
+        if leader != self._leader:
+            role = "désormais" if leader else "n'est plus"
+            logger.info(f"Worker {worker_id()} {role} responsable du nettoyage")
+        self._leader = leader
+        return leader
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Signale que le worker est vivant et renouvelle ses épinglages ; si le bail
+        est obtenu, supprime les artefacts expirés qu'aucun worker n'utilise
+        """
+        self.state.heartbeat()
+        self._renew_pins()
+        if not self._acquire_leadership():
+            return 0
+
+        now = now if now is not None else time.time()
+        self.state.prune(now)
+        self.state.recover_orphans()
+        with self.state.transaction() as connection:
+            expired = [row[0] for row in connection.execute(
+                f"SELECT path FROM temp_entries WHERE expires_at <= ? AND {_NOT_ACTIVE}", (now, now)
+            )]
+            connection.executemany("DELETE FROM temp_entries WHERE path = ?", [(path,) for path in expired])
+            # Artefacts encore utilisés : réexaminés à la passe suivante
+            connection.execute(
+                "UPDATE temp_entries SET expires_at = ? WHERE expires_at <= ?", (now + self.sweep_interval, now)
+            )
+            # Baux laissés par un worker disparu
+            connection.execute(
+                "DELETE FROM leases WHERE name LIKE ? AND expires_at <= ?", (ACTIVE_LEASE_PREFIX + "%", now)
+            )
+        for path in expired:
+            _delete_path(path)
+        return len(expired)
+
+    def enforce_quota(self, now: Optional[float] = None) -> int:
+        if self.quota_bytes <= 0 or not self._leader:
+            return 0
+        now = now if now is not None else time.time()
+
+        evicted = []
+        with self.state.transaction() as connection:
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM temp_entries").fetchone()[0]
+            if total <= self.quota_bytes:
+                return 0
+            for path, created_at, size in connection.execute(
+                f"SELECT path, created_at, size FROM temp_entries WHERE {_NOT_ACTIVE} ORDER BY created_at", (now,)
+            ).fetchall():
+                if total <= self.quota_bytes or now - created_at < MIN_EVICTION_AGE_SECONDS:
+                    break
+                total -= size
+                evicted.append(path)
+            connection.executemany("DELETE FROM temp_entries WHERE path = ?", [(p,) for p in evicted])
+
+        for path in evicted:
+            _delete_path(path)
+        if evicted:
+            logger.warning(f"Quota du dossier temporaire dépassé: {len(evicted)} éléments évincés")
+        return len(evicted)
+
+    def _refresh_all_sizes(self) -> None:
+        if not self._leader:
+            return
+        paths = [row[0] for row in self.state.execute("SELECT path FROM temp_entries")]
+        sizes = [(_path_size(path), path) for path in paths]
+        with self.state.transaction() as connection:
+            connection.executemany("UPDATE temp_entries SET size = ? WHERE path = ?", sizes)
+
+    def usage(self) -> Dict[str, int]:
+        count, total = self.state.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM temp_entries"
+        ).fetchone()
+        return {"entries": count, "bytes": total}
+
+    def _next_wakeup(self) -> float:
+        if not self._leader:
+            return self.sweep_interval
+        row = self.state.execute("SELECT MIN(expires_at) FROM temp_entries").fetchone()
+        if row[0] is None:
+            return self.sweep_interval
+        return max(0.0, min(row[0] - time.time(), self.sweep_interval))
+
+    def start(self) -> None:
+        # Signe de vie immédiat : les autres workers ne doivent pas prendre ce
+        # worker pour mort avant sa première passe de nettoyage
+        self.state.heartbeat()
+        super().start()
+
+    def stop(self) -> None:
+        super().stop()
+        # Laisser un autre worker reprendre le nettoyage sans attendre l'expiration du bail
+        if self._leader:
+            self.state.release_lease(self.LEASE_NAME, worker_id())
+            self._leader = False
+
+
+_manager_options = dict(
+    quota_bytes=settings.TEMP_DIR_QUOTA_MB * 1024 * 1024,
+    sweep_interval=settings.TEMP_SWEEP_INTERVAL_SECONDS,
+    extra_roots=[scratch_manager.memory_root, settings.STORE_DIR],
+)
+
+if MULTI_WORKER:
+    temp_manager = SharedTempFileManager(
+        shared_state, settings.TEMP_DIR, settings.FILE_RETENTION_SECONDS, **_manager_options
+    )
+else:
+    temp_manager = TempFileManager(settings.TEMP_DIR, settings.FILE_RETENTION_SECONDS, **_manager_options)
+
+
+def create_operation_dir(operation_id: Optional[str] = None, expected_size: Optional[int] = None) -> str:
+    """
+    Crée le dossier temporaire d'une opération (en mémoire ou sur disque
+    selon sa taille estimée, par défaut celle de la requête) et l'enregistre
+    auprès du gestionnaire pour qu'il soit supprimé à expiration. Dans un bloc
+    active_scope, il reste épinglé jusqu'à la fin du bloc.
+    """
+    temp_dir = scratch_manager.allocate(operation_id, expected_size)
+    temp_manager.register(temp_dir)
+    pinned = _active_paths.get()
+    if pinned is not None:
+        pinned.append(temp_manager.pin(temp_dir))
+    return temp_dir
@@ -0,0 +1,184 @@
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximum de spans conservés individuellement par trace
+# (au-delà, seules les durées agrégées par nom sont conservées)
+MAX_SPANS_PER_TRACE = 500
+
+
+class Span:
+    """Intervalle de temps nommé au sein d'une trace"""
+    __slots__ = ("name", "parent", "start", "end", "attributes")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+
+    @property
+    def duration(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    @property
+    def path(self) -> str:
+        names = []
+        node: Optional[Span] = self
+        while node is not None:
+            names.append(node.name)
+            node = node.parent
+        return "/".join(reversed(names))
+
+
+class Trace:
+    """Ensemble des spans d'une requête, agrégés par nom"""
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self.dropped_spans = 0
+        # nom -> [durée totale, nombre d'occurrences]
+        self.totals: Dict[str, List[float]] = {}
+
+    def record(self, span: Span) -> None:
+        total = self.totals.setdefault(span.name, [0.0, 0])
+        total[0] += span.duration
+        total[1] += 1
+        if len(self.spans) < MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+        else:
+            self.dropped_spans += 1
+
+    def add(self, name: str, duration: float) -> None:
+        """Enregistre une durée mesurée hors d'un bloc span()"""
+        total = self.totals.setdefault(name, [0.0, 0])
+        total[0] += duration
+        total[1] += 1
+
+    def export(self) -> Dict[str, Any]:
+        """Spans et durées de la trace sous forme sérialisable (trace d'un processus supervisé)"""
+        index = {id(span): i for i, span in enumerate(self.spans)}
+        return {
+            "elapsed": time.perf_counter() - self.start,
+            "spans": [
+                (span.name, index.get(id(span.parent)), span.start - self.start, span.duration, span.attributes)
+                for span in self.spans
+            ],
+            "totals": self.totals,
+            "dropped_spans": self.dropped_spans,
+        }
+
+    def merge(self, exported: Dict[str, Any], parent: Optional[Span] = None) -> None:
+        """
+        Intègre une trace exportée qui vient de se terminer : ses spans sont
+        rattachés à parent et placés sur l'horloge de cette trace.
+        """
+        start = time.perf_counter() - exported["elapsed"]
+        spans = []
+        for name, _, offset, duration, attributes in exported["spans"]:
+            merged = Span(name, parent, attributes)
+            merged.start = start + offset
+            merged.end = merged.start + duration
+            spans.append(merged)
+        for merged, (_, parent_index, _, _, _) in zip(spans, exported["spans"]):
+            if parent_index is not None:
+                merged.parent = spans[parent_index]
+        for merged in spans:
+            if len(self.spans) < MAX_SPANS_PER_TRACE:
+                self.spans.append(merged)
+            else:
+                self.dropped_spans += 1
+        self.dropped_spans += exported["dropped_spans"]
+        for name, (duration, count) in exported["totals"].items():
+            total = self.totals.setdefault(name, [0.0, 0])
+            total[0] += duration
+            total[1] += count
+
+    def server_timing(self) -> str:
+        """Formate les durées agrégées pour l'en-tête Server-Timing"""
+        entries = []
+        for name, (duration, count) in self.totals.items():
+            entry = f"{name};dur={duration * 1000:.1f}"
+            if count > 1:
+                entry += f';desc="x{count}"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+    def to_dict(self, **extra: Any) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "stages": {
+                name: {"duration_ms": round(duration * 1000, 3), "count": count}
+                for name, (duration, count) in self.totals.items()
+            },
+            "spans": [
+                {
+                    "name": span.path,
+                    "offset_ms": round((span.start - self.start) * 1000, 3),
+                    "duration_ms": round(span.duration * 1000, 3),
+                    **({"attributes": span.attributes} if span.attributes else {}),
+                }
+                for span in self.spans
+            ],
+            "dropped_spans": self.dropped_spans,
+            **extra,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def start_trace(name: str, trace_id: Optional[str] = None) -> Trace:
+    """Démarre une trace pour le contexte courant (une requête)"""
+    trace = Trace(name, trace_id)
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+
+def get_current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def get_current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Mesure un bloc de code comme un span enfant du span courant.
+    Sans trace active (appel hors requête), ne fait rien.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        trace.record(current)
+
+
+def log_trace(trace: Trace, **extra: Any) -> None:
+    """Émet la trace sous forme de log structuré (une ligne JSON)"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(trace.to_dict(**extra), default=str))
@@ -0,0 +1,291 @@
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional
+
+from .admission import store_admission_controller
+from .config import settings
+from .document_store import document_store
+from .temp_manager import temp_manager
+
+# Fichiers d'un envoi dans son dossier
+META_FILENAME = "upload.json"
+DATA_FILENAME = "data.part"
+CHUNKS_DIRNAME = "chunks"
+FINALIZING_FILENAME = "data.finalizing"
+
+# Préfixe des dossiers d'envoi dans STORE_DIR (chacun suivi et expiré séparément)
+UPLOAD_DIR_PREFIX = "upload-"
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+MB = 1024 * 1024
+
+
+class UploadIncomplete(ValueError):
+    """Finalisation demandée alors que des morceaux manquent (ou sont corrompus)"""
+
+
+class UploadBusy(ValueError):
+    """L'envoi est déjà en cours de finalisation"""
+
+
+def _allocate(path: str, size: int) -> None:
+    """Crée le fichier de données à sa taille finale, l'espace étant réellement alloué"""
+    with open(path, "wb") as f:
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                    raise
+        # Allocation non prise en charge (macOS, certains systèmes de fichiers) :
+        # fichier creux, alloué au fil des morceaux
+        f.truncate(size)
+
+
+class ChunkedUploadStore:
+    """
+    Envois par morceaux des fichiers volumineux, reprenables.
+
+    Un envoi est rangé dans STORE_DIR/upload-<id>/ : description (nom,
+    taille, taille des morceaux), fichier de données à sa taille finale dans
+    lequel chaque morceau est écrit directement à sa position, et un témoin
+    par morceau reçu contenant son empreinte SHA-256. L'état ne vit que dans
+    ces fichiers : les morceaux d'un même envoi peuvent être reçus en
+    parallèle, par des workers ou des nœuds différents (volume partagé).
+
+    À la finalisation, le fichier est relu une seule fois : l'empreinte de
+    chaque morceau est revérifiée (un morceau corrompu est simplement à
+    renvoyer), celle du fichier entier calculée et comparée à celle annoncée,
+    puis le fichier est déplacé sans copie dans le stockage des documents.
+    Un envoi sans activité expire après retention_seconds.
+    """
+
+    def __init__(self, root: str, retention_seconds: float):
+        self.root = os.path.abspath(root)
+        self.retention_seconds = retention_seconds
+
+    def _upload_dir(self, upload_id: str) -> str:
+        if not _UPLOAD_ID.match(upload_id or ""):
+            raise ValueError("Identifiant d'envoi invalide")
+        return os.path.join(self.root, UPLOAD_DIR_PREFIX + upload_id)
+
+    def _touch(self, upload_dir: str) -> None:
+        """Prolonge la durée de vie d'un envoi actif"""
+        os.utime(upload_dir)
+        temp_manager.register(upload_dir, ttl=self.retention_seconds)
+
+    def _meta(self, upload_dir: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(upload_dir, META_FILENAME), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def create(
+        self,
+        filename: str,
+        size: int,
+        chunk_size: Optional[int] = None,
+        sha256: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Ouvre un envoi ; l'espace du fichier est réservé puis alloué sur le disque"""
+        chunk_size = chunk_size or settings.CHUNKED_UPLOAD_CHUNK_SIZE_MB * MB
+        if size <= 0:
+            raise ValueError("La taille du fichier doit être positive")
+        if size > settings.CHUNKED_UPLOAD_MAX_SIZE_MB * MB:
+            raise ValueError(f"Fichier trop volumineux (maximum {settings.CHUNKED_UPLOAD_MAX_SIZE_MB} Mo)")
+        if not MB <= chunk_size <= settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE_MB * MB:
+            raise ValueError(
+                f"La taille des morceaux doit être comprise entre 1 et {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE_MB} Mo"
+            )
+        if sha256 is not None:
+            sha256 = sha256.lower()
+            if not _SHA256.match(sha256):
+                raise ValueError("Empreinte SHA-256 invalide")
+
+        os.makedirs(self.root, exist_ok=True)
+        reservation = store_admission_controller.try_reserve("/uploads", size)
+        if reservation is None:
+            raise OSError("Espace disque insuffisant pour recevoir ce fichier")
+        try:
+            upload_id = uuid.uuid4().hex
+            upload_dir = self._upload_dir(upload_id)
+            os.makedirs(os.path.join(upload_dir, CHUNKS_DIRNAME))
+            # Les morceaux sont écrits à leur position, dans n'importe quel ordre
+            try:
+                _allocate(os.path.join(upload_dir, DATA_FILENAME), size)
+            except OSError as e:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+                if e.errno == errno.ENOSPC:
+                    raise OSError("Espace disque insuffisant pour recevoir ce fichier")
+                raise
+        finally:
+            store_admission_controller.release(reservation)
+
+        meta = {
+            "filename": os.path.basename(filename),
+            "size": size,
+            "chunk_size": chunk_size,
+            "sha256": sha256,
+        }
+        with open(os.path.join(upload_dir, META_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        self._touch(upload_dir)
+        return self._status(upload_id, meta, [])
+
+    def _received(self, upload_dir: str) -> List[int]:
+        try:
+            return sorted(int(name) for name in os.listdir(os.path.join(upload_dir, CHUNKS_DIRNAME)) if name.isdigit())
+        except OSError:
+            return []
+
+    def _status(self, upload_id: str, meta: Dict[str, Any], received: List[int]) -> Dict[str, Any]:
+        size, chunk_size = meta["size"], meta["chunk_size"]
+        chunk_count = -(-size // chunk_size)
+        received_set = set(received)
+        received_bytes = sum(min(chunk_size, size - index * chunk_size) for index in received)
+        return {
+            "upload_id": upload_id,
+            "filename": meta["filename"],
+            "size": size,
+            "chunk_size": chunk_size,
+            "chunks": chunk_count,
+            "received_bytes": received_bytes,
+            "missing_offsets": [index * chunk_size for index in range(chunk_count) if index not in received_set],
+            "upload_url": f"{settings.API_V1_STR}/uploads/{upload_id}",
+        }
+
+    def status(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """État d'un envoi (morceaux manquants), ou None s'il n'existe pas (ou plus)"""
+        upload_dir = self._upload_dir(upload_id)
+        meta = self._meta(upload_dir)
+        if meta is None:
+            return None
+        return self._status(upload_id, meta, self._received(upload_dir))
+
+    def expected_length(self, upload_id: str, offset: int) -> Optional[int]:
+        """Taille attendue du morceau commençant à offset (None si l'envoi n'existe pas)"""
+        meta = self._meta(self._upload_dir(upload_id))
+        if meta is None:
+            return None
+        size, chunk_size = meta["size"], meta["chunk_size"]
+        if offset < 0 or offset >= size or offset % chunk_size:
+            raise ValueError(f"Position invalide : multiple de {chunk_size} inférieur à {size} attendu")
+        return min(chunk_size, size - offset)
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Écrit un morceau à sa position. L'empreinte annoncée par le client est
+        vérifiée avant l'écriture ; renvoyer un morceau déjà reçu le remplace.
+        """
+        upload_dir = self._upload_dir(upload_id)
+        meta = self._meta(upload_dir)
+        if meta is None:
+            raise FileNotFoundError("Envoi introuvable ou expiré")
+        expected = self.expected_length(upload_id, offset)
+        if len(data) != expected:
+            raise ValueError(f"Taille du morceau invalide : {expected} octets attendus, {len(data)} reçus")
+        digest = hashlib.sha256(data).hexdigest()
+        if sha256 is not None and sha256.lower() != digest:
+            raise ValueError("Empreinte du morceau invalide : morceau altéré pendant le transfert")
+
+        try:
+            fd = os.open(os.path.join(upload_dir, DATA_FILENAME), os.O_WRONLY)
+        except FileNotFoundError:
+            raise UploadBusy("L'envoi est en cours de finalisation")
+        try:
+            view = memoryview(data)
+            written = 0
+            while written < len(view):
+                written += os.pwrite(fd, view[written:], offset + written)
+        finally:
+            os.close(fd)
+
+        # Le témoin n'apparaît qu'une fois le morceau écrit (écriture atomique)
+        marker = os.path.join(upload_dir, CHUNKS_DIRNAME, str(offset // meta["chunk_size"]))
+        with open(marker + ".tmp", "w", encoding="ascii") as f:
+            f.write(digest)
+        os.replace(marker + ".tmp", marker)
+        self._touch(upload_dir)
+        return self._status(upload_id, meta, self._received(upload_dir))
+
+    def complete(self, upload_id: str) -> Dict[str, Any]:
+        """
+        Vérifie et range le fichier reçu dans le stockage des documents.
+        Renvoie l'identifiant du document (SHA-256 du contenu).
+        """
+        upload_dir = self._upload_dir(upload_id)
+        meta = self._meta(upload_dir)
+        if meta is None:
+            raise FileNotFoundError("Envoi introuvable ou expiré")
+        status = self._status(upload_id, meta, self._received(upload_dir))
+        if status["missing_offsets"]:
+            raise UploadIncomplete(f"{len(status['missing_offsets'])} morceau(x) manquant(s)")
+
+        # Une seule finalisation à la fois, quel que soit le worker
+        data_path = os.path.join(upload_dir, DATA_FILENAME)
+        finalizing = os.path.join(upload_dir, FINALIZING_FILENAME)
+        try:
+            os.rename(data_path, finalizing)
+        except FileNotFoundError:
+            raise UploadBusy("L'envoi est déjà en cours de finalisation")
+
+        chunk_size = meta["chunk_size"]
+        corrupted = []
+        document_digest = hashlib.sha256()
+        try:
+            with open(finalizing, "rb") as f:
+                for index, chunk in enumerate(iter(lambda: f.read(chunk_size), b"")):
+                    document_digest.update(chunk)
+                    marker = os.path.join(upload_dir, CHUNKS_DIRNAME, str(index))
+                    with open(marker, encoding="ascii") as m:
+                        if m.read() != hashlib.sha256(chunk).hexdigest():
+                            corrupted.append(index)
+        except Exception:
+            # Relecture impossible : l'envoi redevient finalisable
+            os.rename(finalizing, data_path)
+            raise
+        document_id = document_digest.hexdigest()
+
+        if corrupted:
+            # Les morceaux fautifs sont à renvoyer, les autres sont conservés
+            for index in corrupted:
+                os.remove(os.path.join(upload_dir, CHUNKS_DIRNAME, str(index)))
+            os.rename(finalizing, data_path)
+            raise UploadIncomplete(f"{len(corrupted)} morceau(x) corrompu(s), à renvoyer")
+        if meta["sha256"] is not None and meta["sha256"] != document_id:
+            temp_manager.remove(upload_dir)
+            raise ValueError("L'empreinte du fichier reçu ne correspond pas à celle annoncée")
+
+        try:
+            document_store.put(finalizing, document_id=document_id)
+        except Exception:
+            # Stockage impossible (disque plein...) : l'envoi redevient finalisable
+            # au lieu de rester indéfiniment « en cours de finalisation »
+            if os.path.exists(finalizing):
+                os.rename(finalizing, data_path)
+            else:
+                # Fichier déjà remis au stockage des documents : l'envoi n'a plus de données
+                temp_manager.remove(upload_dir)
+            raise
+        temp_manager.remove(upload_dir)
+        return {"document_id": document_id, "filename": meta["filename"], "size": meta["size"]}
+
+    def abort(self, upload_id: str) -> bool:
+        """Abandonne un envoi et libère son espace"""
+        upload_dir = self._upload_dir(upload_id)
+        if not os.path.isdir(upload_dir):
+            return False
+        temp_manager.remove(upload_dir)
+        return True
+
+
+upload_store = ChunkedUploadStore(settings.STORE_DIR, settings.FILE_RETENTION_SECONDS)
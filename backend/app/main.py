@@ -1,46 +1,263 @@
+import time
+
+# Début de l'import de l'application (rapport de démarrage)
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import json
+import logging
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import time
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import asyncio
+import threading
 from pathlib import Path
+from typing import Optional
 
 from .api.v1.api_router import api_router
 from .core.config import settings
-from .core.security import cleanup_old_files
-
-# Créer l'application FastAPI
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+from .core.temp_manager import temp_manager
+from .core.admission import admission_controller, AdmissionRejected
+from .core.supervisor import CancellationMiddleware, OperationAborted
+from .core.scratch import scratch_manager
+from .core.compression import CompressionMiddleware
+from .core.metrics import (
+    current_operation,
+    render_metrics,
+    REQUESTS_TOTAL,
+    REQUEST_DURATION,
+    REQUESTS_IN_PROGRESS,
+    STAGE_DURATION,
+    BYTES_IN,
+    BYTES_OUT,
 )
+from .core.tracing import start_trace, log_trace
+from .core.profiling import SamplingProfiler, profiling_scope
+from .core.process_pool import shutdown_process_pools
+from .core.lazy_imports import lazy_import_report, operation_modules, preload
+from .services.jobs import job_worker
+from .services.render_utils import render_backend_report, select_render_backend
 
-# Configuration CORS pour permettre les requêtes du frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://localhost:3001", "http://localhost:3002"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+logger = logging.getLogger(__name__)
+
+# Temps d'import des modules de l'application (hors bibliothèques différées)
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
-# Inclure les routes de l'API
-app.include_router(api_router, prefix=settings.API_V1_STR)
+# Rapport de démarrage exposé sur /startup
+startup_report = {
+    "workers": settings.WORKERS,
+    "job_workers": settings.JOB_WORKER_CONCURRENCY,
+    "import_seconds": round(IMPORT_SECONDS, 4),
+    "create_app_seconds": None,
+    "startup_seconds": None,
+    "warmup": {"operations": [], "modules": {}, "seconds": None},
+}
+
+
+def resolve_route_label(request: Request) -> str:
+    """
+    Modèle de la route qui traitera la requête (ex. /api/v1/results/{result_id}),
+    utilisé comme label de métrique avant le routage pour en limiter la cardinalité
+    """
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
 
 
 # Middleware pour mesurer le temps de traitement des requêtes
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+class RequestTimingMiddleware:
+    """
+    Mesure des requêtes (durée, octets, étapes, Server-Timing), contrôle
+    d'admission disque et espace de travail de chaque requête.
+
+    Middleware ASGI pur : les messages d'envoi sans copie
+    (http.response.pathsend, http.response.zerocopy) le traversent tels quels
+    lorsque le serveur propose ces extensions. La réservation d'espace disque
+    et l'espace de travail sont libérés à la fin de la requête, quelle qu'en
+    soit l'issue (réponse envoyée, erreur, client déconnecté).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
+        path = request.url.path
+        route_label = resolve_route_label(request)
+        current_operation.set(route_label)
+        trace = start_trace(path, request.headers.get("x-request-id"))
+        
+        # Mode profilage : renvoyer les piles échantillonnées à la place du
+        # résultat (la requête reste soumise à l'admission et mesurée)
+        profile = settings.PROFILING_ENABLED and request.query_params.get("profile") == "1"
+        
+        # Réserver l'espace disque estimé avant d'accepter le corps de la requête
+        reservation = None
+        if request.method in ("POST", "PUT"):
+            content_length = request.headers.get("content-length")
+            try:
+                reservation = await admission_controller.reserve(
+                    path, int(content_length) if content_length and content_length.isdigit() else None
+                )
+            except AdmissionRejected as e:
+                response = JSONResponse(
+                    status_code=503,
+                    content={"success": False, "error": str(e), "error_code": "insufficient_disk_space"},
+                    headers={"Retry-After": str(e.retry_after)},
+                )
+                await response(scope, receive, send)
+                return
+        
+        # Taille estimée transmise à l'espace de travail (mémoire ou disque)
+        scratch_request = scratch_manager.begin_request(reservation.size if reservation else 0)
+        
+        meter = _ResponseMeter(send, request, route_label, trace)
+        REQUESTS_IN_PROGRESS.inc(route_label)
+        try:
+            # Dossiers d'opération protégés de l'expiration et du quota jusqu'à la fin de la requête
+            with temp_manager.active_scope():
+                if profile:
+                    await profile_request(self.app, scope, receive, meter.send)
+                else:
+                    await self.app(scope, receive, meter.send)
+        finally:
+            admission_controller.release(reservation)
+            scratch_manager.end_request(scratch_request)
+            meter.finish()
+
+
+class _ResponseMeter:
+    """
+    Relaie l'envoi de la réponse : en-têtes de mesure et métriques de la
+    requête au début de la réponse, puis durée de l'envoi (étape "send") et
+    octets sortants, y compris pour un envoi sans copie.
+    """
+
+    def __init__(self, send: Send, request: Request, route_label: str, trace):
+        self._send = send
+        self.request = request
+        self.route_label = route_label
+        self.trace = trace
+        self.start_time = time.time()
+        self.status: Optional[int] = None
+        self.content_length = 0
+        self.bytes_out = 0
+        self.send_start = 0.0
+        self.send_duration: Optional[float] = None
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self._start(message)
+        elif message_type == "http.response.body":
+            self.bytes_out += len(message.get("body", b""))
+        elif message_type == "http.response.zerocopy":
+            self.bytes_out += message.get("count") or self.content_length
+        elif message_type == "http.response.pathsend":
+            self.bytes_out += self.content_length
+        await self._send(message)
+        if message_type != "http.response.start" and not message.get("more_body", False):
+            self.send_duration = time.perf_counter() - self.send_start
+
+    def _start(self, message: Message) -> None:
+        process_time = time.time() - self.start_time
+        self.status = message["status"]
+        REQUESTS_IN_PROGRESS.dec(self.route_label)
+        
+        headers = MutableHeaders(scope=message)
+        headers["X-Process-Time"] = str(process_time)
+        headers["X-Trace-Id"] = self.trace.trace_id
+        server_timing = self.trace.server_timing()
+        if server_timing:
+            headers["Server-Timing"] = server_timing
+        content_length = headers.get("content-length")
+        if content_length and content_length.isdigit():
+            self.content_length = int(content_length)
+        
+        method = self.request.method
+        REQUESTS_TOTAL.inc(method, self.route_label, str(self.status))
+        REQUEST_DURATION.observe(method, self.route_label, value=process_time)
+        
+        content_length = self.request.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            BYTES_IN.inc(self.route_label, amount=int(content_length))
+        self.send_start = time.perf_counter()
+
+    def finish(self) -> None:
+        """Fin de la requête : étape "send" et trace, si une réponse a commencé"""
+        if self.status is None:
+            REQUESTS_IN_PROGRESS.dec(self.route_label)
+            return
+        send_duration = self.send_duration
+        if send_duration is None:
+            # Envoi interrompu (client déconnecté, erreur)
+            send_duration = time.perf_counter() - self.send_start
+        BYTES_OUT.inc(self.route_label, amount=self.bytes_out)
+        STAGE_DURATION.observe(self.route_label, "send", value=send_duration)
+        self.trace.add("send", send_duration)
+        if settings.TRACE_LOGGING:
+            log_trace(
+                self.trace,
+                method=self.request.method,
+                route=self.route_label,
+                status=self.status,
+                bytes_out=self.bytes_out,
+            )
+
+
+async def profile_request(app: ASGIApp, scope: Scope, receive: Receive, send: Send) -> None:
+    """
+    Exécute la requête sous le profileur par échantillonnage.
+    Le thread de la boucle d'événements est échantillonné, ainsi que le
+    thread qui exécute un traitement supervisé sans isolation ; avec
+    isolation, le processus supervisé se profile lui-même et ses piles sont
+    ajoutées sous un cadre "supervised:<fonction>".
+    """
+    # Envoi par blocs : le profil inclut la lecture du fichier envoyé
+    extensions = scope.get("extensions") or {}
+    scope = {
+        **scope,
+        "extensions": {
+            name: value for name, value in extensions.items()
+            if name not in ("http.response.pathsend", "http.response.zerocopy")
+        },
+    }
+    profiled = {}
+    
+    async def discard(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            profiled["status"] = message["status"]
+    
+    profiler = SamplingProfiler(threading.get_ident(), settings.PROFILING_INTERVAL_SECONDS)
+    profiler.start()
+    try:
+        # L'application se termine après l'envoi et les tâches d'arrière-plan
+        with profiling_scope(profiler):
+            await app(scope, receive, discard)
+    finally:
+        profiler.stop()
+    
+    response = PlainTextResponse(
+        profiler.folded(),
+        headers={
+            "Content-Disposition": 'attachment; filename="profile.folded"',
+            "X-Profile-Samples": str(profiler.samples),
+            "X-Profiled-Status": str(profiled.get("status")),
+        },
+    )
+    await response(scope, receive, send)
 
 
 # Point de terminaison racine
-@app.get("/")
 async def root():
     return {
         "message": "Bienvenue sur l'API PDF-Reader",
@@ -48,26 +265,137 @@ async def root():
     }
 
 
-# Tâche de nettoyage périodique des fichiers temporaires
-@app.on_event("startup")
+# Métriques au format Prometheus
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# Réservations d'espace disque en cours
+async def admission():
+    return admission_controller.snapshot()
+
+
+# Temps de démarrage, modules lourds chargés et préchargement
+async def startup():
+    return {**startup_report, "lazy_modules": lazy_import_report(), "renderer": render_backend_report()}
+
+
+def warm_up(operations: list) -> None:
+    """Précharge les bibliothèques nécessaires aux opérations configurées"""
+    start = time.perf_counter()
+    modules = preload(operation_modules(operations))
+    startup_report["warmup"] = {
+        "operations": list(operations),
+        "modules": modules,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+    logger.info(f"Préchargement terminé: {json.dumps(startup_report['warmup'])}")
+
+
+# Gestion du cycle de vie des fichiers temporaires
 async def startup_event():
-    # Nettoyer les anciens fichiers au démarrage
-    cleanup_old_files(settings.TEMP_DIR)
+    start = time.perf_counter()
+    
+    # Reconstruire l'index des fichiers existants (et créer TEMP_DIR) puis supprimer ceux déjà expirés
+    temp_manager.rebuild()
+    temp_manager.sweep()
+    
+    # Lancer le nettoyage en arrière-plan (thread dédié, hors boucle d'événements) ;
+    # en mode multi-worker, seul le worker élu supprime les fichiers
+    temp_manager.start()
     
-    # Configurer la tâche de nettoyage périodique
-    async def periodic_cleanup():
-        while True:
-            await asyncio.sleep(3600)  # Toutes les heures
-            cleanup_old_files(settings.TEMP_DIR)
+    # Exécution des travaux asynchrones (/jobs) par le serveur API lui-même
+    job_worker.start()
     
-    # Lancer la tâche en arrière-plan
-    asyncio.create_task(periodic_cleanup())
+    # Le préchargement se fait en arrière-plan : il ne retarde pas la disponibilité du service
+    if settings.WARMUP_OPERATIONS:
+        asyncio.get_running_loop().run_in_executor(None, warm_up, settings.WARMUP_OPERATIONS)
+        # Choix du moteur de rendu (mesure en mode "auto") ; sinon au premier rendu
+        asyncio.get_running_loop().run_in_executor(None, select_render_backend)
+    
+    startup_report["startup_seconds"] = round(time.perf_counter() - start, 4)
+    logger.info(f"Démarrage: {json.dumps(startup_report)}")
+
+
+async def shutdown_event():
+    job_worker.stop()
+    temp_manager.stop()
+    shutdown_process_pools()
+
+
+# Opération interrompue : durée ou mémoire dépassée, client déconnecté
+async def operation_aborted_handler(request: Request, exc: OperationAborted):
+    logger.warning(f"Opération {request.url.path} interrompue: {str(exc)}")
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"success": False, "error": str(exc), "error_code": exc.error_code},
+    )
 
 
 # Gestionnaire d'erreurs global
-@app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
         status_code=500,
         content={"success": False, "error": str(exc), "error_code": "internal_error"},
-    ) 
\ No newline at end of file
+    )
+
+
+def create_app() -> FastAPI:
+    """
+    Construit l'application FastAPI.
+
+    Les bibliothèques lourdes (PyMuPDF, PyPDF2, Pillow, OpenCV, pytesseract...)
+    ne sont importées qu'au premier usage ; WARMUP_OPERATIONS permet de
+    précharger au démarrage celles des opérations attendues.
+    Utilisable avec `uvicorn app.main:create_app --factory`.
+    """
+    start = time.perf_counter()
+    
+    application = FastAPI(
+        title=settings.PROJECT_NAME,
+        openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    )
+    
+    # Configuration CORS pour permettre les requêtes du frontend
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000", "http://localhost:3001", "http://localhost:3002"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    # Compression des réponses volumineuses (JSON, NDJSON...), à l'intérieur du
+    # middleware de mesure pour que les octets sortants comptés soient ceux envoyés
+    if settings.COMPRESSION_ENABLED:
+        application.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+            gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+            brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        )
+    
+    # Annulation des traitements dont le client s'est déconnecté
+    application.add_middleware(CancellationMiddleware)
+    
+    # Inclure les routes de l'API
+    application.include_router(api_router, prefix=settings.API_V1_STR)
+    
+    # Mesure des requêtes, admission disque et espace de travail (middleware le plus externe)
+    application.add_middleware(RequestTimingMiddleware)
+    
+    application.add_api_route("/", root, methods=["GET"])
+    application.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+    application.add_api_route("/admission", admission, methods=["GET"], include_in_schema=False)
+    application.add_api_route("/startup", startup, methods=["GET"], include_in_schema=False)
+    
+    application.add_event_handler("startup", startup_event)
+    application.add_event_handler("shutdown", shutdown_event)
+    application.add_exception_handler(OperationAborted, operation_aborted_handler)
+    application.add_exception_handler(Exception, global_exception_handler)
+    
+    startup_report["create_app_seconds"] = round(time.perf_counter() - start, 4)
+    return application
+
+
+app = create_app()
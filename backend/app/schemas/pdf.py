@@ -11,6 +11,22 @@ class PDFPageInfo(BaseModel):
     has_text: bool = False
 
 
+class PDFPageSizes(BaseModel):
+    """Tailles des pages par plages : counts[k] pages de widths[k] x heights[k]"""
+    counts: List[int]
+    widths: List[float]
+    heights: List[float]
+
+
+class PDFPageColumns(BaseModel):
+    """Informations sur les pages, en colonnes (disposition "columns")"""
+    first_page: int
+    count: int
+    sizes: PDFPageSizes
+    rotation: List[int]
+    has_text: List[int]
+
+
 class PDFInfo(BaseModel):
     """Informations sur un document PDF"""
     filename: str
@@ -19,6 +35,7 @@ class PDFInfo(BaseModel):
     encrypted: bool = False
     metadata: Optional[Dict[str, Any]] = None
     pages: List[PDFPageInfo] = []
+    columns: Optional[PDFPageColumns] = None
 
 
 class MergePDFRequest(BaseModel):
@@ -0,0 +1,85 @@
+import os
+import zipfile
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Taille des blocs copiés dans l'archive
+ZIP_CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipStreamBuffer:
+    """
+    Flux en écriture seule, non positionnable, dont le contenu est vidé
+    au fur et à mesure : zipfile écrit alors des descripteurs de données
+    au lieu de revenir en arrière sur les en-têtes.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(
+    entries: Iterable[Tuple[str, Optional[str], Optional[bytes]]],
+    compression: int = zipfile.ZIP_STORED,
+) -> Iterator[bytes]:
+    """
+    Produit une archive ZIP morceau par morceau, sans fichier intermédiaire.
+
+    entries: triplets (nom dans l'archive, chemin d'un fichier à copier, ou
+    contenu en mémoire) consommés au fil de l'eau ; un fichier est envoyé dès
+    qu'il est disponible. Les PDF étant déjà compressés, ils sont stockés sans
+    recompression par défaut.
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=compression, allowZip64=True) as archive:
+        for arcname, path, data in entries:
+            if path is not None:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                info.compress_type = compression
+                with open(path, "rb") as source, archive.open(info, "w", force_zip64=True) as target:
+                    for chunk in iter(lambda: source.read(ZIP_CHUNK_SIZE), b""):
+                        target.write(chunk)
+                        output = buffer.drain()
+                        if output:
+                            yield output
+            else:
+                archive.writestr(arcname, data or b"", compress_type=compression)
+                yield buffer.drain()
+    # Répertoire central
+    yield buffer.drain()
+
+
+def unique_name(name: str, used: set) -> str:
+    """Ajoute un suffixe numérique si le nom est déjà utilisé dans l'archive"""
+    base, ext = os.path.splitext(name)
+    candidate = name
+    index = 2
+    while candidate in used:
+        candidate = f"{base}_{index}{ext}"
+        index += 1
+    used.add(candidate)
+    return candidate
+
+
+def write_zip(output_path: str, files: Iterable[Tuple[str, str]]) -> str:
+    """Écrit une archive ZIP des fichiers donnés (nom dans l'archive, chemin), par blocs"""
+    with open(output_path, "wb") as archive:
+        for chunk in stream_zip((arcname, path, None) for arcname, path in files):
+            archive.write(chunk)
+    return output_path
@@ -0,0 +1,338 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.document_store import document_store
+from ..core.job_queue import DONE, FAILED, JobBackend, job_queue
+from ..core.metrics import JOBS_TOTAL, current_operation
+from ..core.results import result_store
+from ..core.shared_state import worker_id
+from ..core.supervisor import CancelToken, cancellation_scope, operation_token, supervise
+from ..core.temp_manager import create_operation_dir, temp_manager
+from .file_utils import unique_name, write_zip
+from .ocr_utils import OCR_ENGINES, ocr_pdf
+from .page_selection import parse_page_selection
+from .pdf_utils import compress_pdf, images_to_pdf, merge_pdfs, split_pdf
+from .render_utils import render_backend
+
+logger = logging.getLogger(__name__)
+
+# Résultat d'un travail : (chemin du fichier produit, nom de téléchargement, type MIME)
+JobOutput = Tuple[str, str, str]
+
+
+def _output_name(params: Dict[str, Any], default: str, extension: str) -> str:
+    name = params.get("output_filename") or default
+    if not name.lower().endswith(extension):
+        name += extension
+    return name
+
+
+def _base_name(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def run_compress(job: Dict[str, Any], sources: List[str], work_dir: str) -> JobOutput:
+    params = job["params"]
+    output_path = os.path.join(work_dir, "result.pdf")
+    supervise(compress_pdf, sources[0], output_path, params.get("quality", "medium"), render_backend())
+    return output_path, _output_name(params, f"{_base_name(sources[0])}_compresse.pdf", ".pdf"), "application/pdf"
+
+
+def run_images_to_pdf(job: Dict[str, Any], sources: List[str], work_dir: str) -> JobOutput:
+    params = job["params"]
+    output_path = os.path.join(work_dir, "result.pdf")
+    supervise(images_to_pdf, sources, output_path, target_dpi=params.get("target_dpi"))
+    return output_path, _output_name(params, "images_converties.pdf", ".pdf"), "application/pdf"
+
+
+def run_ocr(job: Dict[str, Any], sources: List[str], work_dir: str) -> JobOutput:
+    params = job["params"]
+    output_path = os.path.join(work_dir, "result.pdf")
+    # La progression reste consultable via /ocr/progress/{id du travail}
+    ocr_pdf(
+        sources[0], output_path,
+        lang=params.get("lang", "fra+eng"),
+        dpi=params.get("dpi"),
+        engine=params.get("engine", "tesseract"),
+        job_id=job["id"],
+        skip_text_pages=params.get("skip_text_pages", True),
+        use_cache=params.get("use_cache", True),
+    )
+    return output_path, _output_name(params, f"{_base_name(sources[0])}_ocr.pdf", ".pdf"), "application/pdf"
+
+
+def run_merge(job: Dict[str, Any], sources: List[str], work_dir: str) -> JobOutput:
+    output_path = os.path.join(work_dir, "result.pdf")
+    supervise(merge_pdfs, sources, output_path)
+    return output_path, _output_name(job["params"], "document_fusionne.pdf", ".pdf"), "application/pdf"
+
+
+def run_split(job: Dict[str, Any], sources: List[str], work_dir: str) -> JobOutput:
+    params = job["params"]
+    parts_dir = os.path.join(work_dir, "parts")
+    os.makedirs(parts_dir)
+    parts = supervise(split_pdf, sources[0], parts_dir, params.get("ranges", "all"))
+
+    output_path = os.path.join(work_dir, "result.zip")
+    used: set = set()
+    write_zip(output_path, ((unique_name(os.path.basename(part), used), part) for part in parts))
+    return output_path, _output_name(params, f"{_base_name(sources[0])}_pages.zip", ".zip"), "application/zip"
+
+
+def _choice(*values: str) -> Callable[[Any], str]:
+    def convert(value: Any) -> str:
+        if value not in values:
+            raise ValueError(f"Valeurs acceptées: {', '.join(values)}")
+        return value
+    return convert
+
+
+def _bounded_int(low: int, high: int) -> Callable[[Any], int]:
+    def convert(value: Any) -> int:
+        number = int(value)
+        if not low <= number <= high:
+            raise ValueError(f"doit être compris entre {low} et {high}")
+        return number
+    return convert
+
+
+def _page_selection(value: Any) -> str:
+    return parse_page_selection(str(value)).expression
+
+
+def _flag(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+class JobOperation:
+    """Opération exécutable par la file de travaux et contraintes sur ses entrées"""
+    __slots__ = ("run", "file_type", "min_files", "max_files", "params")
+
+    def __init__(
+        self,
+        run: Callable[[Dict[str, Any], List[str], str], JobOutput],
+        file_type: str,
+        min_files: int = 1,
+        max_files: Optional[int] = 1,
+        params: Optional[Dict[str, Callable[[Any], Any]]] = None,
+    ):
+        self.run = run
+        self.file_type = file_type  # Clé de ALLOWED_EXTENSIONS
+        self.min_files = min_files
+        self.max_files = max_files
+        self.params = {"output_filename": str, **(params or {})}
+
+    def validate_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Vérifie et convertit les paramètres fournis (ValueError si invalides)"""
+        unknown = set(params) - set(self.params)
+        if unknown:
+            raise ValueError(f"Paramètres inconnus: {', '.join(sorted(unknown))}")
+        validated = {}
+        for name, value in params.items():
+            if value is None:
+                continue
+            try:
+                validated[name] = self.params[name](value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Paramètre {name} invalide: {str(e)}")
+        return validated
+
+
+# Opérations lourdes pouvant être déportées vers les workers
+JOB_OPERATIONS: Dict[str, JobOperation] = {
+    "compress": JobOperation(run_compress, "pdf", params={"quality": _choice("low", "medium", "high")}),
+    "images-to-pdf": JobOperation(
+        run_images_to_pdf, "image", max_files=None, params={"target_dpi": _bounded_int(36, 1200)}
+    ),
+    "ocr": JobOperation(run_ocr, "pdf", params={
+        "lang": str,
+        "dpi": _bounded_int(50, 600),
+        "engine": _choice(*OCR_ENGINES),
+        "skip_text_pages": _flag,
+        "use_cache": _flag,
+    }),
+    "merge": JobOperation(run_merge, "pdf", min_files=2, max_files=None),
+    "split": JobOperation(run_split, "pdf", params={"ranges": _page_selection}),
+}
+
+
+def _source_path(item: Dict[str, Any]) -> str:
+    """Chemin dans le stockage partagé d'un fichier source du travail"""
+    path = document_store.path(item["document_id"])
+    if path is None:
+        raise ValueError(f"Fichier source introuvable ou expiré: {item['filename']}")
+    return path
+
+
+def _link_source(path: str, filename: str, work_dir: str, index: int) -> str:
+    """
+    Place un fichier du stockage partagé dans le dossier du travail sous son
+    nom d'origine (les noms des fichiers produits en dépendent).
+    """
+    # Un sous-dossier par source : deux fichiers peuvent porter le même nom
+    sources_dir = os.path.join(work_dir, "sources", str(index))
+    os.makedirs(sources_dir)
+    target = os.path.join(sources_dir, os.path.basename(filename) or "document")
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copyfile(path, target)
+    return target
+
+
+class JobWorker:
+    """
+    Exécute les travaux de la file partagée.
+
+    Chaque thread prend un travail, prépare ses fichiers sources depuis le
+    stockage partagé, exécute l'opération puis range le résultat dans le
+    stockage des résultats (téléchargeable via /results/{id}). Un thread de
+    surveillance prolonge les baux des travaux en cours, remet en file ceux
+    des workers disparus et oublie les travaux terminés expirés.
+
+    Le même worker tourne dans le serveur API (JOB_WORKER_CONCURRENCY) ou
+    dans un processus dédié, sur ce nœud ou un autre (`python -m app.worker`).
+    """
+
+    def __init__(
+        self,
+        queue: JobBackend,
+        concurrency: int,
+        lease_seconds: float = 60.0,
+        poll_seconds: float = 0.5,
+        max_attempts: int = 3,
+    ):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._tokens: Dict[str, CancelToken] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def worker_id(self) -> str:
+        return worker_id()
+
+    def start(self) -> None:
+        if self._threads or self.concurrency <= 0:
+            return
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        self._threads.append(threading.Thread(target=self._keep_alive, name="job-worker-leases", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Worker {self.worker_id} : {self.concurrency} travaux en parallèle")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Arrête la prise de travaux ; ceux en cours seront repris ailleurs à l'expiration de leur bail"""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Erreur lors de la lecture de la file de travaux: {str(e)}")
+                job = None
+            if job is None:
+                self._stopping.wait(self.poll_seconds)
+                continue
+            self.execute(job)
+
+    def _keep_alive(self) -> None:
+        while not self._stopping.wait(self.lease_seconds / 3):
+            try:
+                with self._lock:
+                    job_ids = list(self._running)
+                for job_id in job_ids:
+                    if not self.queue.heartbeat(job_id, self.worker_id, self.lease_seconds):
+                        logger.warning(f"Le travail {job_id} a été repris par un autre worker")
+                        # Son résultat ne serait jamais réclamé : inutile de continuer
+                        with self._lock:
+                            cancel = self._tokens.get(job_id)
+                        if cancel is not None:
+                            cancel.cancel("Travail repris par un autre worker")
+                self.queue.requeue_expired(self.max_attempts)
+                self.queue.purge(time.time() - settings.RESULT_RETENTION_SECONDS)
+            except Exception as e:
+                logger.error(f"Erreur lors de la surveillance des travaux: {str(e)}")
+
+    def execute(self, job: Dict[str, Any]) -> str:
+        """Exécute un travail pris dans la file et enregistre son issue"""
+        # Limites de durée et de mémoire de l'opération, comme pour une requête
+        cancel = operation_token(f"/{job['operation']}")
+        with self._lock:
+            self._running[job["id"]] = job
+            self._tokens[job["id"]] = cancel
+        token = current_operation.set(f"job:{job['operation']}")
+        work_dir = None
+        result = None
+        stored = None
+        try:
+            operation = JOB_OPERATIONS.get(job["operation"])
+            if operation is None:
+                raise ValueError(f"Opération inconnue: {job['operation']}")
+            paths = [_source_path(item) for item in job["inputs"]]
+            # Aucune requête ne fournit d'estimation : la taille des sources décide
+            # de l'emplacement (en mémoire, une source est copiée et non liée).
+            # Épinglé jusqu'à sa suppression : un travail peut durer plus que la rétention
+            work_dir = temp_manager.pin(create_operation_dir(expected_size=sum(os.path.getsize(path) for path in paths)))
+            sources = [
+                _link_source(path, item["filename"], work_dir, i)
+                for i, (path, item) in enumerate(zip(paths, job["inputs"]))
+            ]
+            with cancellation_scope(cancel):
+                output_path, filename, media_type = operation.run(job, sources, work_dir)
+            stored = result_store.put(output_path, filename, media_type)
+            result = {
+                "result_id": stored.result_id,
+                "url": stored.url,
+                "filename": stored.filename,
+                "media_type": stored.media_type,
+                "size": stored.stat.st_size,
+            }
+            status, error = DONE, None
+        except Exception as e:
+            logger.error(f"Erreur lors du travail {job['id']} ({job['operation']}): {str(e)}")
+            status, error = FAILED, str(e)
+        finally:
+            if work_dir is not None:
+                temp_manager.remove(work_dir)
+            current_operation.reset(token)
+            with self._lock:
+                self._running.pop(job["id"], None)
+                self._tokens.pop(job["id"], None)
+
+        if not self.queue.finish(job["id"], self.worker_id, status, result=result, error=error):
+            # Bail perdu : le travail a été repris ailleurs, ce résultat ne sera jamais réclamé
+            if stored is not None:
+                result_store.delete(stored.result_id)
+            return status
+        JOBS_TOTAL.inc(job["operation"], status)
+        return status
+
+
+job_worker = JobWorker(
+    job_queue,
+    settings.JOB_WORKER_CONCURRENCY,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    poll_seconds=settings.JOB_POLL_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+)
@@ -0,0 +1,422 @@
+import os
+import hashlib
+import shutil
+import threading
+import time
+from collections import deque, OrderedDict
+from functools import lru_cache
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.security import secure_delete_file
+from ..core.metrics import time_stage, record_pages, record_cache, PIPELINE_QUEUE
+from ..core.tracing import span
+from ..core.process_pool import get_executor, reset_process_pool
+from ..core.shared_state import MULTI_WORKER, shared_state
+from ..core.lazy_imports import lazy_import, module_available
+from ..core.supervisor import OperationAborted, check_cancelled
+from .pdf_utils import page_has_text
+from .render_utils import open_render_document, render_backend
+
+# Bibliothèques lourdes, importées au premier usage (dans chaque processus de reconnaissance).
+# OpenCV et pytesseract sont optionnels : sans OpenCV le redressement est désactivé
+fitz = lazy_import("fitz")  # PyMuPDF
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+pytesseract = lazy_import("pytesseract")
+
+# Moteurs de reconnaissance disponibles
+OCR_ENGINES = ("tesseract", "stub")
+
+# Version du moteur de test (à incrémenter si sa sortie change)
+STUB_ENGINE_VERSION = "stub-1"
+
+
+# --- Prétraitement (vectorisé) ---------------------------------------------
+
+def render_page_gray(pdf_path: str, page_index: int, dpi: int, backend: Optional[str] = None) -> "np.ndarray":
+    """Rend une page en niveaux de gris sous forme de tableau NumPy (hauteur × largeur)"""
+    with open_render_document(pdf_path, backend) as document:
+        return np.asarray(document.render(page_index, dpi / 72.0, grayscale=True))
+
+
+def otsu_threshold(gray: "np.ndarray") -> int:
+    """Seuil d'Otsu calculé sur l'histogramme (sans boucle Python sur les pixels)"""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if total == 0:
+        return 127
+    levels = np.arange(256, dtype=np.float64)
+    weight_bg = np.cumsum(hist)
+    weight_fg = total - weight_bg
+    cum_mean = np.cumsum(hist * levels)
+    mean_bg = np.divide(cum_mean, weight_bg, out=np.zeros(256), where=weight_bg > 0)
+    mean_fg = np.divide(cum_mean[-1] - cum_mean, weight_fg, out=np.zeros(256), where=weight_fg > 0)
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def binarize(gray: "np.ndarray") -> "np.ndarray":
+    """Binarisation d'Otsu : texte noir (0) sur fond blanc (255)"""
+    return np.where(gray > otsu_threshold(gray), 255, 0).astype(np.uint8)
+
+
+def estimate_skew(binary: "np.ndarray") -> float:
+    """Angle d'inclinaison du texte en degrés (0 si OpenCV est absent)"""
+    if not module_available("cv2"):
+        return 0.0
+    coords = np.column_stack(np.nonzero(binary == 0))
+    if len(coords) < 50:
+        return 0.0
+    angle = cv2.minAreaRect(coords[:, ::-1].astype(np.float32))[-1]
+    # Ramener l'angle dans [-45, 45]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    return float(angle)
+
+
+def deskew(binary: "np.ndarray", angle: float) -> Tuple["np.ndarray", Optional["np.ndarray"]]:
+    """
+    Redresse l'image. Renvoie l'image et la matrice inverse permettant de
+    ramener les coordonnées reconnues dans le repère de la page d'origine.
+    """
+    if not module_available("cv2") or abs(angle) < 0.1:
+        return binary, None
+    height, width = binary.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    rotated = cv2.warpAffine(
+        binary, matrix, (width, height), flags=cv2.INTER_NEAREST, borderValue=255
+    )
+    return rotated, cv2.invertAffineTransform(matrix)
+
+
+def preprocess(gray: "np.ndarray") -> Tuple["np.ndarray", Optional["np.ndarray"]]:
+    """Binarisation puis redressement"""
+    binary = binarize(gray)
+    return deskew(binary, estimate_skew(binary))
+
+
+# --- Moteurs de reconnaissance ---------------------------------------------
+
+def tesseract_available() -> bool:
+    return module_available("pytesseract") and shutil.which(settings.TESSERACT_CMD) is not None
+
+
+@lru_cache(maxsize=None)
+def engine_version(engine: str) -> str:
+    """Identifiant de version du moteur (utilisé pour invalider les résultats en cache)"""
+    if engine == "stub":
+        return STUB_ENGINE_VERSION
+    if not tesseract_available():
+        raise ValueError("Tesseract OCR n'est pas installé")
+    pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
+    return f"tesseract-{pytesseract.get_tesseract_version()}"
+
+
+def recognize_tesseract(image: "np.ndarray", lang: str) -> List[Tuple[str, float, float, float, float]]:
+    """Reconnaissance Tesseract : liste de mots (texte, x0, y0, x1, y1) en pixels"""
+    pytesseract.pytesseract.tesseract_cmd = settings.TESSERACT_CMD
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    words = []
+    for text, conf, left, top, width, height in zip(
+        data["text"], data["conf"], data["left"], data["top"], data["width"], data["height"]
+    ):
+        text = text.strip()
+        if not text or float(conf) < 0:
+            continue
+        words.append((text, left, top, left + width, top + height))
+    return words
+
+
+def recognize_stub(image: "np.ndarray", lang: str) -> List[Tuple[str, float, float, float, float]]:
+    """
+    Moteur de test sans Tesseract : détecte les lignes de texte par projection
+    horizontale et renvoie un mot générique par ligne, avec sa boîte englobante.
+    """
+    ink = image == 0
+    rows = ink.any(axis=1)
+    if not rows.any():
+        return []
+    # Débuts et fins des séquences de lignes contenant de l'encre
+    edges = np.diff(np.concatenate(([0], rows.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    words = []
+    for index, (top, bottom) in enumerate(zip(starts, ends), start=1):
+        columns = np.flatnonzero(ink[top:bottom].any(axis=0))
+        words.append((f"ligne{index}", float(columns[0]), float(top), float(columns[-1] + 1), float(bottom)))
+    return words
+
+
+RECOGNIZERS: Dict[str, Callable[["np.ndarray", str], List[Tuple[str, float, float, float, float]]]] = {
+    "tesseract": recognize_tesseract,
+    "stub": recognize_stub,
+}
+
+
+def recognize_page(
+    pdf_path: str, page_index: int, dpi: int, lang: str, engine: str, backend: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Tâche exécutée dans un processus du pool : rend, prétraite et reconnaît une page.
+    Le moteur de rendu est choisi par le processus principal (pas de nouvelle
+    mesure dans chaque processus du pool).
+    Les boîtes des mots sont renvoyées en points PDF, dans le repère de la page.
+    """
+    gray = render_page_gray(pdf_path, page_index, dpi, backend)
+
+    image, inverse = preprocess(gray)
+    words = RECOGNIZERS[engine](image, lang)
+
+    scale = 72.0 / dpi
+    result = []
+    for text, x0, y0, x1, y1 in words:
+        if inverse is not None:
+            # Ramener les coins dans le repère de l'image non redressée
+            corners = np.array([[x0, y0, 1], [x1, y0, 1], [x0, y1, 1], [x1, y1, 1]], dtype=np.float64)
+            mapped = corners @ inverse.T
+            x0, y0 = mapped.min(axis=0)
+            x1, y1 = mapped.max(axis=0)
+        result.append((text, x0 * scale, y0 * scale, x1 * scale, y1 * scale))
+    return {"page_index": page_index, "words": result}
+
+
+# --- Suivi de progression --------------------------------------------------
+
+_progress: Dict[str, Dict[str, Any]] = {}
+_progress_lock = threading.Lock()
+
+
+def set_progress(job_id: Optional[str], **values: Any) -> None:
+    if not job_id:
+        return
+    if MULTI_WORKER:
+        # La progression peut être demandée à n'importe quel worker
+        shared_state.update("ocr_progress", job_id, values, ttl=settings.FILE_RETENTION_SECONDS)
+        return
+    with _progress_lock:
+        # Oublier les travaux terminés depuis plus d'une heure
+        limit = time.time() - settings.FILE_RETENTION_SECONDS
+        for key in [k for k, v in _progress.items() if v.get("finished_at") and v["finished_at"] < limit]:
+            del _progress[key]
+        _progress.setdefault(job_id, {}).update(values)
+
+
+def get_progress(job_id: str) -> Optional[Dict[str, Any]]:
+    if MULTI_WORKER:
+        return shared_state.get("ocr_progress", job_id)
+    with _progress_lock:
+        progress = _progress.get(job_id)
+        return dict(progress) if progress is not None else None
+
+
+# --- Cache des résultats ---------------------------------------------------
+
+def page_fingerprint(page: "fitz.Page") -> str:
+    """
+    Empreinte du contenu visuel d'une page : flux de contenu, données brutes
+    des images qu'il référence, géométrie et rotation.
+    Calculée sans rendu ni décodage des images.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{tuple(page.rect)}|{page.rotation}|".encode())
+    digest.update(page.read_contents())
+    doc = page.parent
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    return digest.hexdigest()
+
+
+def ocr_cache_key(page: "fitz.Page", lang: str, version: str, dpi: int) -> str:
+    return f"{page_fingerprint(page)}:{lang}:{version}:{dpi}"
+
+
+class OCRCache:
+    """
+    Cache LRU en mémoire des mots reconnus par page.
+    Volontairement non persistant : le texte des documents ne doit pas
+    survivre sur disque au-delà de la durée de rétention. Il reste donc
+    propre à chaque worker en mode multi-worker.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, List[Tuple[str, float, float, float, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[Tuple[str, float, float, float, float]]]:
+        with self._lock:
+            words = self._entries.get(key)
+            if words is not None:
+                self._entries.move_to_end(key)
+        record_cache("ocr", words is not None)
+        return words
+
+    def put(self, key: str, words: List[Tuple[str, float, float, float, float]]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = words
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+ocr_cache = OCRCache(settings.OCR_CACHE_MAX_PAGES)
+
+
+# --- Couche texte ----------------------------------------------------------
+
+def add_invisible_text(page: "fitz.Page", words: List[Tuple[str, float, float, float, float]]) -> None:
+    """Insère les mots reconnus en texte invisible (mode de rendu 3) à leur position"""
+    for text, x0, y0, x1, y1 in words:
+        height = y1 - y0
+        width = x1 - x0
+        if height <= 0 or width <= 0:
+            continue
+        fontsize = max(1.0, height * 0.9)
+        text_width = fitz.get_text_length(text, fontname="helv", fontsize=fontsize)
+        # Étirer horizontalement le texte pour couvrir la boîte du mot
+        origin = fitz.Point(x0, y1 - height * 0.2)
+        morph = (origin, fitz.Matrix(width / text_width, 1)) if text_width > 0 else None
+        page.insert_text(origin, text, fontsize=fontsize, fontname="helv", render_mode=3, morph=morph)
+
+
+def ocr_pdf(
+    pdf_path: str,
+    output_path: str,
+    lang: str = "fra+eng",
+    dpi: Optional[int] = None,
+    engine: str = "tesseract",
+    max_concurrency: Optional[int] = None,
+    job_id: Optional[str] = None,
+    skip_text_pages: bool = True,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Ajoute une couche de texte invisible à un PDF scanné.
+
+    Les pages qui portent déjà du texte sont laissées telles quelles et les
+    pages déjà reconnues (même contenu, langue et version du moteur) sont
+    reprises du cache. Les autres sont rendues, prétraitées et reconnues dans
+    un processus du pool (une page par tâche), avec au plus max_concurrency
+    pages en cours.
+    Renvoie un résumé (pages reconnues, reprises du cache, ignorées, mots insérés).
+    """
+    if engine not in OCR_ENGINES:
+        raise ValueError(f"Moteur OCR inconnu: {engine}")
+    if engine == "tesseract" and not tesseract_available():
+        raise ValueError("Tesseract OCR n'est pas installé")
+
+    dpi = dpi or settings.OCR_DEFAULT_DPI
+    limit = settings.OCR_MAX_WORKERS or os.cpu_count() or 1
+    concurrency = max(1, min(max_concurrency or limit, limit))
+    backend = render_backend()
+    # Le rendu peut différer légèrement d'un moteur à l'autre : il fait partie de la clé du cache
+    version = f"{engine_version(engine)}:{backend}"
+    doc = None
+    pending: deque = deque()
+    try:
+        with time_stage("parse"):
+            doc = fitz.open(pdf_path)
+        total_pages = len(doc)
+        set_progress(job_id, status="running", total_pages=total_pages, done_pages=0, started_at=time.time())
+
+        words_total = 0
+        done = 0
+        skipped = 0
+        cached = 0
+        to_recognize: List[Tuple[int, Optional[str]]] = []
+
+        with time_stage("process"):
+            # Tri des pages : texte déjà présent, résultat en cache ou reconnaissance
+            with span("ocr_plan"):
+                for page in doc:
+                    check_cancelled()
+                    if skip_text_pages and page_has_text(page):
+                        skipped += 1
+                        continue
+                    key = None
+                    if use_cache:
+                        key = ocr_cache_key(page, lang, version, dpi)
+                        words = ocr_cache.get(key)
+                        if words is not None:
+                            add_invisible_text(page, words)
+                            words_total += len(words)
+                            cached += 1
+                            continue
+                    to_recognize.append((page.number, key))
+                done = skipped + cached
+                set_progress(job_id, done_pages=done, skipped_pages=skipped, cached_pages=cached)
+
+            pool = get_executor("ocr", settings.OCR_MAX_WORKERS)
+            queue = iter(to_recognize)
+            keys: Dict[int, Optional[str]] = {}
+
+            def submit_next() -> None:
+                item = next(queue, None)
+                if item is not None:
+                    page_index, key = item
+                    keys[page_index] = key
+                    pending.append(pool.submit(recognize_page, pdf_path, page_index, dpi, lang, engine, backend))
+                    PIPELINE_QUEUE.inc("ocr")
+
+            for _ in range(concurrency):
+                submit_next()
+
+            # Les pages sont intégrées dans l'ordre, au fil des résultats
+            while pending:
+                check_cancelled()
+                with span("ocr_page"):
+                    result = pending.popleft().result()
+                PIPELINE_QUEUE.dec("ocr")
+                submit_next()
+
+                page_index = result["page_index"]
+                with span("text_layer"):
+                    add_invisible_text(doc[page_index], result["words"])
+                if keys.get(page_index) is not None:
+                    ocr_cache.put(keys[page_index], result["words"])
+                words_total += len(result["words"])
+                done += 1
+                set_progress(job_id, done_pages=done)
+
+        record_pages(total_pages)
+
+        with time_stage("write"):
+            doc.save(output_path, garbage=1, deflate=True)
+
+        summary = {
+            "total_pages": total_pages,
+            "recognized_pages": len(to_recognize),
+            "cached_pages": cached,
+            "skipped_pages": skipped,
+            "words": words_total,
+        }
+        set_progress(job_id, status="done", finished_at=time.time(), **summary)
+        return summary
+
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            # Un processus a été tué (mémoire, signal) : recréer le pool au prochain appel
+            reset_process_pool("ocr")
+        for future in pending:
+            future.cancel()
+        PIPELINE_QUEUE.dec("ocr", amount=len(pending))
+        set_progress(job_id, status="error", error=str(e), finished_at=time.time())
+        if os.path.exists(output_path):
+            secure_delete_file(output_path)
+        if isinstance(e, OperationAborted):
+            raise
+        raise ValueError(f"Erreur lors de la reconnaissance de texte: {str(e)}")
+
+    finally:
+        if doc is not None:
+            doc.close()
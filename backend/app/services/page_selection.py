@@ -0,0 +1,332 @@
+"""
+Sélection de pages commune à toutes les opérations.
+
+Syntaxe (pages numérotées à partir de 1, termes séparés par des virgules) :
+
+    5            la page 5
+    -1           la dernière page (les numéros négatifs partent de la fin)
+    3-7          les pages 3 à 7 (3..7 est équivalent)
+    10-          de la page 10 à la fin (10.. est équivalent)
+    ..5          du début à la page 5
+    -3--1        les trois dernières pages (-3..-1)
+    1-100:2      une page sur deux de 1 à 100 (un pas s'applique à toute plage)
+    odd, even    les pages impaires, paires
+    all, *       toutes les pages (une sélection vide aussi)
+    !4, !8-10    exclusions, retirées de l'ensemble des inclusions ; une
+                 sélection faite uniquement d'exclusions part de toutes les pages
+
+Les bornes d'une plage sont ramenées aux limites du document (1-1000 sur un
+document de 10 pages sélectionne les 10 pages) ; une page isolée hors du
+document est une erreur.
+
+Une sélection est compilée en segments périodiques disjoints (début, fin,
+période, décalages retenus dans une période) : sa taille, son nombre de pages
+et les tests d'appartenance dépendent du nombre de termes, pas du nombre de
+pages du document.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from math import lcm
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Exclusion (!) puis mot-clé ou plage, éventuellement suivis d'un pas (:n)
+_TERM = re.compile(
+    r"^(?P<exclude>!)?\s*"
+    r"(?:(?P<keyword>all|\*|odd|even)"
+    r"|(?P<start>-?\d+)?\s*(?P<separator>\.\.|-)?\s*(?P<end>-?\d+)?)"
+    r"\s*(?::\s*(?P<step>\d+))?$",
+    re.IGNORECASE,
+)
+
+
+class _Segment:
+    """
+    Pages start + k*period + o (o parmi offsets) inférieures à stop.
+    offsets est trié et commence à 0 : start est la première page du segment
+    et stop - 1 la dernière.
+    """
+    __slots__ = ("start", "stop", "period", "offsets")
+
+    def __init__(self, start: int, stop: int, period: int, offsets: Tuple[int, ...]):
+        self.start = start
+        self.stop = stop
+        self.period = period
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        full, rest = divmod(self.stop - self.start, self.period)
+        return full * len(self.offsets) + bisect_left(self.offsets, rest)
+
+    def __contains__(self, index: int) -> bool:
+        if not self.start <= index < self.stop:
+            return False
+        offset = (index - self.start) % self.period
+        position = bisect_left(self.offsets, offset)
+        return position < len(self.offsets) and self.offsets[position] == offset
+
+    def __iter__(self) -> Iterator[int]:
+        for base in range(self.start, self.stop, self.period):
+            for offset in self.offsets:
+                if base + offset >= self.stop:
+                    return
+                yield base + offset
+
+    def next_member(self, index: int) -> int:
+        """Première page du motif (prolongé au-delà de stop) supérieure ou égale à index"""
+        cycles, offset = divmod(index - self.start, self.period)
+        position = bisect_left(self.offsets, offset)
+        if position == len(self.offsets):
+            return self.start + (cycles + 1) * self.period
+        return self.start + cycles * self.period + self.offsets[position]
+
+
+def _segment(start: int, stop: int, period: int, offsets: Sequence[int]) -> Optional[_Segment]:
+    """
+    Segment normalisé des pages du motif comprises dans [start, stop) :
+    bornes resserrées sur la première et la dernière page, plus petite période.
+    """
+    if not offsets or start >= stop:
+        return None
+    first = start + offsets[0]
+    if first >= stop:
+        return None
+    offsets = sorted((offset - offsets[0]) % period for offset in offsets)
+
+    # Dernière page du motif avant stop (offsets[0] == 0 : au moins un décalage convient)
+    cycles, rest = divmod(stop - 1 - first, period)
+    last = first + cycles * period + offsets[bisect_right(offsets, rest) - 1]
+    if last == first:
+        return _Segment(first, first + 1, 1, (0,))
+
+    # Plus petite période décrivant le même motif (ex: 6 et (0, 2, 4) -> 2 et (0,))
+    if period > last - first:
+        period = last - first + 1
+        offsets = [offset for offset in offsets if offset < period]
+    members = set(offsets)
+    for divisor in range(1, period):
+        if period % divisor:
+            continue
+        head = [offset for offset in offsets if offset < divisor]
+        if len(head) * (period // divisor) == len(offsets) and all(offset % divisor in members for offset in offsets):
+            period, offsets = divisor, head
+            break
+    return _Segment(first, last + 1, period, tuple(offsets))
+
+
+def _combine(includes: List[range], excludes: List[range]) -> List[_Segment]:
+    """
+    Pages des inclusions qui ne sont dans aucune exclusion.
+
+    Les bornes des progressions découpent les pages en intervalles élémentaires
+    sur lesquels les termes actifs ne changent pas : chaque intervalle est décrit
+    par un motif de période ppcm(pas actifs), calculé sur une seule période.
+    """
+    includes = [r for r in includes if r]
+    excludes = [r for r in excludes if r]
+    bounds = sorted({bound for r in includes + excludes for bound in (r.start, r[-1] + 1)})
+
+    segments: List[_Segment] = []
+    for low, high in zip(bounds, bounds[1:]):
+        active = [r for r in includes if r.start < high and r[-1] >= low]
+        removed = [r for r in excludes if r.start < high and r[-1] >= low]
+        if not active or any(r.step == 1 for r in removed):
+            continue
+        period = lcm(*(r.step for r in active + removed))
+        length = min(period, high - low)
+        offsets = [
+            offset for offset in range(length)
+            if any(low + offset in r for r in active) and not any(low + offset in r for r in removed)
+        ]
+        segment = _segment(low, high, period if length == period else length, offsets)
+        if segment is None:
+            continue
+
+        # Fusion avec le segment précédent s'il prolonge le même motif
+        previous = segments[-1] if segments else None
+        if (
+            previous is not None
+            and previous.period == segment.period
+            and previous.offsets == segment.offsets
+            and previous.next_member(previous.stop) == segment.start
+        ):
+            previous.stop = segment.stop
+        else:
+            segments.append(segment)
+    return segments
+
+
+class PageSet:
+    """
+    Ensemble de pages (indices base 0) issu d'une sélection, parcouru dans
+    l'ordre croissant et sans doublon. len(), `in` et le parcours ne dépendent
+    que du nombre de segments ; l'objet peut être passé tel quel à
+    PageTree.select ou à toute fonction attendant une liste d'indices.
+    """
+    __slots__ = ("_segments", "_starts", "_length")
+
+    def __init__(self, segments: Iterable[_Segment] = ()):
+        self._segments = list(segments)
+        self._starts = [segment.start for segment in self._segments]
+        self._length = sum(len(segment) for segment in self._segments)
+
+    @classmethod
+    def from_indices(cls, indices: Iterable[int]) -> "PageSet":
+        """Ensemble des indices donnés (ordre et doublons indifférents)"""
+        runs = []
+        for index in sorted(set(indices)):
+            if runs and runs[-1][1] == index:
+                runs[-1][1] = index + 1
+            else:
+                runs.append([index, index + 1])
+        return cls(_Segment(start, stop, 1, (0,)) for start, stop in runs)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def __iter__(self) -> Iterator[int]:
+        for segment in self._segments:
+            yield from segment
+
+    def __contains__(self, index: int) -> bool:
+        position = bisect_right(self._starts, index) - 1
+        return position >= 0 and index in self._segments[position]
+
+    def __repr__(self) -> str:
+        return f"PageSet({self.expression()!r})"
+
+    def complement(self, total_pages: int) -> "PageSet":
+        """Pages du document (0..total_pages-1) absentes de l'ensemble"""
+        segments = []
+        position = 0
+        for segment in self._segments:
+            if position < segment.start:
+                segments.append(range(position, min(segment.start, total_pages)))
+            if segment.period > 1:
+                missing = [offset for offset in range(segment.period) if offset not in segment.offsets]
+                segments.append((segment.start, min(segment.stop, total_pages), segment.period, missing))
+            position = max(position, segment.stop)
+        if position < total_pages:
+            segments.append(range(position, total_pages))
+
+        # Reconstruction normalisée (les trous d'un motif périodique sont eux-mêmes périodiques)
+        result = []
+        for item in segments:
+            if isinstance(item, range):
+                segment = _segment(item.start, item.stop, 1, (0,)) if item else None
+            else:
+                segment = _segment(item[0], item[1], item[2], item[3])
+            if segment is not None:
+                result.append(segment)
+        return PageSet(result)
+
+    def expression(self) -> str:
+        """Sélection équivalente dans la syntaxe du module (numéros base 1)"""
+        terms = []
+        for segment in self._segments:
+            if segment.period == 1 or len(segment) == 1:
+                last = segment.stop
+                terms.append(str(segment.start + 1) if last == segment.start + 1 else f"{segment.start + 1}-{last}")
+            elif len(segment.offsets) == 1:
+                terms.append(f"{segment.start + 1}-{segment.stop}:{segment.period}")
+            else:
+                # Motif à plusieurs décalages : une progression par décalage
+                for offset in segment.offsets:
+                    if segment.start + offset < segment.stop:
+                        terms.append(f"{segment.start + offset + 1}-{segment.stop}:{segment.period}")
+        return ",".join(terms)
+
+
+class _Term:
+    """Terme d'une sélection, indépendant du nombre de pages du document"""
+    __slots__ = ("text", "exclude", "keyword", "start", "end", "is_range", "step")
+
+    def __init__(self, text: str):
+        match = _TERM.match(text)
+        if match is None:
+            raise ValueError(f"Sélection de pages invalide: '{text}'")
+        self.text = text
+        self.exclude = match["exclude"] is not None
+        self.keyword = match["keyword"].lower() if match["keyword"] else None
+        self.start = int(match["start"]) if match["start"] is not None else None
+        self.end = int(match["end"]) if match["end"] is not None else None
+        self.is_range = match["separator"] is not None
+        self.step = int(match["step"]) if match["step"] is not None else 1
+
+        if self.keyword is None and self.start is None and self.end is None:
+            raise ValueError(f"Sélection de pages invalide: '{text}'")
+        if 0 in (self.start, self.end):
+            raise ValueError(f"Les pages sont numérotées à partir de 1 (ou -1 pour la dernière): '{text}'")
+        if self.step < 1:
+            raise ValueError(f"Le pas doit être au moins 1: '{text}'")
+        if self.step > 1 and self.keyword is None and not self.is_range:
+            raise ValueError(f"Un pas ne s'applique qu'à une plage: '{text}'")
+        if (
+            self.is_range and self.start is not None and self.end is not None
+            and (self.start > 0) == (self.end > 0) and self.start > self.end
+        ):
+            raise ValueError(f"Plage inversée: '{text}'")
+
+    def resolve(self, total_pages: int) -> range:
+        """Progression des indices (base 0) désignés dans un document de total_pages pages"""
+        if self.keyword in ("all", "*"):
+            return range(0, total_pages, self.step)
+        if self.keyword == "odd":
+            return range(0, total_pages, 2 * self.step)
+        if self.keyword == "even":
+            return range(1, total_pages, 2 * self.step)
+
+        if not self.is_range:
+            index = self.start - 1 if self.start > 0 else total_pages + self.start
+            if not 0 <= index < total_pages:
+                raise ValueError(f"Page {self.start} n'existe pas. Le document contient {total_pages} pages.")
+            return range(index, index + 1)
+
+        first = 0 if self.start is None else (self.start - 1 if self.start > 0 else total_pages + self.start)
+        last = total_pages - 1 if self.end is None else (self.end - 1 if self.end > 0 else total_pages + self.end)
+        # Bornes ramenées au document ; le pas reste calé sur la borne demandée
+        if first < 0:
+            first += -(first // self.step) * self.step
+        return range(first, min(last, total_pages - 1) + 1, self.step)
+
+
+class PageSelection:
+    """Sélection analysée, applicable à des documents de tailles différentes"""
+    __slots__ = ("expression", "includes", "excludes")
+
+    def __init__(self, expression: Optional[str]):
+        self.expression = (expression or "").strip()
+        terms = [_Term(part.strip()) for part in self.expression.split(",") if part.strip()]
+        self.includes = [term for term in terms if not term.exclude]
+        self.excludes = [term for term in terms if term.exclude]
+
+    def _includes(self, total_pages: int) -> List[range]:
+        if not self.includes:
+            return [range(total_pages)]
+        return [term.resolve(total_pages) for term in self.includes]
+
+    def resolve(self, total_pages: int) -> PageSet:
+        """Pages sélectionnées dans un document de total_pages pages"""
+        excludes = [term.resolve(total_pages) for term in self.excludes]
+        return PageSet(_combine(self._includes(total_pages), excludes))
+
+    def groups(self, total_pages: int) -> List[PageSet]:
+        """
+        Une partie par terme d'inclusion, dans l'ordre de la sélection (les
+        exclusions s'appliquent à chacune) ; les parties vides sont omises.
+        """
+        excludes = [term.resolve(total_pages) for term in self.excludes]
+        groups = [PageSet(_combine([included], excludes)) for included in self._includes(total_pages)]
+        return [group for group in groups if group]
+
+
+def parse_page_selection(expression: Optional[str]) -> PageSelection:
+    """Analyse une sélection de pages (ValueError si la syntaxe est invalide)"""
+    return PageSelection(expression)
+
+
+def select_pages(expression: Optional[str], total_pages: int) -> PageSet:
+    """Pages (indices base 0) désignées par une sélection dans un document de total_pages pages"""
+    return PageSelection(expression).resolve(total_pages)
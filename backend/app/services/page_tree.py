@@ -0,0 +1,127 @@
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from ..core.lazy_imports import lazy_import
+from .page_selection import PageSet
+
+PyPDF2 = lazy_import("PyPDF2")
+
+# Attributs qu'une page hérite des nœuds /Pages (PDF 1.7, § 7.7.3.4)
+INHERITABLE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+class _InconsistentTree(Exception):
+    """Les compteurs /Count ne décrivent pas l'arbre : repli sur la lecture complète"""
+
+
+def _is_node(obj: Any) -> bool:
+    """Nœud intermédiaire (/Pages) ou feuille (/Page) ; /Type est parfois absent"""
+    kind = obj.get("/Type")
+    return kind == "/Pages" or (kind is None and "/Kids" in obj)
+
+
+class PageTree:
+    """
+    Accès paresseux aux pages d'un PdfReader (PyPDF2).
+
+    reader.pages lit et analyse toutes les pages du document au premier
+    accès. Ici, l'arbre des pages est parcouru à l'aide des compteurs /Count :
+    les sous-arbres qui ne contiennent aucune page demandée sont sautés sans
+    être lus, et seules les pages sélectionnées (puis, à l'écriture, leurs
+    ressources) sont chargées. Extraire quelques pages d'un document de
+    plusieurs milliers de pages ne dépend donc plus de sa taille.
+
+    Si l'arbre est incohérent (compteurs faux), l'accès se rabat sur
+    reader.pages.
+    """
+
+    def __init__(self, reader: "PyPDF2.PdfReader"):
+        self.reader = reader
+        self.root = reader.trailer["/Root"]["/Pages"].get_object()
+        self._length = None
+
+    def __len__(self) -> int:
+        if self._length is None:
+            count = self.root.get("/Count")
+            self._length = int(count) if count is not None else len(self.reader.pages)
+        return self._length
+
+    def _page(self, node: Any, reference: Any, inherit: Dict[str, Any]) -> "PyPDF2.PageObject":
+        """Objet page complété par les attributs hérités (comme reader.pages)"""
+        page = PyPDF2.PageObject(self.reader, reference)
+        page.update(node)
+        for name, value in inherit.items():
+            if name not in page:
+                page[PyPDF2.generic.NameObject(name)] = value
+        return page
+
+    def _select(
+        self, node: Any, offset: int, wanted: List[int], inherit: Dict[str, Any]
+    ) -> Iterator[Tuple[int, "PyPDF2.PageObject"]]:
+        """Pages d'indices `wanted` (triés, sans doublon) dans le sous-arbre `node`"""
+        inherit = {**inherit, **{name: node[name] for name in INHERITABLE_ATTRIBUTES if name in node}}
+        kids = node["/Kids"]
+        # Autant de pages que d'enfants : les enfants sont des feuilles, inutile de
+        # les lire pour connaître leur taille (cas des arbres « plats »)
+        leaves_only = node.get("/Count") == len(kids)
+
+        position = 0
+        start = offset
+        for reference in kids:
+            if position >= len(wanted):
+                return
+            kid = None
+            if leaves_only:
+                count = 1
+            else:
+                kid = reference.get_object()
+                count = int(kid.get("/Count", 0)) if _is_node(kid) else 1
+            end = start + count
+
+            if wanted[position] < end:
+                following = bisect_left(wanted, end, position)
+                kid = kid if kid is not None else reference.get_object()
+                if _is_node(kid):
+                    if leaves_only:
+                        raise _InconsistentTree()
+                    yield from self._select(kid, start, wanted[position:following], inherit)
+                else:
+                    if following - position != 1 or wanted[position] != start:
+                        raise _InconsistentTree()
+                    yield start, self._page(kid, reference, inherit)
+                position = following
+            start = end
+
+        if position < len(wanted):
+            raise _InconsistentTree()
+
+    def select(self, indices: Iterable[int]) -> Iterator[Tuple[int, "PyPDF2.PageObject"]]:
+        """
+        Renvoie (indice, page) pour les indices demandés (0-indexed), dans
+        l'ordre croissant et sans doublon, en ne lisant que les branches utiles.
+        """
+        # Un PageSet est déjà trié et sans doublon
+        wanted = list(indices) if isinstance(indices, PageSet) else sorted(set(indices))
+        total = len(self)
+        if wanted and (wanted[0] < 0 or wanted[-1] >= total):
+            page = wanted[0] if wanted[0] < 0 else wanted[-1]
+            raise ValueError(f"Page {page + 1} n'existe pas. Le document contient {total} pages.")
+        if not wanted:
+            return
+
+        produced = 0
+        try:
+            for index, page in self._select(self.root, 0, wanted, {}):
+                produced += 1
+                yield index, page
+        except (_InconsistentTree, KeyError, TypeError, ValueError, AttributeError):
+            # Repli : lecture complète de l'arbre par PyPDF2
+            pages = self.reader.pages
+            for index in wanted[produced:]:
+                yield index, pages[index]
+
+    def pages(self, indices: List[int]) -> List["PyPDF2.PageObject"]:
+        """Pages dans l'ordre demandé (les doublons sont autorisés)"""
+        loaded = dict(self.select(indices))
+        return [loaded[index] for index in indices]
+
@@ -1,53 +1,174 @@
 import os
 import re
-import PyPDF2
-import fitz  # PyMuPDF
-from PIL import Image
 import tempfile
 import base64
 import io
-from typing import List, Tuple, Dict, Optional, Union, Any
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Tuple, Dict, Optional, Union, Any
 
 from ..core.config import settings
 from ..core.security import secure_delete_file
+from ..core.metrics import time_stage, record_pages, PIPELINE_QUEUE
+from ..core.tracing import span
+from ..core.process_pool import get_executor, reset_process_pool
+from ..core.lazy_imports import lazy_import
+from ..core.supervisor import OperationAborted, check_cancelled
+from .page_tree import PageTree
+from .page_selection import PageSet, parse_page_selection, select_pages
+from .page_metadata import PageColumns
+from .render_utils import open_render_document
 
+# Bibliothèques lourdes, importées au premier usage
+PyPDF2 = lazy_import("PyPDF2")
+fitz = lazy_import("fitz")  # PyMuPDF
+Image = lazy_import("PIL.Image")
 
-def get_pdf_info(pdf_path: str) -> Dict[str, Any]:
+
+def page_has_text(page: "fitz.Page") -> bool:
+    """Indique si une page porte déjà une couche de texte exploitable"""
+    return len(page.get_text()) > 0
+
+
+# Dispositions de la description des pages dans get_pdf_info
+INFO_LAYOUTS = ("pages", "columns")
+
+
+def _page_range(total_pages: int, start_page: int, page_limit: Optional[int]) -> range:
+    """Indices (base 0) des pages d'une tranche de la description"""
+    if start_page < 1:
+        raise ValueError("start_page doit être supérieur ou égal à 1")
+    if page_limit is not None and page_limit < 1:
+        raise ValueError("page_limit doit être supérieur ou égal à 1")
+    stop = total_pages if page_limit is None else min(total_pages, start_page - 1 + page_limit)
+    return range(min(start_page - 1, total_pages), stop)
+
+
+def _document_info(pdf_path: str, doc: "fitz.Document") -> Dict[str, Any]:
+    return {
+        "filename": os.path.basename(pdf_path),
+        "total_pages": len(doc),
+        "file_size": os.path.getsize(pdf_path),
+        "encrypted": doc.is_encrypted,
+        "metadata": doc.metadata,
+    }
+
+
+def _page_info(doc: "fitz.Document", index: int) -> Dict[str, Any]:
+    page = doc[index]
+    rect = page.rect
+    return {
+        "page_number": index + 1,
+        "width": rect.width,
+        "height": rect.height,
+        "rotation": page.rotation,
+        "has_text": page_has_text(page)
+    }
+
+
+def _page_columns(doc: "fitz.Document", pages: range) -> PageColumns:
+    """Description des pages d'une tranche, rangée directement en colonnes"""
+    columns = PageColumns(first_page=pages.start + 1)
+    for i in pages:
+        check_cancelled()
+        page = doc[i]
+        rect = page.rect
+        columns.append(rect.width, rect.height, page.rotation, page_has_text(page))
+    return columns
+
+
+def get_pdf_info(
+    pdf_path: str, start_page: int = 1, page_limit: Optional[int] = None, layout: str = "pages"
+) -> Dict[str, Any]:
     """
     Récupère les informations de base d'un PDF
+    
+    Avec page_limit, seules les pages start_page à start_page + page_limit - 1
+    sont décrites ; next_start_page indique la tranche suivante (None à la fin).
+    
+    Avec layout="columns", les pages sont décrites sous la clé "columns" par
+    des colonnes compactes (voir PageColumns.to_json) plutôt qu'un objet par
+    page sous la clé "pages".
     """
+    if layout not in INFO_LAYOUTS:
+        raise ValueError(f"Disposition invalide. Valeurs acceptées: {', '.join(INFO_LAYOUTS)}")
     try:
-        doc = fitz.open(pdf_path)
+        with time_stage("parse"):
+            doc = fitz.open(pdf_path)
         
-        # Infos générales
-        info = {
-            "filename": os.path.basename(pdf_path),
-            "total_pages": len(doc),
-            "file_size": os.path.getsize(pdf_path),
-            "encrypted": doc.is_encrypted,
-            "metadata": doc.metadata,
-            "pages": []
-        }
-        
-        # Infos de pages
-        for i, page in enumerate(doc):
-            rect = page.rect
-            page_info = {
-                "page_number": i + 1,
-                "width": rect.width,
-                "height": rect.height,
-                "rotation": page.rotation,
-                "has_text": len(page.get_text()) > 0
-            }
-            info["pages"].append(page_info)
-            
-        doc.close()
-        return info
+        try:
+            # Infos générales
+            info = _document_info(pdf_path, doc)
+            pages = _page_range(info["total_pages"], start_page, page_limit)
+            if page_limit is not None:
+                info["start_page"] = start_page
+                info["page_limit"] = page_limit
+                info["next_start_page"] = pages.stop + 1 if pages.stop < info["total_pages"] else None
+            
+            # Infos de pages, collectées en colonnes ; les objets par page ne
+            # sont construits que si la réponse les demande
+            with time_stage("process"):
+                columns = _page_columns(doc, pages)
+                if layout == "columns":
+                    info["columns"] = columns.to_json()
+                else:
+                    info["pages"] = list(columns.pages())
+            
+            record_pages(len(pages))
+            return info
+        finally:
+            doc.close()
         
     except Exception as e:
+        if isinstance(e, OperationAborted):
+            raise
         raise ValueError(f"Erreur lors de l'analyse du PDF: {str(e)}")
 
 
+def pdf_info_stream(
+    pdf_path: str, start_page: int = 1, page_limit: Optional[int] = None
+) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """
+    Prépare la description d'un PDF page par page (NDJSON).
+
+    L'en-tête du document est lu immédiatement (ValueError en cas d'erreur) ;
+    les pages ne sont analysées qu'au fil de la consommation de l'itérateur,
+    sans jamais construire la liste complète.
+    Renvoie l'en-tête du document et l'itérateur des pages.
+    """
+    try:
+        with time_stage("parse"):
+            doc = fitz.open(pdf_path)
+        header = {"type": "document", **_document_info(pdf_path, doc)}
+        pages = _page_range(header["total_pages"], start_page, page_limit)
+    except Exception as e:
+        if "doc" in locals():
+            doc.close()
+        raise ValueError(f"Erreur lors de l'analyse du PDF: {str(e)}")
+    header["selected_pages"] = len(pages)
+
+    def records() -> Iterator[Dict[str, Any]]:
+        described = 0
+        try:
+            for i in pages:
+                check_cancelled()
+                yield {"type": "page", **_page_info(doc, i)}
+                described += 1
+        finally:
+            doc.close()
+            record_pages(described)
+
+    return header, records()
+
+
+def count_pages(pdf_path: str) -> int:
+    """Nombre de pages d'un PDF, lu dans l'arbre des pages sans charger les pages"""
+    with open(pdf_path, "rb") as file:
+        return len(PageTree(PyPDF2.PdfReader(file)))
+
+
 def merge_pdfs(pdf_paths: List[str], output_path: str) -> str:
     """
     Fusionne plusieurs PDF en un seul
@@ -55,10 +176,15 @@ def merge_pdfs(pdf_paths: List[str], output_path: str) -> str:
     merger = PyPDF2.PdfMerger()
     
     try:
-        for pdf_path in pdf_paths:
-            merger.append(pdf_path)
-            
-        merger.write(output_path)
+        with time_stage("process"):
+            for pdf_path in pdf_paths:
+                check_cancelled()
+                merger.append(pdf_path)
+        
+        record_pages(len(merger.pages))
+        
+        with time_stage("write"):
+            merger.write(output_path)
         merger.close()
         
         return output_path
@@ -66,6 +192,8 @@ def merge_pdfs(pdf_paths: List[str], output_path: str) -> str:
         merger.close()
         if os.path.exists(output_path):
             secure_delete_file(output_path)
+        if isinstance(e, OperationAborted):
+            raise
         raise ValueError(f"Erreur lors de la fusion: {str(e)}")
 
 
@@ -74,7 +202,8 @@ def split_pdf(pdf_path: str, output_dir: str, ranges: str = "all") -> List[str]:
     Divise un PDF selon des plages de pages
     ranges peut être:
     - "all" pour extraire chaque page individuellement
-    - une liste de plages comme "1-3,5,7-9"
+    - une sélection de pages comme "1-3,5,7-9" (voir page_selection),
+      un fichier étant produit par terme
     
     Retourne la liste des chemins des fichiers créés
     """
@@ -82,29 +211,32 @@ def split_pdf(pdf_path: str, output_dir: str, ranges: str = "all") -> List[str]:
     
     try:
         # Ouvrir le PDF source
-        with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
-            total_pages = len(reader.pages)
+        with open(pdf_path, "rb") as file, time_stage("process"):
+            tree = PageTree(PyPDF2.PdfReader(file))
+            total_pages = len(tree)
             
             # Si on doit diviser toutes les pages
             if ranges == "all":
-                # Créer un PDF par page
-                for i in range(total_pages):
+                # Créer un PDF par page (parcours unique de l'arbre des pages)
+                for i, page in tree.select(range(total_pages)):
+                    check_cancelled()
                     output_path = os.path.join(
                         output_dir, 
                         f"{os.path.splitext(os.path.basename(pdf_path))[0]}_page_{i+1}.pdf"
                     )
                     
                     writer = PyPDF2.PdfWriter()
-                    writer.add_page(reader.pages[i])
+                    writer.add_page(page)
                     
                     with open(output_path, "wb") as out_file:
                         writer.write(out_file)
                     
                     created_files.append(output_path)
+                
+                record_pages(total_pages)
             else:
-                # Traiter les plages spécifiées (ex: "1-3,5,7-9")
-                page_ranges = parse_page_ranges(ranges, total_pages)
+                # Un fichier par terme de la sélection (ex: "1-3,5,7-9", "1-:10,!odd")
+                page_ranges = parse_page_selection(ranges).groups(total_pages)
                 
                 for i, page_range in enumerate(page_ranges):
                     output_path = os.path.join(
@@ -113,14 +245,16 @@ def split_pdf(pdf_path: str, output_dir: str, ranges: str = "all") -> List[str]:
                     )
                     
                     writer = PyPDF2.PdfWriter()
-                    for page_num in page_range:
-                        # PyPDF2 est 0-indexed mais l'utilisateur entre des numéros 1-indexed
-                        writer.add_page(reader.pages[page_num - 1])
+                    # Seules les pages de la plage sont lues
+                    for _, page in tree.select(page_range):
+                        check_cancelled()
+                        writer.add_page(page)
                     
                     with open(output_path, "wb") as out_file:
                         writer.write(out_file)
                     
                     created_files.append(output_path)
+                    record_pages(len(page_range))
                 
         return created_files
         
@@ -128,30 +262,42 @@ def split_pdf(pdf_path: str, output_dir: str, ranges: str = "all") -> List[str]:
         # Supprimer les fichiers créés en cas d'erreur
         for file_path in created_files:
             secure_delete_file(file_path)
+        if isinstance(e, OperationAborted):
+            raise
         raise ValueError(f"Erreur lors de la division du PDF: {str(e)}")
 
 
-def extract_pages(pdf_path: str, output_path: str, pages: List[int]) -> str:
+def extract_pages(pdf_path: str, output_path: str, pages: Union[str, List[int]]) -> str:
     """
     Extrait certaines pages d'un PDF
-    Les numéros de pages sont 1-indexed
+    pages est une sélection de pages (ex: "1,3,5-7", "even"), résolue dans
+    ce processus, ou une liste de numéros de pages 1-indexed
+    
+    Seules les pages demandées et les objets qu'elles utilisent sont lus :
+    le coût ne dépend pas de la taille du document.
     """
     try:
         with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
+            tree = PageTree(PyPDF2.PdfReader(file))
             writer = PyPDF2.PdfWriter()
             
-            total_pages = len(reader.pages)
+            if isinstance(pages, str):
+                indices = select_pages(pages, len(tree))
+                selected = (page for _, page in tree.select(indices))
+                count = len(indices)
+            else:
+                # PyPDF2 est 0-indexed (les pages inexistantes sont signalées par PageTree)
+                selected = tree.pages([page_num - 1 for page_num in pages])
+                count = len(pages)
             
-            # Vérifier si les pages demandées existent
-            for page_num in pages:
-                if page_num < 1 or page_num > total_pages:
-                    raise ValueError(f"Page {page_num} n'existe pas. Le document contient {total_pages} pages.")
-                
-                # PyPDF2 est 0-indexed
-                writer.add_page(reader.pages[page_num - 1])
+            with time_stage("process"):
+                for page in selected:
+                    check_cancelled()
+                    writer.add_page(page)
             
-            with open(output_path, "wb") as out_file:
+            record_pages(count)
+            
+            with time_stage("write"), open(output_path, "wb") as out_file:
                 writer.write(out_file)
             
             return output_path
@@ -159,33 +305,42 @@ def extract_pages(pdf_path: str, output_path: str, pages: List[int]) -> str:
     except Exception as e:
         if os.path.exists(output_path):
             secure_delete_file(output_path)
+        if isinstance(e, OperationAborted):
+            raise
         raise ValueError(f"Erreur lors de l'extraction des pages: {str(e)}")
 
 
-def remove_pages(pdf_path: str, output_path: str, pages_to_remove: List[int]) -> str:
+def remove_pages(pdf_path: str, output_path: str, pages_to_remove: Union[str, List[int]]) -> str:
     """
     Supprime certaines pages d'un PDF
-    Les numéros de pages sont 1-indexed
+    pages_to_remove est une sélection de pages (ex: "1,3,5-7", "even") ou
+    une liste de numéros de pages 1-indexed
     """
     try:
         with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
+            tree = PageTree(PyPDF2.PdfReader(file))
             writer = PyPDF2.PdfWriter()
             
-            total_pages = len(reader.pages)
+            total_pages = len(tree)
             
             # Vérifier si les pages demandées existent
-            for page_num in pages_to_remove:
-                if page_num < 1 or page_num > total_pages:
-                    raise ValueError(f"Page {page_num} n'existe pas. Le document contient {total_pages} pages.")
+            if isinstance(pages_to_remove, str):
+                removed = select_pages(pages_to_remove, total_pages)
+            else:
+                for page_num in pages_to_remove:
+                    if page_num < 1 or page_num > total_pages:
+                        raise ValueError(f"Page {page_num} n'existe pas. Le document contient {total_pages} pages.")
+                removed = PageSet.from_indices(page_num - 1 for page_num in pages_to_remove)
             
             # Ajouter toutes les pages SAUF celles à supprimer
-            for i in range(total_pages):
-                page_num = i + 1  # 1-indexed pour la comparaison
-                if page_num not in pages_to_remove:
-                    writer.add_page(reader.pages[i])
+            with time_stage("process"):
+                for _, page in tree.select(removed.complement(total_pages)):
+                    check_cancelled()
+                    writer.add_page(page)
+            
+            record_pages(total_pages)
             
-            with open(output_path, "wb") as out_file:
+            with time_stage("write"), open(output_path, "wb") as out_file:
                 writer.write(out_file)
             
             return output_path
@@ -193,6 +348,8 @@ def remove_pages(pdf_path: str, output_path: str, pages_to_remove: List[int]) ->
     except Exception as e:
         if os.path.exists(output_path):
             secure_delete_file(output_path)
+        if isinstance(e, OperationAborted):
+            raise
         raise ValueError(f"Erreur lors de la suppression des pages: {str(e)}")
 
 
@@ -217,11 +374,15 @@ def reorder_pages(pdf_path: str, output_path: str, new_order: List[int]) -> str:
                     raise ValueError(f"Page {page_num} n'existe pas. Le document contient {total_pages} pages.")
             
             # Ajouter les pages dans le nouvel ordre
-            for page_num in new_order:
-                # PyPDF2 est 0-indexed
-                writer.add_page(reader.pages[page_num - 1])
+            with time_stage("process"):
+                for page_num in new_order:
+                    check_cancelled()
+                    # PyPDF2 est 0-indexed
+                    writer.add_page(reader.pages[page_num - 1])
             
-            with open(output_path, "wb") as out_file:
+            record_pages(total_pages)
+            
+            with time_stage("write"), open(output_path, "wb") as out_file:
                 writer.write(out_file)
             
             return output_path
@@ -229,9 +390,73 @@ def reorder_pages(pdf_path: str, output_path: str, new_order: List[int]) -> str:
     except Exception as e:
         if os.path.exists(output_path):
             secure_delete_file(output_path)
+        if isinstance(e, OperationAborted):
+            raise
         raise ValueError(f"Erreur lors de la réorganisation des pages: {str(e)}")
 
 
+def decode_signature(signature_path: Optional[str] = None, signature_data: Optional[str] = None) -> bytes:
+    """
+    Décode l'image de signature (fichier ou données base64) et la renvoie en PNG,
+    prête à être insérée par PyMuPDF.
+    """
+    if not signature_path and not signature_data:
+        raise ValueError("Vous devez fournir soit un fichier signature, soit des données base64")
+
+    with span("decode_signature"):
+        if signature_path:
+            img = Image.open(signature_path)
+        else:
+            # Décoder les données base64
+            binary_data = base64.b64decode(signature_data.split(',')[1] if ',' in signature_data else signature_data)
+            img = Image.open(io.BytesIO(binary_data))
+
+        # Convertir en PNG pour PyMuPDF
+        img_bytes = io.BytesIO()
+        img.save(img_bytes, format="PNG")
+        return img_bytes.getvalue()
+
+
+def signature_rect(page: "fitz.Page", position: Dict[str, float]) -> "fitz.Rect":
+    """
+    Rectangle (en points PDF) d'une signature positionnée en pourcentage de la
+    taille de la page, (x, y) désignant le centre de la signature.
+    """
+    page_width = page.rect.width
+    page_height = page.rect.height
+
+    sig_width = position["width"] * page_width / 100
+    sig_height = position["height"] * page_height / 100
+
+    center_x = position["x"] * page_width / 100
+    center_y = position["y"] * page_height / 100
+
+    return fitz.Rect(
+        center_x - (sig_width / 2),
+        center_y - (sig_height / 2),
+        center_x + (sig_width / 2),
+        center_y + (sig_height / 2),
+    )
+
+
+def insert_signatures(doc: "fitz.Document", signature: bytes, placements: List[Dict[str, float]]) -> None:
+    """
+    Insère la signature à chaque emplacement. L'image n'est stockée qu'une fois
+    dans le document : les emplacements suivants référencent le même XObject.
+    """
+    xref = 0
+    for position in placements:
+        page_num = position.get("page", 1) - 1  # Convertir en 0-indexed
+        if page_num < 0 or page_num >= len(doc):
+            raise ValueError(f"Page {page_num+1} n'existe pas. Le document contient {len(doc)} pages.")
+        page = doc[page_num]
+        rect = signature_rect(page, position)
+        if xref:
+            page.insert_image(rect, xref=xref)
+        else:
+            xref = page.insert_image(rect, stream=signature)
+
+
 def add_signature(
     pdf_path: str, 
     output_path: str, 
@@ -248,63 +473,25 @@ def add_signature(
     avec l'origine au coin supérieur gauche.
     """
     try:
-        if not signature_path and not signature_data:
-            raise ValueError("Vous devez fournir soit un fichier signature, soit des données base64")
-            
         if not position:
             raise ValueError("La position de la signature est requise")
             
-        # Ouvrir le document PDF
-        doc = fitz.open(pdf_path)
-        
         # Préparer l'image de signature
-        if signature_path:
-            img = Image.open(signature_path)
-        else:
-            # Décoder les données base64
-            binary_data = base64.b64decode(signature_data.split(',')[1] if ',' in signature_data else signature_data)
-            img = Image.open(io.BytesIO(binary_data))
+        signature = decode_signature(signature_path, signature_data)
         
-        # Convertir en PNG pour PyMuPDF
-        img_bytes = io.BytesIO()
-        img.save(img_bytes, format="PNG")
-        img_bytes.seek(0)
-        
-        # Page où insérer la signature (1-indexed)
-        page_num = position.get("page", 1) - 1  # Convertir en 0-indexed
-        if page_num < 0 or page_num >= len(doc):
-            raise ValueError(f"Page {page_num+1} n'existe pas. Le document contient {len(doc)} pages.")
-            
-        page = doc[page_num]
-        
-        # Calculer les dimensions et position réelles en points PDF (1/72 inch)
-        page_width = page.rect.width
-        page_height = page.rect.height
-        
-        # Les coordonnées x, y dans la position représentent le centre de la signature
-        # dans l'interface utilisateur, en pourcentage de la taille de page
-        sig_width = position["width"] * page_width / 100
-        sig_height = position["height"] * page_height / 100
-        
-        # Position centrale de la signature (en points)
-        center_x = position["x"] * page_width / 100
-        center_y = position["y"] * page_height / 100
-        
-        # Calculer le rectangle en coordonnées PDF
-        # En tenant compte que le point (x, y) est le centre de la signature
-        x0 = center_x - (sig_width / 2)
-        y0 = center_y - (sig_height / 2)
-        x1 = center_x + (sig_width / 2)
-        y1 = center_y + (sig_height / 2)
-        
-        # Créer un rectangle pour la position de la signature
-        rect = fitz.Rect(x0, y0, x1, y1)
+        # Ouvrir le document PDF
+        with time_stage("parse"):
+            doc = fitz.open(pdf_path)
         
         # Insérer l'image
-        page.insert_image(rect, stream=img_bytes.getvalue())
+        with time_stage("process"):
+            insert_signatures(doc, signature, [position])
+        
+        record_pages(1)
         
         # Sauvegarder
-        doc.save(output_path)
+        with time_stage("write"):
+            doc.save(output_path)
         doc.close()
         
         return output_path
@@ -315,10 +502,84 @@ def add_signature(
         raise ValueError(f"Erreur lors de l'ajout de la signature: {str(e)}")
 
 
-def compress_pdf(pdf_path: str, output_path: str, quality: str = "medium") -> str:
+def sign_document(pdf_path: str, output_path: str, signature: bytes, placements: List[Dict[str, float]]) -> int:
+    """
+    Signe un document à tous les emplacements demandés (tâche exécutable dans
+    un processus du pool). Renvoie le nombre de signatures insérées.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        insert_signatures(doc, signature, placements)
+        doc.save(output_path, garbage=1, deflate=True)
+    finally:
+        doc.close()
+    return len(placements)
+
+
+def sign_pdfs_batch(
+    documents: List[Tuple[str, str]],
+    signature: bytes,
+    placements: List[Dict[str, float]],
+    workers: Optional[int] = None,
+) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """
+    Signe plusieurs documents en parallèle avec la même signature (décodée une
+    seule fois) et les mêmes emplacements.
+
+    documents: liste de couples (chemin source, chemin de sortie).
+    Renvoie, dans l'ordre de fin de traitement, des triplets
+    (chemin source, chemin de sortie, message d'erreur ou None) : un document
+    en échec n'interrompt pas le lot.
+    """
+    if not placements:
+        raise ValueError("Au moins un emplacement de signature est requis")
+
+    if len(documents) == 1:
+        # Un seul document : pas de coût de démarrage des processus
+        pdf_path, output_path = documents[0]
+        try:
+            with time_stage("process"):
+                sign_document(pdf_path, output_path, signature, placements)
+            record_pages(len(placements))
+            yield pdf_path, output_path, None
+        except Exception as e:
+            yield pdf_path, output_path, str(e)
+        return
+
+    pool = get_executor("sign", workers or settings.SIGN_WORKERS)
+    futures = {}
+    try:
+        for pdf_path, output_path in documents:
+            future = pool.submit(sign_document, pdf_path, output_path, signature, placements)
+            futures[future] = (pdf_path, output_path)
+            PIPELINE_QUEUE.inc("sign")
+
+        for future in as_completed(futures):
+            check_cancelled()
+            pdf_path, output_path = futures.pop(future)
+            PIPELINE_QUEUE.dec("sign")
+            try:
+                record_pages(future.result())
+                yield pdf_path, output_path, None
+            except BrokenProcessPool:
+                reset_process_pool("sign")
+                raise
+            except Exception as e:
+                yield pdf_path, output_path, str(e)
+
+    finally:
+        # Abandon du lot (erreur ou client déconnecté) : annuler ce qui n'a pas démarré
+        for future in futures:
+            future.cancel()
+        PIPELINE_QUEUE.dec("sign", amount=len(futures))
+
+
+def compress_pdf(pdf_path: str, output_path: str, quality: str = "medium", backend: Optional[str] = None) -> str:
     """
     Compresse un PDF
     quality: low, medium, high
+    backend: moteur de rendu (défaut : render_backend() ; à déterminer par
+    l'appelant pour un processus supervisé, qui ne connaît pas ce choix)
     """
     try:
         # Paramètres de compression selon la qualité
@@ -335,109 +596,271 @@ def compress_pdf(pdf_path: str, output_path: str, quality: str = "medium") -> st
             zoom_factor = 0.9
             compression_quality = 90
             
-        # Ouvrir le document avec PyMuPDF
-        doc = fitz.open(pdf_path)
+        # Ouvrir le document avec le moteur de rendu retenu (PyMuPDF ou PDFium)
+        with time_stage("parse"):
+            source = open_render_document(pdf_path, backend)
         
         # Créer un nouveau document vide
         compressed_doc = fitz.open()
         
-        for page in doc:
-            # Créer une image de la page
-            pix = page.get_pixmap(matrix=fitz.Matrix(zoom_factor, zoom_factor))
-            
-            # Convertir en PIL Image
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Compresser l'image
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format="JPEG", quality=compression_quality, optimize=True)
-            img_bytes.seek(0)
-            
-            # Insérer l'image dans le nouveau document
-            new_page = compressed_doc.new_page(width=page.rect.width, height=page.rect.height)
-            new_page.insert_image(new_page.rect, stream=img_bytes.getvalue())
-        
-        # Sauvegarder
-        compressed_doc.save(output_path)
-        compressed_doc.close()
-        doc.close()
+        try:
+            with time_stage("process"):
+                for index in range(len(source)):
+                    check_cancelled()
+                    # Créer une image de la page
+                    with span("render", page=index + 1, backend=source.backend):
+                        img = source.render(index, zoom_factor)
+                    
+                    # Compresser l'image
+                    with span("jpeg_encode", page=index + 1):
+                        img_bytes = io.BytesIO()
+                        img.save(img_bytes, format="JPEG", quality=compression_quality, optimize=True)
+                        img_bytes.seek(0)
+                    
+                    # Insérer l'image dans le nouveau document
+                    with span("insert_image", page=index + 1):
+                        width, height = source.page_size(index)
+                        new_page = compressed_doc.new_page(width=width, height=height)
+                        new_page.insert_image(new_page.rect, stream=img_bytes.getvalue())
+            
+            record_pages(len(source))
+            
+            # Sauvegarder
+            with time_stage("write"):
+                compressed_doc.save(output_path)
+        finally:
+            compressed_doc.close()
+            source.close()
         
         return output_path
         
     except Exception as e:
         if os.path.exists(output_path):
             secure_delete_file(output_path)
+        if isinstance(e, OperationAborted):
+            raise
         raise ValueError(f"Erreur lors de la compression: {str(e)}")
 
 
-def images_to_pdf(image_paths: List[str], output_path: str) -> str:
+# Formats d'image des miniatures (format PIL, type MIME)
+THUMBNAIL_FORMATS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+
+def page_thumbnail(
+    pdf_path: str, page_number: int = 1, width: int = 150, image_format: str = "png", backend: Optional[str] = None
+) -> bytes:
+    """
+    Miniature d'une page, de width pixels de large, rendue par le moteur de
+    rendu retenu (PyMuPDF ou PDFium ; backend comme pour compress_pdf)
+    """
+    try:
+        with time_stage("parse"):
+            document = open_render_document(pdf_path, backend)
+        try:
+            if not 1 <= page_number <= len(document):
+                raise ValueError(f"Page {page_number} n'existe pas. Le document contient {len(document)} pages.")
+            page_width, _ = document.page_size(page_number - 1)
+            with time_stage("process"):
+                image = document.render(page_number - 1, width / page_width)
+                output = io.BytesIO()
+                pil_format = THUMBNAIL_FORMATS[image_format][0]
+                if pil_format == "JPEG":
+                    image.save(output, format=pil_format, quality=80)
+                else:
+                    image.save(output, format=pil_format)
+            record_pages(1)
+            return output.getvalue()
+        finally:
+            document.close()
+    except Exception as e:
+        if isinstance(e, OperationAborted):
+            raise
+        raise ValueError(f"Erreur lors de la création de la miniature: {str(e)}")
+
+
+# Formats que PyMuPDF sait intégrer sans réencodage par PIL (et modes de couleur acceptés)
+# JPEG / JPEG2000 sont insérés tels quels (DCTDecode / JPXDecode)
+NATIVE_IMAGE_FORMATS = {
+    "JPEG": {"RGB", "L"},
+    "JPEG2000": {"RGB", "L"},
+    "PNG": {"RGB", "L", "RGBA", "LA", "P"},
+}
+
+# Résolution supposée quand l'image ne fournit pas de métadonnées DPI (1 pixel = 1 point)
+DEFAULT_IMAGE_DPI = 72
+
+
+def _image_dpi(img: "Image.Image") -> Tuple[float, float]:
+    """Résolution horizontale et verticale déclarée par l'image"""
+    dpi = img.info.get("dpi")
+    try:
+        x_dpi, y_dpi = float(dpi[0]), float(dpi[1])
+    except (TypeError, ValueError, IndexError):
+        return DEFAULT_IMAGE_DPI, DEFAULT_IMAGE_DPI
+    # Ignorer les valeurs absurdes (certains appareils écrivent 0 ou 1)
+    if not (10 <= x_dpi <= 10000 and 10 <= y_dpi <= 10000):
+        return DEFAULT_IMAGE_DPI, DEFAULT_IMAGE_DPI
+    return x_dpi, y_dpi
+
+
+def image_frame_count(img_path: str) -> int:
+    """Nombre d'images contenues dans le fichier (TIFF/GIF multipages)"""
+    with Image.open(img_path) as img:
+        return getattr(img, "n_frames", 1)
+
+
+def prepare_image_for_pdf(img_path: str, frame: int = 0, target_dpi: Optional[int] = None) -> Tuple[bytes, float, float]:
+    """
+    Prépare une image (ou une image d'un fichier multipages) pour son insertion dans un PDF.
+    Renvoie (données à insérer, largeur en points, hauteur en points).
+    
+    Les formats intégrables nativement sont transmis tels quels ; les autres
+    sont transcodés en PNG (sans perte) après conversion en RGB.
+    Si target_dpi est fourni, les images de résolution supérieure sont sous-échantillonnées
+    (la taille physique de la page est conservée).
+    """
+    with Image.open(img_path) as img:
+        if frame:
+            img.seek(frame)
+        
+        # Image.open ne lit que l'en-tête : format, mode, dimensions et DPI
+        width_px, height_px = img.size
+        x_dpi, y_dpi = _image_dpi(img)
+        page_width, page_height = width_px * 72 / x_dpi, height_px * 72 / y_dpi
+        
+        downsample = bool(target_dpi) and max(x_dpi, y_dpi) > target_dpi
+        multi_frame = getattr(img, "n_frames", 1) > 1
+        native = img.mode in NATIVE_IMAGE_FORMATS.get(img.format, ()) and not multi_frame
+        
+        if native and not downsample:
+            with open(img_path, "rb") as f:
+                return f.read(), page_width, page_height
+        
+        with span("transcode_image", format=img.format or "unknown"):
+            source_format = img.format
+            if downsample:
+                scale = target_dpi / max(x_dpi, y_dpi)
+                size = (max(1, round(width_px * scale)), max(1, round(height_px * scale)))
+                # Pour le JPEG, décoder directement à échelle réduite
+                if source_format == "JPEG":
+                    img.draft("RGB", size)
+                converted = img.convert("RGB").resize(size, Image.LANCZOS)
+            else:
+                # Convertir au format RGB si nécessaire (pour CMYK, etc.)
+                converted = img.convert("RGB") if img.mode != "RGB" else img
+            
+            img_bytes = io.BytesIO()
+            if source_format == "JPEG":
+                # Une photo reste en JPEG : un PNG serait bien plus volumineux
+                converted.save(img_bytes, format="JPEG", quality=90)
+            else:
+                converted.save(img_bytes, format="PNG")
+            return img_bytes.getvalue(), page_width, page_height
+
+
+def images_to_pdf(
+    image_paths: List[str],
+    output_path: str,
+    target_dpi: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> str:
     """
     Convertit une liste d'images en un seul PDF
+    La taille des pages est déduite de la résolution (DPI) des images.
+    
+    Les images (et toutes les pages des TIFF/GIF multipages) sont décodées en
+    parallèle avec une file de préchargement bornée, puis ajoutées dans l'ordre.
+    Le document est vidé sur disque par sauvegardes incrémentales toutes les
+    IMAGE_FLUSH_PAGES pages pour borner la mémoire.
     """
+    workers = workers or settings.IMAGE_WORKERS or os.cpu_count() or 1
+    prefetch = max(1, settings.IMAGE_PREFETCH or 2 * workers)
+    flush_every = max(1, settings.IMAGE_FLUSH_PAGES)
+    
+    pdf = None
+    pending = deque()
     try:
+        # Une tâche par image à insérer (chaque page d'un fichier multipages)
+        tasks = iter([
+            (img_path, frame)
+            for img_path in image_paths
+            for frame in range(image_frame_count(img_path))
+        ])
+        
         # Créer un nouveau document PDF
         pdf = fitz.open()
+        total_pages = 0
+        pages_in_memory = 0
+        saved = False
         
-        for img_path in image_paths:
-            # Ouvrir l'image avec PIL
-            img = Image.open(img_path)
-            
-            # Convertir au format RGB si nécessaire (pour CMYK, etc.)
-            if img.mode != "RGB":
-                img = img.convert("RGB")
+        pending = deque()
+        with time_stage("process"), ThreadPoolExecutor(max_workers=workers) as executor:
+            def submit_next() -> None:
+                task = next(tasks, None)
+                if task is not None:
+                    # Propager le contexte (trace) aux threads du pool
+                    context = contextvars.copy_context()
+                    pending.append(executor.submit(context.run, prepare_image_for_pdf, *task, target_dpi))
+                    PIPELINE_QUEUE.inc("images_to_pdf")
+            
+            for _ in range(prefetch):
+                submit_next()
+            
+            while pending:
+                check_cancelled()
+                # Les résultats sont consommés dans l'ordre de soumission
+                with span("decode_image"):
+                    data, width, height = pending.popleft().result()
+                PIPELINE_QUEUE.dec("images_to_pdf")
+                submit_next()
                 
-            # Obtenir les dimensions
-            width, height = img.size
-            
-            # Ajouter une nouvelle page au PDF
-            page = pdf.new_page(width=width, height=height)
-            
-            # Convertir l'image en bytes
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format="PNG")
-            img_bytes.seek(0)
-            
-            # Insérer l'image dans la page
-            page.insert_image(page.rect, stream=img_bytes.getvalue())
+                # Ajouter une nouvelle page au PDF
+                page = pdf.new_page(width=width, height=height)
+                
+                # Insérer l'image dans la page
+                with span("insert_image"):
+                    page.insert_image(page.rect, stream=data)
+                del data
+                total_pages += 1
+                pages_in_memory += 1
+                
+                # Vider le document sur disque pour libérer les images insérées
+                if pages_in_memory >= flush_every:
+                    with span("flush"):
+                        if saved:
+                            pdf.saveIncr()
+                        else:
+                            pdf.save(output_path)
+                            saved = True
+                        pdf.close()
+                        pdf = fitz.open(output_path)
+                    pages_in_memory = 0
+        
+        record_pages(total_pages)
         
         # Sauvegarder
-        pdf.save(output_path)
+        with time_stage("write"):
+            if saved:
+                if pages_in_memory:
+                    pdf.saveIncr()
+            else:
+                pdf.save(output_path)
         pdf.close()
         
         return output_path
         
     except Exception as e:
+        # Abandonner les décodages encore en file
+        for future in pending:
+            future.cancel()
+        PIPELINE_QUEUE.dec("images_to_pdf", amount=len(pending))
+        if pdf is not None and not pdf.is_closed:
+            pdf.close()
         if os.path.exists(output_path):
             secure_delete_file(output_path)
+        if isinstance(e, OperationAborted):
+            raise
         raise ValueError(f"Erreur lors de la conversion d'images en PDF: {str(e)}")
-
-
-def parse_page_ranges(ranges_str: str, max_pages: int) -> List[List[int]]:
-    """
-    Convertit une chaîne de plages de pages en listes de numéros de pages
-    Ex: "1-3,5,7-9" -> [[1,2,3], [5], [7,8,9]]
-    """
-    result = []
-    
-    # Diviser par les virgules
-    for part in ranges_str.split(','):
-        part = part.strip()
-        
-        if '-' in part:
-            # C'est une plage (ex: 1-3)
-            start, end = map(int, part.split('-'))
-            
-            if start < 1:
-                start = 1
-            if end > max_pages:
-                end = max_pages
-                
-            if start <= end:
-                result.append(list(range(start, end + 1)))
-        else:
-            # C'est un numéro unique
-            page = int(part)
-            if 1 <= page <= max_pages:
-                result.append([page])
-    
-    return result
@@ -0,0 +1,317 @@
+import logging
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..core.config import settings
+from ..core.lazy_imports import lazy_import, module_available
+
+# Bibliothèques lourdes, importées au premier usage
+fitz = lazy_import("fitz")  # PyMuPDF
+pdfium = lazy_import("pypdfium2")
+Image = lazy_import("PIL.Image")
+ImageChops = lazy_import("PIL.ImageChops")
+ImageStat = lazy_import("PIL.ImageStat")
+
+logger = logging.getLogger(__name__)
+
+# Moteurs de rendu et module requis par chacun
+RENDER_BACKENDS = {
+    "pymupdf": "fitz",
+    "pypdfium2": "pypdfium2",
+}
+DEFAULT_RENDER_BACKEND = "pymupdf"
+
+# PDFium ne peut pas être appelé depuis plusieurs threads à la fois
+_pdfium_lock = threading.RLock()
+
+
+def pixel_size(points: float, scale: float) -> int:
+    """Taille en pixels d'une longueur en points rendue à l'échelle scale"""
+    # Même arrondi que PyMuPDF (au pixel supérieur, à la tolérance près)
+    return max(1, math.ceil(points * scale - 1e-3))
+
+
+def _fit(image: "Image.Image", size: Tuple[int, int]) -> "Image.Image":
+    """Ramène l'image à la taille attendue (écart d'un pixel dû aux arrondis)"""
+    if image.size == size:
+        return image
+    fitted = Image.new(image.mode, size, 255 if image.mode == "L" else (255, 255, 255))
+    fitted.paste(image.crop((0, 0, min(image.width, size[0]), min(image.height, size[1]))))
+    return fitted
+
+
+class RenderDocument:
+    """
+    Document ouvert pour le rendu de ses pages.
+
+    Quel que soit le moteur, une page est rendue avec sa rotation, dans sa
+    zone visible (CropBox), annotations et champs de formulaire compris, sur
+    fond blanc ; l'image (RGB ou L) a exactement pixel_size(largeur, scale) ×
+    pixel_size(hauteur, scale) pixels.
+    """
+    backend = ""
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def page_size(self, index: int) -> Tuple[float, float]:
+        """Largeur et hauteur affichées de la page (en points, rotation appliquée)"""
+        raise NotImplementedError
+
+    def render(self, index: int, scale: float, grayscale: bool = False) -> "Image.Image":
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self) -> "RenderDocument":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class PyMuPDFDocument(RenderDocument):
+    backend = "pymupdf"
+
+    def __init__(self, pdf_path: str):
+        self._doc = fitz.open(pdf_path)
+
+    def __len__(self) -> int:
+        return len(self._doc)
+
+    def page_size(self, index: int) -> Tuple[float, float]:
+        rect = self._doc[index].rect
+        return rect.width, rect.height
+
+    def render(self, index: int, scale: float, grayscale: bool = False) -> "Image.Image":
+        colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+        pix = self._doc[index].get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=colorspace, alpha=False)
+        return Image.frombytes("L" if grayscale else "RGB", (pix.width, pix.height), pix.samples)
+
+    def close(self) -> None:
+        self._doc.close()
+
+
+class PdfiumDocument(RenderDocument):
+    """
+    Rendu par PDFium. Les appels sont sérialisés par un verrou global : dans
+    un même processus, un seul rendu PDFium à la fois (les processus du pool
+    OCR rendent, eux, en parallèle).
+    """
+    backend = "pypdfium2"
+
+    def __init__(self, pdf_path: str):
+        with _pdfium_lock:
+            self._doc = pdfium.PdfDocument(pdf_path)
+            # Nécessaire pour dessiner les champs de formulaire, comme PyMuPDF
+            self._doc.init_forms()
+
+    def __len__(self) -> int:
+        return len(self._doc)
+
+    def page_size(self, index: int) -> Tuple[float, float]:
+        with _pdfium_lock:
+            page = self._doc[index]
+            try:
+                return page.get_size()
+            finally:
+                page.close()
+
+    def render(self, index: int, scale: float, grayscale: bool = False) -> "Image.Image":
+        with _pdfium_lock:
+            page = self._doc[index]
+            try:
+                width, height = page.get_size()
+                bitmap = page.render(scale=scale, grayscale=grayscale)
+                image = bitmap.to_pil()
+                if image.mode == "L":
+                    # L'image partage alors la mémoire du bitmap, libérée avec lui
+                    image = image.copy()
+                elif image.mode != "RGB":
+                    image = image.convert("RGB")
+                bitmap.close()
+            finally:
+                page.close()
+        return _fit(image, (pixel_size(width, scale), pixel_size(height, scale)))
+
+    def close(self) -> None:
+        with _pdfium_lock:
+            self._doc.close()
+
+
+_DOCUMENT_CLASSES = {
+    "pymupdf": PyMuPDFDocument,
+    "pypdfium2": PdfiumDocument,
+}
+
+
+def available_backends() -> List[str]:
+    """Moteurs de rendu dont la bibliothèque est installée"""
+    return [name for name, module in RENDER_BACKENDS.items() if module_available(module)]
+
+
+def open_render_document(pdf_path: str, backend: Optional[str] = None) -> RenderDocument:
+    """Ouvre un PDF pour le rendu avec le moteur indiqué (défaut : render_backend())"""
+    backend = backend or render_backend()
+    if backend not in _DOCUMENT_CLASSES:
+        raise ValueError(f"Moteur de rendu inconnu: {backend}")
+    return _DOCUMENT_CLASSES[backend](pdf_path)
+
+
+# --- Mesures et choix du moteur --------------------------------------------
+
+def _write_sample_pdf(path: str) -> None:
+    """Page de test : texte, tracés vectoriels et image, comme un document courant"""
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for line in range(40):
+        page.insert_text((50, 60 + line * 18), f"Ligne {line + 1} : texte de test pour la mesure du rendu", fontsize=11)
+    for step in range(20):
+        page.draw_rect(fitz.Rect(300 + step * 8, 400 + step * 8, 500, 600), color=(0, 0, step / 20), width=0.5)
+    image = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 256, 256), False)
+    image.set_rect(image.irect, (200, 120, 40))
+    page.insert_image(fitz.Rect(50, 780 - 150, 200, 780), pixmap=image)
+    doc.save(path)
+    doc.close()
+
+
+def _page_indices(length: int, max_pages: Optional[int]) -> range:
+    return range(length if max_pages is None else min(length, max_pages))
+
+
+def benchmark_renderers(
+    pdf_paths: Iterable[str],
+    scale: float = 2.0,
+    max_pages: Optional[int] = None,
+    backends: Optional[List[str]] = None,
+    grayscale: bool = False,
+    compare: bool = True,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare les moteurs de rendu sur un ensemble de PDF (les max_pages
+    premières pages de chacun, à l'échelle scale).
+
+    Pour chaque moteur : pages rendues, durée, pages par seconde. Avec compare,
+    l'écart moyen (niveaux de gris, 0-255) de chaque moteur avec le premier est
+    mesuré en dehors du temps chronométré.
+    """
+    pdf_paths = list(pdf_paths)
+    backends = backends or available_backends()
+    results: Dict[str, Dict[str, Any]] = {}
+    for backend in backends:
+        pages = 0
+        seconds = 0.0
+        for pdf_path in pdf_paths:
+            with open_render_document(pdf_path, backend) as document:
+                indices = _page_indices(len(document), max_pages)
+                # Premier rendu hors mesure : chargement des polices, caches
+                if len(indices):
+                    document.render(indices[0], scale, grayscale)
+                start = time.perf_counter()
+                for index in indices:
+                    document.render(index, scale, grayscale)
+                seconds += time.perf_counter() - start
+                pages += len(indices)
+        results[backend] = {
+            "pages": pages,
+            "seconds": round(seconds, 4),
+            "pages_per_second": round(pages / seconds, 2) if seconds > 0 else None,
+        }
+
+    if compare and len(backends) > 1:
+        reference = backends[0]
+        for backend in backends[1:]:
+            differences = []
+            for pdf_path in pdf_paths:
+                with open_render_document(pdf_path, reference) as expected, \
+                        open_render_document(pdf_path, backend) as actual:
+                    for index in _page_indices(len(expected), max_pages):
+                        a = expected.render(index, scale, grayscale=True)
+                        b = actual.render(index, scale, grayscale=True)
+                        differences.append(ImageStat.Stat(ImageChops.difference(a, b)).mean[0])
+            results[backend]["mean_difference"] = (
+                round(sum(differences) / len(differences), 3) if differences else None
+            )
+    return results
+
+
+_selected: Optional[str] = None
+_selection: Dict[str, Any] = {}
+_selection_lock = threading.Lock()
+
+
+def select_render_backend() -> str:
+    """
+    Détermine le moteur de rendu du processus d'après RENDER_BACKEND. En mode
+    "auto", les moteurs installés sont mesurés sur RENDER_BENCHMARK_FILE (ou
+    une page de test) et le plus rapide est retenu. Un moteur configuré mais
+    absent est remplacé par PyMuPDF.
+    """
+    global _selected
+    with _selection_lock:
+        if _selected is not None:
+            return _selected
+        start = time.perf_counter()
+        configured = settings.RENDER_BACKEND
+        available = available_backends()
+        results: Dict[str, Dict[str, Any]] = {}
+
+        if configured != "auto":
+            if configured not in RENDER_BACKENDS:
+                logger.error(f"Moteur de rendu inconnu: {configured}, utilisation de {DEFAULT_RENDER_BACKEND}")
+                selected = DEFAULT_RENDER_BACKEND
+            elif configured not in available:
+                logger.warning(f"Moteur de rendu {configured} non installé, utilisation de {DEFAULT_RENDER_BACKEND}")
+                selected = DEFAULT_RENDER_BACKEND
+            else:
+                selected = configured
+        elif len(available) < 2:
+            selected = available[0] if available else DEFAULT_RENDER_BACKEND
+        else:
+            sample_dir = None
+            try:
+                if settings.RENDER_BENCHMARK_FILE:
+                    samples = [settings.RENDER_BENCHMARK_FILE]
+                else:
+                    # La page de test est unique : elle est rendue plusieurs fois
+                    os.makedirs(settings.TEMP_DIR, exist_ok=True)
+                    sample_dir = tempfile.mkdtemp(dir=settings.TEMP_DIR)
+                    samples = [os.path.join(sample_dir, "render-benchmark.pdf")] * max(1, settings.RENDER_BENCHMARK_PAGES)
+                    _write_sample_pdf(samples[0])
+                results = benchmark_renderers(
+                    samples, max_pages=settings.RENDER_BENCHMARK_PAGES, backends=available, compare=False
+                )
+                selected = max(results, key=lambda name: results[name]["pages_per_second"] or 0)
+            except Exception as e:
+                logger.warning(f"Mesure des moteurs de rendu impossible: {str(e)}")
+                selected = DEFAULT_RENDER_BACKEND
+            finally:
+                if sample_dir is not None:
+                    shutil.rmtree(sample_dir, ignore_errors=True)
+
+        _selection.update({
+            "configured": configured,
+            "available": available,
+            "selected": selected,
+            "benchmark": results,
+            "seconds": round(time.perf_counter() - start, 4),
+        })
+        logger.info(f"Moteur de rendu: {selected} (configuré: {configured}, mesures: {results})")
+        _selected = selected
+        return selected
+
+
+def render_backend() -> str:
+    """Moteur de rendu du processus (déterminé au premier appel)"""
+    return _selected or select_render_backend()
+
+
+def render_backend_report() -> Dict[str, Any]:
+    """Moteur retenu et mesures ayant conduit à ce choix (vide tant qu'il n'est pas déterminé)"""
+    return dict(_selection)
@@ -0,0 +1,245 @@
+import re
+import sqlite3
+import threading
+import unicodedata
+from contextlib import closing, contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..core.config import settings
+from ..core.document_store import document_store
+from ..core.metrics import time_stage, record_pages, record_cache
+from ..core.tracing import span
+from ..core.shared_state import interprocess_lock
+from ..core.lazy_imports import lazy_import
+from ..core.supervisor import OperationAborted, check_cancelled
+
+fitz = lazy_import("fitz")  # PyMuPDF
+
+# Nom de l'index dans le dossier du document
+INDEX_FILENAME = "search.sqlite"
+
+# Version du format de l'index (à incrémenter si la tokenisation change)
+INDEX_VERSION = "1"
+
+_WORD = re.compile(r"\w+")
+
+_build_locks: Dict[str, threading.Lock] = {}
+_build_locks_guard = threading.Lock()
+
+
+def normalize(text: str) -> str:
+    """Minuscules et suppression des accents ("Été" -> "ete")"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(normalize(text))
+
+
+@contextmanager
+def _build_lock(document_id: str) -> Iterator[None]:
+    """Un seul constructeur d'index par document, y compris entre workers"""
+    with _build_locks_guard:
+        lock = _build_locks.setdefault(document_id, threading.Lock())
+    with lock, interprocess_lock(document_store.artifact_path(document_id, INDEX_FILENAME + ".lock")):
+        yield
+
+
+class SearchIndex:
+    """
+    Index inversé d'un document (terme -> page, position, boîte englobante),
+    stocké en SQLite à côté du document.
+
+    Les pages sont indexées dans l'ordre, par lots : une recherche peut donc
+    répondre à partir du début du document avant que l'index soit complet.
+    """
+
+    def __init__(self, document_id: str, pdf_path: str):
+        self.document_id = document_id
+        self.pdf_path = pdf_path
+        self.path = document_store.artifact_path(document_id, INDEX_FILENAME)
+        with _build_lock(document_id):
+            self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _init_schema(self) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT, page INTEGER, position INTEGER,
+                    x0 REAL, y0 REAL, x1 REAL, y1 REAL
+                );
+                CREATE INDEX IF NOT EXISTS postings_term ON postings (term, page);
+            """)
+            meta = dict(connection.execute("SELECT key, value FROM meta"))
+            if meta.get("version") != INDEX_VERSION:
+                # Index absent ou d'un format antérieur : repartir de zéro
+                doc = fitz.open(self.pdf_path)
+                total_pages = len(doc)
+                doc.close()
+                connection.execute("DELETE FROM postings")
+                connection.execute("DELETE FROM meta")
+                connection.executemany(
+                    "INSERT INTO meta (key, value) VALUES (?, ?)",
+                    [("version", INDEX_VERSION), ("total_pages", str(total_pages)), ("indexed_pages", "0")],
+                )
+
+    def state(self) -> Dict[str, int]:
+        """Nombre total de pages et nombre de pages déjà indexées"""
+        with closing(self._connect()) as connection:
+            meta = dict(connection.execute("SELECT key, value FROM meta"))
+        return {"total_pages": int(meta["total_pages"]), "indexed_pages": int(meta["indexed_pages"])}
+
+    def is_complete(self) -> bool:
+        state = self.state()
+        return state["indexed_pages"] >= state["total_pages"]
+
+    def index_next_batch(self, batch_pages: Optional[int] = None) -> int:
+        """
+        Indexe le lot de pages suivant et renvoie le nombre de pages indexées.
+        Un seul constructeur par document à la fois.
+        """
+        batch_pages = batch_pages or settings.SEARCH_INDEX_BATCH_PAGES
+        with _build_lock(self.document_id):
+            state = self.state()
+            start = state["indexed_pages"]
+            end = min(start + batch_pages, state["total_pages"])
+            if start >= end:
+                return 0
+
+            rows = []
+            with span("index_build", pages=end - start):
+                doc = fitz.open(self.pdf_path)
+                try:
+                    for page_index in range(start, end):
+                        check_cancelled()
+                        for position, word in enumerate(doc[page_index].get_text("words")):
+                            for term in tokenize(word[4]):
+                                rows.append((term, page_index, position, word[0], word[1], word[2], word[3]))
+                finally:
+                    doc.close()
+
+                with closing(self._connect()) as connection, connection:
+                    connection.executemany(
+                        "INSERT INTO postings (term, page, position, x0, y0, x1, y1) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                    connection.execute("UPDATE meta SET value = ? WHERE key = 'indexed_pages'", (str(end),))
+
+            record_pages(end - start)
+            return end - start
+
+    def build(self) -> None:
+        """Termine l'indexation du document"""
+        while self.index_next_batch():
+            pass
+
+    def matching_pages(self, terms: List[str], start: int, end: int, limit: int) -> List[int]:
+        """Pages de [start, end) contenant tous les termes (au plus limit pages)"""
+        placeholders = ",".join("?" * len(terms))
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT page FROM postings WHERE term IN ({placeholders}) AND page >= ? AND page < ? "
+                f"GROUP BY page HAVING COUNT(DISTINCT term) = ? ORDER BY page LIMIT ?",
+                (*terms, start, end, len(terms), limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def rects(self, terms: List[str], pages: List[int]) -> Dict[int, List[List[float]]]:
+        """Boîtes des mots correspondants, par page"""
+        result: Dict[int, List[List[float]]] = {page: [] for page in pages}
+        if not pages:
+            return result
+        term_placeholders = ",".join("?" * len(terms))
+        page_placeholders = ",".join("?" * len(pages))
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                f"SELECT DISTINCT page, position, x0, y0, x1, y1 FROM postings "
+                f"WHERE term IN ({term_placeholders}) AND page IN ({page_placeholders}) ORDER BY page, position",
+                (*terms, *pages),
+            ).fetchall()
+        for page, _, x0, y0, x1, y1 in rows:
+            result[page].append([round(x0, 2), round(y0, 2), round(x1, 2), round(y1, 2)])
+        return result
+
+
+def search_document(document_id: str, query: str, start_page: int = 1, limit: int = 20) -> Dict[str, Any]:
+    """
+    Recherche les pages contenant tous les termes de la requête (sans tenir compte
+    de la casse ni des accents) à partir de start_page (numérotée à partir de 1).
+
+    L'index est construit à la demande : seules les pages nécessaires pour
+    trouver limit pages correspondantes sont indexées avant de répondre.
+    next_page indique où reprendre la recherche (None si elle est terminée).
+
+    Lève FileNotFoundError si le document n'est pas stocké et ValueError si
+    l'identifiant ou la requête sont invalides.
+    """
+    pdf_path = document_store.path(document_id)
+    if pdf_path is None:
+        raise FileNotFoundError("Document introuvable ou expiré")
+
+    terms = sorted(set(tokenize(query)))
+    if not terms:
+        raise ValueError("La requête ne contient aucun terme")
+
+    try:
+        with time_stage("parse"):
+            index = SearchIndex(document_id, pdf_path)
+        record_cache("search_index", index.is_complete())
+
+        start = max(start_page - 1, 0)
+        with time_stage("process"):
+            while True:
+                state = index.state()
+                with span("index_query"):
+                    pages = index.matching_pages(terms, start, state["indexed_pages"], limit + 1)
+                if len(pages) > limit or state["indexed_pages"] >= state["total_pages"]:
+                    break
+                index.index_next_batch()
+
+            state = index.state()
+            complete = state["indexed_pages"] >= state["total_pages"]
+            hit_pages = pages[:limit]
+            rects = index.rects(terms, hit_pages)
+
+        if len(pages) > limit:
+            next_page = pages[limit] + 1
+        elif not complete:
+            next_page = state["indexed_pages"] + 1
+        else:
+            next_page = None
+
+        return {
+            "document_id": document_id,
+            "query": query,
+            "terms": terms,
+            "total_pages": state["total_pages"],
+            "indexed_pages": state["indexed_pages"],
+            "index_complete": complete,
+            "hits": [
+                {"page": page + 1, "count": len(rects[page]), "rects": rects[page]}
+                for page in hit_pages
+            ],
+            "next_page": next_page,
+        }
+
+    except Exception as e:
+        # Les erreurs de saisie (ValueError ci-dessus) sont distinguées des erreurs de traitement
+        if isinstance(e, OperationAborted):
+            raise
+        raise RuntimeError(f"Erreur lors de la recherche: {str(e)}")
+
+
+def complete_search_index(document_id: str) -> None:
+    """Termine l'indexation d'un document (tâche d'arrière-plan)"""
+    pdf_path = document_store.path(document_id)
+    if pdf_path is not None:
+        SearchIndex(document_id, pdf_path).build()
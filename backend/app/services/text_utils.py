@@ -0,0 +1,116 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from ..core.metrics import time_stage, record_pages
+from ..core.lazy_imports import lazy_import
+from ..core.supervisor import check_cancelled
+from .page_selection import select_pages
+
+fitz = lazy_import("fitz")  # PyMuPDF
+
+# Bibliothèques d'extraction disponibles
+TEXT_BACKENDS = ("pymupdf", "pdfplumber")
+
+
+def _pymupdf_pages(pdf_path: str, indices: Iterable[int], include_words: bool) -> Iterator[Dict[str, Any]]:
+    doc = fitz.open(pdf_path)
+    try:
+        for index in indices:
+            check_cancelled()
+            page = doc[index]
+            # Une seule analyse de la page pour le texte et les mots
+            textpage = page.get_textpage()
+            record = {
+                "type": "page",
+                "page": index + 1,
+                "width": page.rect.width,
+                "height": page.rect.height,
+                "text": page.get_text("text", textpage=textpage),
+            }
+            if include_words:
+                record["words"] = [
+                    [word[4], round(word[0], 2), round(word[1], 2), round(word[2], 2), round(word[3], 2)]
+                    for word in page.get_text("words", textpage=textpage)
+                ]
+            yield record
+    finally:
+        doc.close()
+
+
+def _pdfplumber_pages(pdf_path: str, indices: Iterable[int], include_words: bool) -> Iterator[Dict[str, Any]]:
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        for index in indices:
+            check_cancelled()
+            page = pdf.pages[index]
+            record = {
+                "type": "page",
+                "page": index + 1,
+                "width": float(page.width),
+                "height": float(page.height),
+                "text": page.extract_text() or "",
+            }
+            if include_words:
+                record["words"] = [
+                    [word["text"], round(float(word["x0"]), 2), round(float(word["top"]), 2),
+                     round(float(word["x1"]), 2), round(float(word["bottom"]), 2)]
+                    for word in page.extract_words()
+                ]
+            # Libérer les objets analysés de la page (sinon conservés jusqu'à la fermeture)
+            page.flush_cache()
+            yield record
+
+
+PAGE_EXTRACTORS: Dict[str, Callable[[str, Iterable[int], bool], Iterator[Dict[str, Any]]]] = {
+    "pymupdf": _pymupdf_pages,
+    "pdfplumber": _pdfplumber_pages,
+}
+
+
+def extract_text_stream(
+    pdf_path: str,
+    pages: Optional[str] = None,
+    include_words: bool = False,
+    backend: str = "pymupdf",
+) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """
+    Prépare l'extraction du texte page par page.
+
+    La sélection de pages est validée immédiatement (ValueError en cas d'erreur) ;
+    le texte n'est extrait qu'au fil de la consommation de l'itérateur renvoyé,
+    une page à la fois. Les mots sont décrits par [texte, x0, y0, x1, y1] en points,
+    origine en haut à gauche.
+    Renvoie l'en-tête du document et l'itérateur des pages.
+    """
+    if backend not in TEXT_BACKENDS:
+        raise ValueError(f"Moteur d'extraction inconnu: {backend}")
+
+    try:
+        with time_stage("parse"):
+            doc = fitz.open(pdf_path)
+            total_pages = len(doc)
+            doc.close()
+        indices = select_pages(pages, total_pages)
+    except Exception as e:
+        raise ValueError(f"Erreur lors de l'extraction du texte: {str(e)}")
+
+    if not indices:
+        raise ValueError("Aucune page valide sélectionnée")
+
+    header = {
+        "type": "document",
+        "total_pages": total_pages,
+        "selected_pages": len(indices),
+        "backend": backend,
+    }
+
+    def records() -> Iterator[Dict[str, Any]]:
+        extracted = 0
+        try:
+            for record in PAGE_EXTRACTORS[backend](pdf_path, indices, include_words):
+                extracted += 1
+                yield record
+        finally:
+            record_pages(extracted)
+
+    return header, records()
@@ -0,0 +1,381 @@
+import io
+import os
+import re
+import string
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.security import secure_delete_file
+from ..core.metrics import time_stage, record_pages
+from ..core.tracing import span
+from ..core.lazy_imports import lazy_import
+from ..core.supervisor import OperationAborted, check_cancelled
+from .page_selection import select_pages
+
+fitz = lazy_import("fitz")  # PyMuPDF
+Image = lazy_import("PIL.Image")
+
+# Positions possibles du filigrane et des libellés
+WATERMARK_POSITIONS = (
+    "center", "top-left", "top-center", "top-right",
+    "bottom-left", "bottom-center", "bottom-right",
+)
+
+# Champs disponibles dans le modèle de libellé par page
+LABEL_FIELDS = ("page", "total", "bates")
+
+# Noms de ressource du filigrane et de la police des libellés dans les pages
+WATERMARK_RESOURCE = "PdfReaderWM"
+LABEL_FONT_RESOURCE = "PdfReaderF"
+
+# Marge autour des éléments placés dans les coins (en points)
+MARGIN = 20
+
+_HEX_COLOR = re.compile(r"^#?([0-9a-fA-F]{6})$")
+
+
+def parse_color(color: str) -> Tuple[float, float, float]:
+    """Couleur "#RRGGBB" -> triplet RGB (0-1)"""
+    match = _HEX_COLOR.match(color or "")
+    if not match:
+        raise ValueError(f"Couleur invalide: {color} (format attendu: #RRGGBB)")
+    value = match.group(1)
+    return tuple(int(value[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def validate_label_template(template: str) -> None:
+    """Vérifie que le modèle de libellé n'utilise que les champs connus"""
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(template) if field is not None]
+    except ValueError as e:
+        raise ValueError(f"Modèle de libellé invalide: {str(e)}")
+    unknown = [field for field in fields if field not in LABEL_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"Champ inconnu dans le libellé: {', '.join(unknown)} "
+            f"(champs acceptés: {', '.join(LABEL_FIELDS)})"
+        )
+
+
+def build_stamp(
+    text: Optional[str] = None,
+    image_path: Optional[str] = None,
+    font_size: float = 48,
+    color: Tuple[float, float, float] = (0.5, 0.5, 0.5),
+    opacity: float = 0.3,
+) -> "fitz.Document":
+    """
+    Construit le filigrane sur une page dédiée, une seule fois par opération.
+    Cette page devient ensuite un Form XObject partagé par toutes les pages.
+    """
+    stamp = fitz.open()
+    if image_path:
+        with Image.open(image_path) as img:
+            img = img.convert("RGBA")
+            if opacity < 1:
+                # L'opacité est appliquée une fois au canal alpha de l'image
+                alpha = img.getchannel("A").point(lambda a: int(a * opacity))
+                img.putalpha(alpha)
+            buffer = io.BytesIO()
+            img.save(buffer, format="PNG")
+            width, height = img.size
+        page = stamp.new_page(width=width, height=height)
+        page.insert_image(page.rect, stream=buffer.getvalue())
+    else:
+        text_width = fitz.get_text_length(text, fontname="helv", fontsize=font_size)
+        page = stamp.new_page(width=text_width + font_size * 0.2, height=font_size * 1.3)
+        page.insert_text(
+            (font_size * 0.1, font_size),
+            text,
+            fontsize=font_size,
+            fontname="helv",
+            color=color,
+            fill_opacity=opacity,
+        )
+    return stamp
+
+
+def placement_rect(page_rect: "fitz.Rect", size: Tuple[float, float], position: str) -> "fitz.Rect":
+    """Rectangle (coordinates visibles de la page) d'un élément de taille donnée"""
+    width, height = size
+    if position == "center":
+        x0 = (page_rect.width - width) / 2
+        y0 = (page_rect.height - height) / 2
+    else:
+        vertical, horizontal = position.split("-")
+        x0 = {
+            "left": MARGIN,
+            "center": (page_rect.width - width) / 2,
+            "right": page_rect.width - width - MARGIN,
+        }[horizontal]
+        y0 = MARGIN if vertical == "top" else page_rect.height - height - MARGIN
+    return fitz.Rect(x0, y0, x0 + width, y0 + height)
+
+
+def visual_to_pdf(page: "fitz.Page") -> "fitz.Matrix":
+    """Coordonnées visibles (page tournée, origine en haut) -> espace PDF de la page"""
+    return page.derotation_matrix * ~page.transformation_matrix
+
+
+def form_matrix(to_pdf: "fitz.Matrix", stamp_rect: "fitz.Rect", rect: "fitz.Rect", rotation: float) -> "fitz.Matrix":
+    """
+    Matrice (espace PDF de la page) qui place le Form XObject du filigrane
+    dans `rect`, tourné de `rotation` degrés autour de son centre.
+    """
+    # Espace PDF du filigrane (origine en bas) -> espace MuPDF (origine en haut)
+    matrix = fitz.Matrix(1, 0, 0, -1, 0, stamp_rect.height)
+    # Mise à l'échelle et positionnement dans le rectangle visible
+    matrix *= fitz.Matrix(rect.width / stamp_rect.width, rect.height / stamp_rect.height)
+    matrix *= fitz.Matrix(1, 0, 0, 1, rect.x0, rect.y0)
+    if rotation:
+        center = (rect.tl + rect.br) / 2
+        matrix *= fitz.Matrix(1, 0, 0, 1, -center.x, -center.y)
+        matrix *= fitz.Matrix(-rotation)  # sens trigonométrique à l'écran
+        matrix *= fitz.Matrix(1, 0, 0, 1, center.x, center.y)
+    return matrix * to_pdf
+
+
+def text_matrix(to_pdf: "fitz.Matrix", baseline: "fitz.Point") -> "fitz.Matrix":
+    """Matrice de texte (Tm) pour écrire horizontalement, à l'endroit, depuis `baseline`"""
+    origin = baseline * to_pdf
+    right = fitz.Point(baseline.x + 1, baseline.y) * to_pdf - origin
+    up = fitz.Point(baseline.x, baseline.y - 1) * to_pdf - origin
+    return fitz.Matrix(right.x, right.y, up.x, up.y, origin.x, origin.y)
+
+
+def _pdf_matrix(matrix: "fitz.Matrix") -> str:
+    return f"{matrix.a:g} {matrix.b:g} {matrix.c:g} {matrix.d:g} {matrix.e:g} {matrix.f:g}"
+
+
+class PageTarget:
+    """Informations d'une page relevées avant toute modification du document"""
+    __slots__ = ("index", "xref", "rect", "to_pdf", "contents", "resources")
+
+    def __init__(self, doc: "fitz.Document", page: "fitz.Page"):
+        self.index = page.number
+        self.xref = page.xref
+        self.rect = page.rect
+        self.to_pdf = visual_to_pdf(page)
+        self.contents = page.get_contents()
+        self.resources = _resources_entry(doc, page.xref)
+
+
+def _resources_entry(doc: "fitz.Document", page_xref: int) -> Tuple[str, str]:
+    """Dictionnaire de ressources d'une page, en remontant l'arbre si elles sont héritées"""
+    xref = page_xref
+    while True:
+        kind, value = doc.xref_get_key(xref, "Resources")
+        if kind in ("xref", "dict"):
+            return (kind, value) if xref == page_xref else ("inherited", value)
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        if kind != "xref":
+            return ("inherited", "<<>>")
+        xref = int(parent.split()[0])
+
+
+class PageStamper:
+    """
+    Ajoute du contenu aux pages en manipulant directement les objets PDF.
+
+    Les objets partagés (Form XObject du filigrane, police des libellés) sont
+    déclarés dans les ressources de chaque page (une seule fois par dictionnaire
+    de ressources partagé). Les flux de contenu identiques ("q", "Q", placement
+    du filigrane pour une même géométrie) sont mutualisés entre les pages :
+    la taille ajoutée par page se limite à quelques références, plus le texte
+    du libellé éventuel.
+
+    Toutes les informations de page sont relevées avant la première écriture :
+    modifier le document invalide la table des pages de MuPDF et rendrait
+    chaque accès à une page linéaire.
+    """
+
+    def __init__(self, doc: "fitz.Document"):
+        self.doc = doc
+        self._streams: Dict[bytes, int] = {}
+        self._updated_resources = set()
+
+    def new_object(self, source: str) -> int:
+        xref = self.doc.get_new_xref()
+        self.doc.update_object(xref, source)
+        return xref
+
+    def shared_stream(self, content: bytes) -> int:
+        xref = self._streams.get(content)
+        if xref is None:
+            xref = self.new_stream(content)
+            self._streams[content] = xref
+        return xref
+
+    def new_stream(self, content: bytes) -> int:
+        xref = self.new_object("<<>>")
+        self.doc.update_stream(xref, content)
+        return xref
+
+    def add_resource(self, target: PageTarget, category: str, name: str, xref: int) -> None:
+        """Déclare un objet dans les ressources (XObject, Font, ...) de la page"""
+        kind, value = target.resources
+        if kind == "inherited":
+            # Recopier les ressources héritées sur la page avant de les compléter
+            self.doc.xref_set_key(target.xref, "Resources", value)
+            target.resources = self.doc.xref_get_key(target.xref, "Resources")
+            kind, value = target.resources
+        if kind == "xref":
+            owner, prefix = int(value.split()[0]), ""
+        else:
+            owner, prefix = target.xref, "Resources/"
+
+        sub_kind, sub_value = self.doc.xref_get_key(owner, f"{prefix}{category}")
+        if sub_kind == "xref":
+            owner, key = int(sub_value.split()[0]), name
+        else:
+            key = f"{prefix}{category}/{name}"
+
+        if (owner, key) not in self._updated_resources:
+            self.doc.xref_set_key(owner, key, f"{xref} 0 R")
+            self._updated_resources.add((owner, key))
+
+    def append_contents(self, target: PageTarget, streams: List[int]) -> None:
+        """Ajoute des flux après le contenu d'origine, isolé par q/Q"""
+        contents = [self.shared_stream(b"q\n")] + target.contents + [self.shared_stream(b"\nQ")] + streams
+        self.doc.xref_set_key(target.xref, "Contents", "[" + " ".join(f"{x} 0 R" for x in contents) + "]")
+
+
+def import_form(doc: "fitz.Document", stamp: "fitz.Document") -> int:
+    """Copie la page du filigrane dans le document sous forme de Form XObject"""
+    # Page temporaire : show_pdf_page se charge de copier les ressources du filigrane
+    page = doc.new_page()
+    xref = page.show_pdf_page(page.rect, stamp, 0)
+    doc.delete_page(page.number)
+    return xref
+
+
+def encode_label(text: str) -> str:
+    """Chaîne PDF hexadécimale (encodage WinAnsi de la police Helvetica)"""
+    return "<" + text.encode("cp1252", errors="replace").hex() + ">"
+
+
+def add_watermark(
+    pdf_path: str,
+    output_path: str,
+    text: Optional[str] = None,
+    image_path: Optional[str] = None,
+    position: str = "center",
+    rotation: Optional[float] = None,
+    opacity: float = 0.3,
+    font_size: float = 48,
+    color: str = "#808080",
+    scale: float = 50,
+    pages: Optional[str] = None,
+    label: Optional[str] = None,
+    label_position: str = "bottom-right",
+    label_font_size: float = 10,
+    bates_prefix: str = "",
+    bates_start: int = 1,
+    bates_digits: int = 6,
+) -> Dict[str, Any]:
+    """
+    Ajoute un filigrane (texte ou image) et/ou un libellé par page à un PDF.
+
+    Le filigrane est construit une seule fois et partagé par toutes les pages
+    (Form XObject). Le libellé est un modèle évalué pour chaque page avec les
+    champs {page}, {total} et {bates} (numérotation Bates : préfixe + numéro
+    sur bates_digits chiffres à partir de bates_start, sur les pages
+    sélectionnées), inséré en texte sans rastérisation.
+    `scale` est la largeur du filigrane en pourcentage de la largeur de page.
+    """
+    if not text and not image_path and not label:
+        raise ValueError("Vous devez fournir un texte, une image ou un libellé")
+    for value in (position, label_position):
+        if value not in WATERMARK_POSITIONS:
+            raise ValueError(f"Position invalide: {value}")
+    if label:
+        validate_label_template(label)
+    rgb = parse_color(color)
+    if rotation is None:
+        # Diagonale par défaut pour un texte centré
+        rotation = 45 if position == "center" and text and not image_path else 0
+
+    doc = None
+    stamp = None
+    try:
+        with time_stage("parse"):
+            doc = fitz.open(pdf_path)
+        total_pages = len(doc)
+        indices = select_pages(pages, total_pages)
+        if not indices:
+            raise ValueError("Aucune page valide sélectionnée")
+
+        with time_stage("process"):
+            stamper = PageStamper(doc)
+            form_xref = 0
+            font_xref = 0
+            if text or image_path:
+                with span("build_watermark"):
+                    stamp = build_stamp(text, image_path, font_size, rgb, opacity)
+                    stamp_rect = stamp[0].rect
+                    form_xref = import_form(doc, stamp)
+            if label:
+                font_xref = stamper.new_object(
+                    "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+                )
+
+            # Relevé des pages avant toute écriture
+            with span("read_pages"):
+                targets = [PageTarget(doc, doc[index]) for index in indices]
+
+            placements: Dict[Tuple, int] = {}
+            for number, target in enumerate(targets):
+                check_cancelled()
+                streams = []
+
+                if form_xref:
+                    # Un flux de placement par géométrie de page (taille, rotation)
+                    geometry = (tuple(target.rect), tuple(target.to_pdf))
+                    stream = placements.get(geometry)
+                    if stream is None:
+                        width = target.rect.width * scale / 100
+                        height = width * stamp_rect.height / stamp_rect.width
+                        rect = placement_rect(target.rect, (width, height), position)
+                        matrix = form_matrix(target.to_pdf, stamp_rect, rect, rotation)
+                        stream = stamper.shared_stream(
+                            f"q {_pdf_matrix(matrix)} cm /{WATERMARK_RESOURCE} Do Q".encode()
+                        )
+                        placements[geometry] = stream
+                    stamper.add_resource(target, "XObject", WATERMARK_RESOURCE, form_xref)
+                    streams.append(stream)
+
+                if label:
+                    label_text = label.format(
+                        page=target.index + 1,
+                        total=total_pages,
+                        bates=f"{bates_prefix}{bates_start + number:0{bates_digits}d}",
+                    )
+                    label_width = fitz.get_text_length(label_text, fontname="helv", fontsize=label_font_size)
+                    rect = placement_rect(target.rect, (label_width, label_font_size), label_position)
+                    matrix = text_matrix(target.to_pdf, fitz.Point(rect.x0, rect.y1))
+                    stamper.add_resource(target, "Font", LABEL_FONT_RESOURCE, font_xref)
+                    streams.append(stamper.new_stream(
+                        f"q BT /{LABEL_FONT_RESOURCE} {label_font_size:g} Tf {_pdf_matrix(matrix)} Tm "
+                        f"{encode_label(label_text)} Tj ET Q".encode()
+                    ))
+
+                stamper.append_contents(target, streams)
+
+        record_pages(len(indices))
+
+        with time_stage("write"):
+            doc.save(output_path, garbage=1, deflate=True)
+
+        return {"total_pages": total_pages, "stamped_pages": len(indices), "shared_xobject": form_xref or None}
+
+    except Exception as e:
+        if os.path.exists(output_path):
+            secure_delete_file(output_path)
+        if isinstance(e, OperationAborted):
+            raise
+        raise ValueError(f"Erreur lors de l'ajout du filigrane: {str(e)}")
+
+    finally:
+        if stamp is not None:
+            stamp.close()
+        if doc is not None:
+            doc.close()
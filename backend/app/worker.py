@@ -0,0 +1,59 @@
+"""
+Worker dédié aux travaux asynchrones (/jobs).
+
+    python -m app.worker [--concurrency N]
+
+Le worker consomme la même file que le serveur API (JOB_QUEUE_BACKEND) et
+doit voir les mêmes dossiers TEMP_DIR et STORE_DIR (volume partagé) pour
+lire les sources et ranger les résultats. Pour que les nœuds API ne fassent
+que recevoir les fichiers, les lancer avec JOB_WORKER_CONCURRENCY=0.
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+
+from .core.config import settings
+from .core.temp_manager import temp_manager
+from .core.process_pool import shutdown_process_pools
+from .core.job_queue import job_queue
+from .services.jobs import JobWorker
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker des travaux asynchrones PDF-Reader")
+    parser.add_argument(
+        "--concurrency", type=int, default=os.cpu_count() or 1,
+        help="Travaux exécutés en parallèle (défaut : nombre de cœurs)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    temp_manager.rebuild()
+    temp_manager.start()
+
+    worker = JobWorker(
+        job_queue,
+        max(1, args.concurrency),
+        lease_seconds=settings.JOB_LEASE_SECONDS,
+        poll_seconds=settings.JOB_POLL_SECONDS,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    )
+    worker.start()
+
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+    stopping.wait()
+
+    logger.info("Arrêt du worker")
+    worker.stop()
+    temp_manager.stop()
+    shutdown_process_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Dossiers de travail propres à la session de tests, fixés avant le premier
+# import de l'application (la configuration est lue à l'import)
+_ROOT = tempfile.mkdtemp(prefix="pdf-reader-tests-")
+for _name in ("TEMP_DIR", "STORE_DIR", "STATE_DIR"):
+    os.environ.setdefault(_name, os.path.join(_ROOT, _name.lower()))
+    os.makedirs(os.environ[_name], exist_ok=True)
+os.environ.setdefault("TEMP_DISK_SAFETY_MARGIN_MB", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from app.core.job_queue import (
+    CANCELLED, DONE, FAILED, QUEUED, RUNNING,
+    LocalRedis, RedisJobBackend, SQLiteJobBackend, new_job, valid_job_id,
+)
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteJobBackend(str(tmp_path / "jobs.sqlite"))
+    return RedisJobBackend(LocalRedis(), prefix="tests:jobs")
+
+
+def enqueue(queue, operation="compress"):
+    job = new_job(operation, [{"document_id": "d" * 64, "filename": "a.pdf"}], {"quality": "low"})
+    queue.enqueue(job)
+    # Ordre de création distinct, même sur une horloge peu précise
+    time.sleep(0.002)
+    return job
+
+
+def test_claim_oldest_first(queue):
+    first, second = enqueue(queue), enqueue(queue)
+    claimed = queue.claim("w1", lease_seconds=30)
+    assert claimed["id"] == first["id"]
+    assert claimed["status"] == RUNNING and claimed["worker"] == "w1" and claimed["attempts"] == 1
+    assert claimed["params"] == {"quality": "low"}
+    assert queue.claim("w2", lease_seconds=30)["id"] == second["id"]
+    assert queue.claim("w3", lease_seconds=30) is None
+
+
+def test_finish_only_by_lease_holder(queue):
+    job = enqueue(queue)
+    queue.claim("w1", lease_seconds=30)
+    assert not queue.finish(job["id"], "w2", DONE)
+    assert queue.finish(job["id"], "w1", DONE, result={"result_id": "r"})
+    stored = queue.get(job["id"])
+    assert stored["status"] == DONE and stored["result"] == {"result_id": "r"} and stored["error"] is None
+    # Issue déjà enregistrée : ni prolongation ni seconde issue
+    assert not queue.heartbeat(job["id"], "w1", 30)
+    assert not queue.finish(job["id"], "w1", FAILED, error="trop tard")
+
+
+def test_expired_lease_is_requeued_then_fails(queue):
+    job = enqueue(queue)
+    queue.claim("w1", lease_seconds=0)
+    assert queue.requeue_expired(max_attempts=2) == 1
+    assert queue.get(job["id"])["status"] == QUEUED
+    # Le worker qui a perdu son bail ne peut plus rien enregistrer
+    assert not queue.heartbeat(job["id"], "w1", 30)
+
+    reclaimed = queue.claim("w2", lease_seconds=0)
+    assert reclaimed["id"] == job["id"] and reclaimed["attempts"] == 2
+    assert not queue.finish(job["id"], "w1", DONE)
+    assert queue.requeue_expired(max_attempts=2) == 1
+    failed = queue.get(job["id"])
+    assert failed["status"] == FAILED and "tentatives" in failed["error"]
+    assert queue.claim("w3", lease_seconds=30) is None
+
+
+def test_heartbeat_keeps_lease(queue):
+    job = enqueue(queue)
+    queue.claim("w1", lease_seconds=0)
+    assert queue.heartbeat(job["id"], "w1", 30)
+    assert queue.requeue_expired(max_attempts=3) == 0
+    assert queue.get(job["id"])["status"] == RUNNING
+
+
+def test_cancel_only_queued(queue):
+    waiting, running = enqueue(queue), enqueue(queue)
+    assert queue.claim("w1", lease_seconds=30)["id"] == waiting["id"]
+    assert not queue.cancel(waiting["id"])
+    assert queue.cancel(running["id"])
+    assert queue.get(running["id"])["status"] == CANCELLED
+    assert queue.claim("w2", lease_seconds=30) is None
+
+
+def test_purge_finished_sqlite(tmp_path):
+    queue = SQLiteJobBackend(str(tmp_path / "jobs.sqlite"))
+    done, waiting = enqueue(queue), enqueue(queue)
+    queue.claim("w1", lease_seconds=30)
+    queue.finish(done["id"], "w1", DONE)
+    assert queue.purge(time.time() + 1) == 1
+    assert queue.get(done["id"]) is None
+    assert queue.get(waiting["id"])["status"] == QUEUED
+
+
+def test_job_id_format():
+    assert valid_job_id(new_job("split", [], {})["id"])
+    assert not valid_job_id("../etc")
+    assert not valid_job_id("")
@@ -0,0 +1,137 @@
+import random
+import re
+
+import pytest
+
+from app.services.page_selection import PageSet, parse_page_selection, select_pages
+
+
+def naive_select(expression, total_pages):
+    """Référence : chaque terme développé en liste de pages (indices base 0)"""
+    included, excluded, has_includes = set(), set(), False
+    for term in (part.strip() for part in expression.split(",") if part.strip()):
+        exclude = term.startswith("!")
+        term = term.lstrip("!").strip()
+        step = 1
+        if ":" in term:
+            term, step = term.split(":")
+            step = int(step)
+        if term in ("all", "*"):
+            pages = set(range(0, total_pages, step))
+        elif term == "odd":
+            pages = set(range(0, total_pages, 2 * step))
+        elif term == "even":
+            pages = set(range(1, total_pages, 2 * step))
+        else:
+            start, separator, end = re.fullmatch(r"(-?\d+)?(\.\.|-)?(-?\d+)?", term).groups()
+            index = lambda value: int(value) - 1 if int(value) > 0 else total_pages + int(value)
+            if not separator:
+                pages = {index(start)}
+            else:
+                first = index(start) if start else 0
+                last = index(end) if end else total_pages - 1
+                pages = {page for page in range(first, last + 1, step) if 0 <= page < total_pages}
+        if exclude:
+            excluded |= pages
+        else:
+            included |= pages
+            has_includes = True
+    if not has_includes:
+        included = set(range(total_pages))
+    return sorted(included - excluded)
+
+
+def random_term(rng):
+    kind = rng.random()
+    if kind < 0.1:
+        term = rng.choice(["odd", "even", "all", "*"])
+    elif kind < 0.3:
+        term = str(rng.randint(1, 60))
+    elif kind < 0.4:
+        term = str(-rng.randint(1, 50))
+    else:
+        bounds = ["", str(rng.randint(1, 60)), str(-rng.randint(1, 50))]
+        start, end = rng.choice(bounds), rng.choice(bounds)
+        if not start and not end:
+            start = "3"
+        separator = rng.choice(["-", ".."]) if start else ".."
+        term = f"{start}{separator}{end}"
+    if ("-" in term[1:] or ".." in term or term in ("odd", "even", "all", "*")) and rng.random() < 0.4:
+        term += f":{rng.randint(1, 7)}"
+    if rng.random() < 0.3:
+        term = "!" + term
+    return term
+
+
+def test_matches_naive_selection():
+    rng = random.Random(1)
+    compared = 0
+    for _ in range(5000):
+        total_pages = rng.randint(1, 70)
+        expression = ",".join(random_term(rng) for _ in range(rng.randint(1, 5)))
+        try:
+            selected = select_pages(expression, total_pages)
+        except ValueError:
+            # Plage inversée ou page isolée hors du document
+            continue
+        expected = naive_select(expression, total_pages)
+
+        assert list(selected) == expected, expression
+        assert len(selected) == len(expected), expression
+        for page in range(-2, total_pages + 3):
+            assert (page in selected) == (page in expected), (expression, page)
+        assert list(selected.complement(total_pages)) == [p for p in range(total_pages) if p not in expected]
+        # L'expression normalisée désigne les mêmes pages
+        assert list(select_pages(selected.expression() or "!all", total_pages)) == expected, expression
+        compared += 1
+    assert compared > 3000
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("5", [4]),
+    ("-1", [9]),
+    ("3-5", [2, 3, 4]),
+    ("3..5", [2, 3, 4]),
+    ("8-", [7, 8, 9]),
+    ("..2", [0, 1]),
+    ("-3--1", [7, 8, 9]),
+    ("1-10:3", [0, 3, 6, 9]),
+    ("odd", [0, 2, 4, 6, 8]),
+    ("even:2", [1, 5, 9]),
+    ("1-1000", list(range(10))),
+    ("!2-9", [0, 9]),
+    ("1-5,!odd", [1, 3]),
+    ("", list(range(10))),
+])
+def test_syntax(expression, expected):
+    assert list(select_pages(expression, 10)) == expected
+
+
+@pytest.mark.parametrize("expression", ["abc", "0", "5-2", "3:2", "1-5:0", "-", "5,,x"])
+def test_invalid_syntax(expression):
+    with pytest.raises(ValueError):
+        parse_page_selection(expression)
+
+
+def test_isolated_page_outside_document():
+    with pytest.raises(ValueError, match="n'existe pas"):
+        select_pages("11", 10)
+
+
+def test_size_independent_of_page_count():
+    selected = select_pages("1-,!1-1000000:3", 1_000_000)
+    assert len(selected) == 666_666
+    assert len(selected._segments) == 1
+    assert 1 in selected and 3 not in selected
+    assert selected.expression() == "2-999999:3,3-999999:3"
+
+
+def test_groups_keep_term_order_and_apply_exclusions():
+    groups = parse_page_selection("5-6,1-3,!2,9-30,!9-10").groups(10)
+    # La dernière partie, vidée par les exclusions, est omise
+    assert [list(group) for group in groups] == [[4, 5], [0, 2]]
+
+
+def test_from_indices():
+    assert list(PageSet.from_indices([5, 1, 2, 2, 3])) == [1, 2, 3, 5]
+    assert PageSet.from_indices([5, 1, 2, 3]).expression() == "2-4,6"
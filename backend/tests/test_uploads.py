@@ -0,0 +1,163 @@
+import hashlib
+import os
+
+import pytest
+
+from app.core import uploads
+from app.core.document_store import document_store
+from app.core.uploads import (
+    CHUNKS_DIRNAME, DATA_FILENAME, FINALIZING_FILENAME, MB,
+    ChunkedUploadStore, UploadBusy, UploadIncomplete,
+)
+
+CHUNK_SIZE = MB
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkedUploadStore(str(tmp_path / "uploads"), retention_seconds=3600)
+
+
+@pytest.fixture
+def content():
+    # Deux morceaux complets et un dernier morceau plus court
+    return os.urandom(2 * CHUNK_SIZE + 1234)
+
+
+def chunks(content):
+    return [(offset, content[offset:offset + CHUNK_SIZE]) for offset in range(0, len(content), CHUNK_SIZE)]
+
+
+def upload_dir(store, upload):
+    return os.path.join(store.root, uploads.UPLOAD_DIR_PREFIX + upload["upload_id"])
+
+
+def open_upload(store, content, sha256=True):
+    digest = hashlib.sha256(content).hexdigest() if sha256 else None
+    return store.create("rapport.pdf", len(content), CHUNK_SIZE, digest)
+
+
+def send_all(store, upload, content):
+    # Dans le désordre : chaque morceau est écrit à sa position
+    for offset, data in reversed(chunks(content)):
+        status = store.write_chunk(upload["upload_id"], offset, data, hashlib.sha256(data).hexdigest())
+    return status
+
+
+def test_complete_moves_file_to_document_store(store, content):
+    upload = open_upload(store, content)
+    assert upload["chunks"] == 3
+    assert upload["missing_offsets"] == [0, CHUNK_SIZE, 2 * CHUNK_SIZE]
+
+    status = send_all(store, upload, content)
+    assert status["missing_offsets"] == [] and status["received_bytes"] == len(content)
+
+    document = store.complete(upload["upload_id"])
+    assert document["document_id"] == hashlib.sha256(content).hexdigest()
+    assert document["filename"] == "rapport.pdf" and document["size"] == len(content)
+    with open(document_store.path(document["document_id"]), "rb") as f:
+        assert f.read() == content
+    assert not os.path.exists(upload_dir(store, upload))
+    assert store.status(upload["upload_id"]) is None
+
+
+def test_rejects_altered_or_misplaced_chunk(store, content):
+    upload = open_upload(store, content)
+    data = content[:CHUNK_SIZE]
+    with pytest.raises(ValueError, match="altéré"):
+        store.write_chunk(upload["upload_id"], 0, data, hashlib.sha256(b"autre").hexdigest())
+    with pytest.raises(ValueError, match="Position invalide"):
+        store.write_chunk(upload["upload_id"], 10, data)
+    with pytest.raises(ValueError, match="Taille du morceau"):
+        store.write_chunk(upload["upload_id"], 0, data[:-1])
+    assert store.status(upload["upload_id"])["missing_offsets"][0] == 0
+
+
+def test_complete_with_missing_chunks(store, content):
+    upload = open_upload(store, content)
+    offset, data = chunks(content)[0]
+    store.write_chunk(upload["upload_id"], offset, data)
+    with pytest.raises(UploadIncomplete, match="2 morceau"):
+        store.complete(upload["upload_id"])
+    # L'envoi reste reprenable
+    assert store.status(upload["upload_id"])["missing_offsets"] == [CHUNK_SIZE, 2 * CHUNK_SIZE]
+
+
+def test_corrupted_chunk_is_requested_again(store, content):
+    upload = open_upload(store, content)
+    send_all(store, upload, content)
+    # Altération sur le disque après la réception du deuxième morceau
+    with open(os.path.join(upload_dir(store, upload), DATA_FILENAME), "r+b") as f:
+        f.seek(CHUNK_SIZE + 10)
+        f.write(b"\0\1\2")
+
+    with pytest.raises(UploadIncomplete, match="corrompu"):
+        store.complete(upload["upload_id"])
+    assert store.status(upload["upload_id"])["missing_offsets"] == [CHUNK_SIZE]
+
+    offset, data = chunks(content)[1]
+    store.write_chunk(upload["upload_id"], offset, data)
+    assert store.complete(upload["upload_id"])["document_id"] == hashlib.sha256(content).hexdigest()
+
+
+def test_announced_digest_mismatch_discards_upload(store, content):
+    upload = store.create("rapport.pdf", len(content), CHUNK_SIZE, "0" * 64)
+    send_all(store, upload, content)
+    with pytest.raises(ValueError, match="empreinte du fichier"):
+        store.complete(upload["upload_id"])
+    assert not os.path.exists(upload_dir(store, upload))
+
+
+def test_failed_storage_rolls_back(store, content, monkeypatch):
+    upload = open_upload(store, content, sha256=False)
+    send_all(store, upload, content)
+
+    def full_disk(*args, **kwargs):
+        raise OSError("Espace disque insuffisant")
+
+    monkeypatch.setattr(uploads.document_store, "put", full_disk)
+    with pytest.raises(OSError):
+        store.complete(upload["upload_id"])
+    directory = upload_dir(store, upload)
+    assert os.path.exists(os.path.join(directory, DATA_FILENAME))
+    assert not os.path.exists(os.path.join(directory, FINALIZING_FILENAME))
+
+    # Nouvelle tentative une fois le stockage rétabli
+    monkeypatch.undo()
+    assert store.complete(upload["upload_id"])["size"] == len(content)
+
+
+def test_busy_while_finalizing(store, content):
+    upload = open_upload(store, content)
+    send_all(store, upload, content)
+    directory = upload_dir(store, upload)
+    # Finalisation en cours ailleurs (autre worker)
+    os.rename(os.path.join(directory, DATA_FILENAME), os.path.join(directory, FINALIZING_FILENAME))
+    with pytest.raises(UploadBusy):
+        store.complete(upload["upload_id"])
+    offset, data = chunks(content)[0]
+    with pytest.raises(UploadBusy):
+        store.write_chunk(upload["upload_id"], offset, data)
+    assert sorted(os.listdir(os.path.join(directory, CHUNKS_DIRNAME))) == ["0", "1", "2"]
+
+
+@pytest.mark.parametrize("size, chunk_size, sha256", [
+    (0, CHUNK_SIZE, None),
+    (10, CHUNK_SIZE // 2, None),
+    (10, CHUNK_SIZE, "pas-une-empreinte"),
+])
+def test_create_validates_parameters(store, size, chunk_size, sha256):
+    with pytest.raises(ValueError):
+        store.create("a.pdf", size, chunk_size, sha256)
+
+
+def test_invalid_upload_id(store):
+    with pytest.raises(ValueError, match="Identifiant"):
+        store.status("../../etc")
+
+
+def test_abort(store, content):
+    upload = open_upload(store, content)
+    assert store.abort(upload["upload_id"])
+    assert not os.path.exists(upload_dir(store, upload))
+    assert not store.abort(upload["upload_id"])
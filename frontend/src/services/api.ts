@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { Sha256 } from '../utils/sha256';
 
 // L'URL de base de l'API
 const API_URL = 'http://localhost:8000/api/v1';
@@ -289,6 +290,179 @@ export const pdfService = {
   }
 };
 
+// État d'un envoi par morceaux renvoyé par l'API
+export interface ChunkedUploadStatus {
+  upload_id: string;
+  filename: string;
+  size: number;
+  chunk_size: number;
+  chunks: number;
+  received_bytes: number;
+  missing_offsets: number[];
+  upload_url: string;
+}
+
+// Fichier rangé côté serveur, utilisable par /jobs et /search
+export interface StoredDocument {
+  document_id: string;
+  filename: string;
+  size: number;
+}
+
+export interface ChunkedUploadOptions {
+  /**
+   * Taille des morceaux en octets (défaut : 8 Mo)
+   */
+  chunkSize?: number;
+
+  /**
+   * Morceaux envoyés en parallèle (défaut : 4)
+   */
+  concurrency?: number;
+
+  /**
+   * Nouvelles tentatives par morceau, puis de finalisation, avant abandon (défaut : 3)
+   */
+  retries?: number;
+
+  /**
+   * Progression : octets reçus par le serveur / taille totale
+   */
+  onProgress?: (sentBytes: number, totalBytes: number) => void;
+}
+
+/**
+ * Empreinte SHA-256 (hexadécimale) d'un morceau, si le navigateur le permet
+ * (crypto.subtle n'existe que dans un contexte sécurisé)
+ */
+const sha256Hex = async (blob: Blob): Promise<string | undefined> => {
+  if (!window.crypto?.subtle) {
+    return undefined;
+  }
+  const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest))
+    .map(byte => byte.toString(16).padStart(2, '0'))
+    .join('');
+};
+
+/**
+ * Empreinte SHA-256 (hexadécimale) d'un fichier entier, lu tranche par tranche
+ * pour ne jamais le charger complètement en mémoire
+ */
+const fileSha256Hex = async (file: File, sliceSize: number): Promise<string> => {
+  const hash = new Sha256();
+  for (let offset = 0; offset < file.size; offset += sliceSize) {
+    hash.update(new Uint8Array(await file.slice(offset, offset + sliceSize).arrayBuffer()));
+  }
+  return hash.hex();
+};
+
+// Clé de reprise d'un envoi interrompu (rechargement de la page, coupure réseau)
+const resumeKey = (file: File) => `pdf-reader-upload:${file.name}:${file.size}:${file.lastModified}`;
+
+// Services d'envoi des fichiers volumineux
+export const uploadService = {
+  /**
+   * Envoie un fichier volumineux par morceaux, en parallèle, et le range côté serveur.
+   * Un envoi interrompu reprend aux seuls morceaux manquants au prochain appel
+   * avec le même fichier ; les morceaux signalés manquants ou corrompus à la
+   * finalisation sont renvoyés avant une nouvelle finalisation.
+   */
+  uploadLargeFile: async (file: File, options: ChunkedUploadOptions = {}): Promise<StoredDocument> => {
+    const { chunkSize = 8 * 1024 * 1024, concurrency = 4, retries = 3, onProgress } = options;
+
+    // Reprendre l'envoi précédent de ce fichier s'il existe encore
+    let status: ChunkedUploadStatus | undefined;
+    const previousId = window.localStorage.getItem(resumeKey(file));
+    if (previousId) {
+      try {
+        status = (await apiClient.get<ChunkedUploadStatus>(`/uploads/${previousId}`)).data;
+      } catch {
+        window.localStorage.removeItem(resumeKey(file));
+      }
+    }
+    if (!status) {
+      const formData = new FormData();
+      formData.append('filename', file.name);
+      formData.append('size', String(file.size));
+      formData.append('chunk_size', String(chunkSize));
+      // Empreinte du fichier entier, vérifiée par le serveur à la finalisation
+      formData.append('sha256', await fileSha256Hex(file, chunkSize));
+      status = (await apiClient.post<ChunkedUploadStatus>('/uploads', formData)).data;
+      window.localStorage.setItem(resumeKey(file), status.upload_id);
+    }
+
+    const { upload_id: uploadId, chunk_size: serverChunkSize } = status;
+    let missingOffsets = status.missing_offsets;
+    let sentBytes = status.received_bytes;
+    onProgress?.(sentBytes, file.size);
+
+    const sendChunk = async (offset: number) => {
+      const chunk = file.slice(offset, Math.min(offset + serverChunkSize, file.size));
+      const checksum = await sha256Hex(chunk);
+      for (let attempt = 0; ; attempt++) {
+        try {
+          await apiClient.put(`/uploads/${uploadId}`, chunk, {
+            params: { offset },
+            headers: {
+              'Content-Type': 'application/octet-stream',
+              ...(checksum ? { 'X-Chunk-SHA256': checksum } : {}),
+            },
+          });
+          return;
+        } catch (error) {
+          if (attempt >= retries) {
+            throw error;
+          }
+          // Attente croissante avant de renvoyer le morceau
+          await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+        }
+      }
+    };
+
+    for (let attempt = 0; ; attempt++) {
+      // Chaque tâche prend le prochain morceau en attente
+      const pending = [...missingOffsets];
+      const worker = async () => {
+        for (let offset = pending.shift(); offset !== undefined; offset = pending.shift()) {
+          await sendChunk(offset);
+          sentBytes += Math.min(serverChunkSize, file.size - offset);
+          onProgress?.(sentBytes, file.size);
+        }
+      };
+      await Promise.all(Array.from({ length: Math.max(1, concurrency) }, worker));
+
+      try {
+        const response = await apiClient.post<StoredDocument>(`/uploads/${uploadId}/complete`);
+        window.localStorage.removeItem(resumeKey(file));
+        return response.data;
+      } catch (error) {
+        // 409 : morceaux manquants ou corrompus (à renvoyer), ou finalisation déjà en cours
+        if (!axios.isAxiosError(error) || error.response?.status !== 409 || attempt >= retries) {
+          throw error;
+        }
+      }
+
+      await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+      const current = (await apiClient.get<ChunkedUploadStatus>(`/uploads/${uploadId}`)).data;
+      missingOffsets = current.missing_offsets;
+      sentBytes = current.received_bytes;
+      onProgress?.(sentBytes, file.size);
+    }
+  },
+
+  /**
+   * Abandonne un envoi par morceaux et libère l'espace côté serveur
+   */
+  abortUpload: async (file: File) => {
+    const uploadId = window.localStorage.getItem(resumeKey(file));
+    window.localStorage.removeItem(resumeKey(file));
+    if (uploadId) {
+      await apiClient.delete(`/uploads/${uploadId}`);
+    }
+  },
+};
+
 /**
  * Télécharge un fichier à partir d'un Blob de réponse
  */